@@ -193,9 +193,19 @@ def get_db_id_from_table_id(self, table_id):
 
 
 def get_table_metadata(
-    self, table_name=None, table_id=None, db_name=None, db_id=None, params=None
+    self,
+    table_name=None,
+    table_id=None,
+    db_name=None,
+    db_id=None,
+    params=None,
+    use_cache=False,
 ):
-
+    """
+    Return the metadata of a table (including its fields), from the endpoint 'GET /api/table/:id/query_metadata'.
+    If use_cache is True (and no 'params' are given) the metadata is fetched only once per table;
+    use 'clear_cache' to forget it.
+    """
     if params:
         assert type(params) == dict
 
@@ -204,9 +214,64 @@ def get_table_metadata(
             raise ValueError("Either the name or id of the table needs to be provided.")
         table_id = self.get_item_id("table", table_name, db_name=db_name, db_id=db_id)
 
+    if use_cache and not params:
+        md = self._table_metadata_cache.get(table_id)
+        if md is None:
+            md = self.get("/api/table/{}/query_metadata".format(table_id))
+            if md:
+                self._table_metadata_cache[table_id] = md
+        return md
+
     return self.get("/api/table/{}/query_metadata".format(table_id), params=params)
 
 
+def get_table_columns_in_order(self, table_id) -> list[dict]:
+    """
+    Return the fields of the table, in the order they appear in the database (ie, ordered on 'position').
+    Metadata is cached per table.
+    """
+    md = self.get_table_metadata(table_id=table_id, use_cache=True)
+    if not md:
+        raise ValueError('There is no table with the id "{}"'.format(table_id))
+    return sorted(
+        [f for f in md["fields"] if f.get("parent_id") is None],
+        key=lambda f: f["position"],
+    )
+
+
+def clear_cache(self):
+    """Forget all the metadata cached so far."""
+    self._table_metadata_cache.clear()
+    self._cards_index_cache.clear()
+    self.object_store.clear()
+
+
+def get_card_json(self, card_id):
+    """
+    Return the full json of a card; from the object store if it is there (see 'prefetch_cards'),
+    otherwise it is fetched (and stored). The json returned must not be modified.
+    """
+    card_json = self.object_store.get("card", card_id)
+    if card_json is None:
+        card_json = self.get("/api/card/{}".format(card_id))
+        if not card_json:
+            raise ValueError(f"Impossible to get card '{card_id}'")
+        self.object_store.put("card", card_json)
+    return card_json
+
+
+def prefetch_cards(self, collection_id, max_workers=4):
+    """
+    Put the full json of all cards of a collection (at any depth) in the object store,
+    so that they are not fetched one by one later on. Return the tree of the collection.
+    """
+    from metabase_api.collection_tree import CollectionTree
+
+    tree = CollectionTree.load(self, collection_id, max_workers=max_workers)
+    self.object_store.put_many("card", tree.cards.values())
+    return tree
+
+
 def get_columns_name_id(
     self,
     db_name=None,
@@ -250,6 +315,42 @@ def get_columns_name_id(
     }
 
 
+def get_columns_name_id_many(
+    self,
+    table_ids: list[int],
+    column_id_name=False,
+    tables: Optional[list[dict]] = None,
+) -> dict[int, dict]:
+    """
+    Same as get_columns_name_id, for many tables at once: returns a dictionary table_id -> mapping.
+    The list of tables is fetched once (unless provided as 'tables'), and the fields once per database.
+    """
+    if not self.friendly_names_is_disabled():
+        raise ValueError(
+            'Please disable "Friendly Table and Field Names" from Admin Panel > Settings > General, and try again.'
+        )
+    if tables is None:
+        tables = self.get("/api/table/")
+    tables_info = {t["id"]: t for t in tables if t["id"] in set(table_ids)}
+    unknown = set(table_ids) - tables_info.keys()
+    if len(unknown) > 0:
+        raise ValueError(f"There are no tables with the ids {sorted(unknown)}")
+
+    key, value = ("id", "name") if column_id_name else ("name", "id")
+    result: dict[int, dict] = {table_id: {} for table_id in table_ids}
+    for db_id in {t["db_id"] for t in tables_info.values()}:
+        tables_in_db = {
+            (t["name"], t["schema"]): t["id"]
+            for t in tables_info.values()
+            if t["db_id"] == db_id
+        }
+        for i in self.get(f"/api/database/{db_id}/fields"):
+            table_id = tables_in_db.get((i["table_name"], i["schema"]))
+            if table_id is not None:
+                result[table_id][i[key]] = i[value]
+    return result
+
+
 def friendly_names_is_disabled(self):
     """
     The endpoint /api/database/:db-id/fields which is used in the function get_columns_name_id relies on the display name of fields.
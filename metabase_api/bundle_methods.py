@@ -0,0 +1,336 @@
+import json
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import groupby, islice
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from metabase_api.copy_methods import _pulse_json_for_copy
+from metabase_api.utility.fingerprint import fingerprint
+from metabase_api.utility.mbql import replace_card_references
+
+_logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT = "metabase-collection-bundle"
+BUNDLE_VERSION = 1
+# entries of a bundle (a zip file)
+MANIFEST_ENTRY = "manifest.json"
+OBJECTS_ENTRY = "objects.jsonl"
+INDEX_ENTRY = "index.json"
+
+
+def _bounded_map(
+    executor: ThreadPoolExecutor, f: Callable, items: Iterable, window: int
+) -> Iterator:
+    """Like 'executor.map', but with at most 'window' results waiting to be consumed."""
+    pending: deque = deque()
+    for item in items:
+        pending.append(executor.submit(f, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def export_collection(
+    self, collection_id, path, max_workers=4, verbose=False
+) -> dict[str, int]:
+    """
+    Exports a collection (with its sub-collections, cards, dashboards - and their tabs - and pulses)
+    to a bundle: a zip file with
+        - 'objects.jsonl': one object per line ({"model", "id", "collection_id", "hash", "json", ...}),
+                        in the order in which they can be created again ('collection_id' of a collection is its parent),
+        - 'index.json': model -> id -> {name, collection id, hash, line} of every object, and
+        - 'manifest.json': format, origin and counts.
+    Objects are written as soon as they are fetched: only a few dashboards are in memory at any time.
+
+    Keyword arguments:
+    collection_id -- id of the collection to export
+    path -- where to write the bundle
+    max_workers -- maximum number of objects fetched at the same time (default 4)
+    verbose -- prints extra information (default False)
+
+    :return the number of objects exported, by model.
+    """
+    from metabase_api.copy_engine import CollectionCopier
+
+    copier = CollectionCopier(self, deepcopy_dashboards=True, max_workers=max_workers)
+    copier.discover(collection_id)
+    assert copier.tree is not None
+    collection_of = {
+        (i["model"], i["id"]): node.id
+        for node in copier.collections.values()
+        for i in node.items
+    }
+    index: dict[str, dict[int, dict]] = dict()
+    line_nb = 0
+
+    def _write(f, model: str, obj_json: dict, **extra: Any) -> None:
+        nonlocal line_nb
+        obj_id = obj_json["id"]
+        entry = {
+            "model": model,
+            "id": obj_id,
+            "collection_id": collection_of.get((model, obj_id)),
+            "hash": fingerprint(obj_json),
+            **extra,
+            "json": obj_json,
+        }
+        f.write((json.dumps(entry) + "\n").encode("utf-8"))
+        index.setdefault(model, dict())[obj_id] = {
+            "name": obj_json.get("name"),
+            "collection_id": entry["collection_id"],
+            "hash": entry["hash"],
+            "line": line_nb,
+        }
+        line_nb += 1
+
+    with zipfile.ZipFile(
+        path, "w", compression=zipfile.ZIP_DEFLATED
+    ) as zf, ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        with zf.open(OBJECTS_ENTRY, "w") as f:
+            for depth, level in enumerate(copier.tree.levels()):
+                for node in level:
+                    collection_json = dict(node.as_json)
+                    _write(f, "collection", collection_json, depth=depth)
+            for wave_nb, wave in enumerate(copier.card_waves()):
+                for card_id in wave:
+                    _write(f, "card", copier.cards[card_id], wave=wave_nb)
+            for model in ("dashboard", "pulse"):
+                ids = sorted(i for (m, i) in collection_of.keys() if m == model)
+                self.verbose_print(verbose, f"Exporting {len(ids)} {model}(s)...")
+                for obj_json in _bounded_map(
+                    executor,
+                    lambda obj_id: self.get(f"/api/{model}/{obj_id}"),
+                    ids,
+                    window=2 * max_workers,
+                ):
+                    _write(f, model, obj_json)
+        counts = {model: len(objs) for model, objs in index.items()}
+        zf.writestr(INDEX_ENTRY, json.dumps(index))
+        zf.writestr(
+            MANIFEST_ENTRY,
+            json.dumps(
+                {
+                    "format": BUNDLE_FORMAT,
+                    "version": BUNDLE_VERSION,
+                    "source": self.domain,
+                    "collection_id": collection_id,
+                    "exported_at": datetime.now(timezone.utc).isoformat(),
+                    "counts": counts,
+                }
+            ),
+        )
+    _logger.info(f"Collection {collection_id} exported to '{str(path)}': {counts}")
+    return counts
+
+
+def read_bundle_manifest(path) -> dict:
+    """Manifest of a bundle; ValueError if the file is not a bundle we can read."""
+    with zipfile.ZipFile(path) as zf:
+        try:
+            manifest = json.loads(zf.read(MANIFEST_ENTRY))
+        except KeyError as ke:
+            raise ValueError(f"'{str(path)}' is not a collection bundle") from ke
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"'{str(path)}' is not a collection bundle")
+    if manifest.get("version", 0) > BUNDLE_VERSION:
+        raise ValueError(
+            f"Bundle '{str(path)}' has version {manifest['version']}; only versions up to {BUNDLE_VERSION} can be read"
+        )
+    return manifest
+
+
+def iter_bundle_objects(path) -> Iterator[dict]:
+    """Objects of a bundle, in order; ValueError if one of them does not match its hash."""
+    read_bundle_manifest(path)
+    with zipfile.ZipFile(path) as zf, zf.open(OBJECTS_ENTRY) as f:
+        for line_nb, line in enumerate(f):
+            entry = json.loads(line)
+            if fingerprint(entry["json"]) != entry["hash"]:
+                raise ValueError(
+                    f"Bundle '{str(path)}' is corrupted: {entry['model']} {entry['id']} (line {line_nb}) does not match its hash"
+                )
+            yield entry
+
+
+def import_bundle(
+    self,
+    path,
+    parent_collection_id=None,
+    collection_name=None,
+    max_workers=4,
+    verbose=False,
+    journal_path=None,
+) -> dict[str, dict[int, int]]:
+    """
+    Creates the contents of a bundle (see 'export_collection') in a collection.
+    Objects are read one group at a time (collections of the same depth, cards that do not depend
+    on each other, dashboards, pulses); the objects of a group are created concurrently.
+    Dashboards and pulses keep the cards that are not in the bundle.
+
+    Keyword arguments:
+    path -- bundle to import
+    parent_collection_id -- id of the collection to put the contents of the bundle in (default None: 'Root')
+    collection_name -- name of the top collection of the bundle, once imported (default None: as in the bundle)
+    max_workers -- maximum number of objects created at the same time (default 4)
+    verbose -- prints extra information (default False)
+    journal_path -- file where every imported object is recorded (default None: no journal).
+                                If the file exists, the import resumes from it: the objects already imported
+                                are not created again. If an object can not be created, the import stops
+                                (once the other objects of its group are created and recorded).
+
+    :return a trace of all transformations, in format 'src:dst' (same as 'copy_collection').
+    """
+    from metabase_api.utility.journal import Journal
+
+    manifest = read_bundle_manifest(path)
+    journal = (
+        Journal(
+            journal_path,
+            header={
+                "operation": "import",
+                "source": manifest.get("source"),
+                "source_collection_id": manifest.get("collection_id"),
+                "exported_at": manifest.get("exported_at"),
+                "parent_collection_id": parent_collection_id,
+                "collection_name": collection_name,
+            },
+        )
+        if journal_path is not None
+        else None
+    )
+    transf: dict[str, dict[int, int]] = {
+        "collections": dict(),
+        "cards": dict(),
+        "dashboards": dict(),
+        "tabs": dict(),
+        "pulses": dict(),
+    }
+
+    def _card_id(card_id: int) -> int:
+        return transf["cards"].get(card_id, card_id)
+
+    def _create_collection(entry: dict) -> int:
+        if entry["depth"] == 0:
+            name = collection_name if collection_name else entry["json"]["name"]
+            parent_id = parent_collection_id
+        else:
+            name = entry["json"]["name"]
+            parent_id = transf["collections"][entry["collection_id"]]
+        res = self.create_collection(
+            name,
+            parent_collection_id=parent_id,
+            parent_collection_name="Root" if parent_id is None else None,
+            return_results=True,
+        )
+        if not res:
+            raise ConnectionRefusedError(
+                "Current user does not have permissions to create destination collection."
+            )
+        return int(res["id"])
+
+    def _create_card(entry: dict) -> int:
+        card_json = dict(entry["json"])
+        if "dataset_query" in card_json:
+            card_json["dataset_query"] = replace_card_references(
+                card_json["dataset_query"], transf["cards"]
+            )
+        return int(
+            self.copy_card(
+                source_card_json=card_json,
+                destination_collection_id=transf["collections"][entry["collection_id"]],
+                destination_card_name=card_json["name"],
+            )
+        )
+
+    def _create_dashboard(entry: dict) -> tuple[int, dict[int, int]]:
+        dashboard_json = entry["json"]
+        used_cards = {
+            c_id
+            for dc in dashboard_json.get("dashcards", list())
+            for c_id in [dc.get("card_id")] + [s["id"] for s in dc.get("series", [])]
+            if c_id is not None
+        }
+        return self.copy_dashboard_from_json(
+            source_dashboard_json=dashboard_json,
+            destination_collection_id=transf["collections"][entry["collection_id"]],
+            destination_dashboard_name=dashboard_json["name"],
+            card_id_mapping={c_id: _card_id(c_id) for c_id in used_cards},
+        )
+
+    def _create_pulse(entry: dict) -> int:
+        pulse_json = _pulse_json_for_copy(
+            entry["json"],
+            destination_collection_id=transf["collections"][entry["collection_id"]],
+            destination_pulse_name=entry["json"]["name"],
+            card_id_mapping=transf["cards"],
+            dashboard_id_mapping=transf["dashboards"],
+        )
+        res = self.post("/api/pulse", json=pulse_json)
+        if not res:
+            raise ValueError(f"Impossible to import the pulse '{pulse_json['name']}'")
+        return int(res["id"])
+
+    creators: dict[str, Callable] = {
+        "collection": _create_collection,
+        "card": _create_card,
+        "dashboard": _create_dashboard,
+        "pulse": _create_pulse,
+    }
+    model_keys = {
+        "collection": "collections",
+        "card": "cards",
+        "dashboard": "dashboards",
+        "pulse": "pulses",
+    }
+
+    def _add(model: str, src_id: int, value: Any) -> None:
+        if model == "dashboard":
+            transf["dashboards"][src_id] = value["id"]
+            transf["tabs"] = transf["tabs"] | {int(a): b for a, b in value["tabs"]}
+        else:
+            transf[model_keys[model]][src_id] = value
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        groups = groupby(
+            iter_bundle_objects(path),
+            key=lambda e: (e["model"], e.get("depth"), e.get("wave")),
+        )
+        for (model, _, _), group in groups:
+            # objects of a group do not depend on each other: they are created in batches
+            while True:
+                entries = list(islice(group, 4 * max(1, max_workers)))
+                if len(entries) == 0:
+                    break
+                # (objects imported by a previous run are taken from the journal)
+                todo = []
+                for entry in entries:
+                    if journal is not None and journal.has(model, entry["id"]):
+                        _add(model, entry["id"], journal.get(model, entry["id"]))
+                    else:
+                        todo.append(entry)
+                self.verbose_print(verbose, f"Importing {len(todo)} {model}(s)...")
+                futures = [executor.submit(creators[model], e) for e in todo]
+                first_error: Optional[BaseException] = None
+                for entry, future in zip(todo, futures):
+                    # the objects created are recorded, even if another one failed
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        _logger.error(
+                            f"Impossible to import {model} {entry['id']} ('{entry['json'].get('name')}'): {e}"
+                        )
+                        first_error = first_error or e
+                        continue
+                    if model == "dashboard":
+                        dup_id, tabs_equiv = result
+                        result = {"id": dup_id, "tabs": sorted(tabs_equiv.items())}
+                    _add(model, entry["id"], result)
+                    if journal is not None:
+                        journal.record(model, entry["id"], result)
+                if first_error is not None:
+                    raise first_error
+    return transf
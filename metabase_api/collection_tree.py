@@ -0,0 +1,196 @@
+"""
+In-memory model of a tree of collections, with all their items.
+The whole tree is loaded with a handful of requests, whatever its depth:
+the structure comes from '/api/collection/tree', and the items from the bulk listings
+of cards, dashboards and pulses (instead of one '/api/collection/{id}/items' per collection).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CollectionNode:
+    """A collection, with its items."""
+
+    id: int
+    name: str
+    parent_id: Optional[int]
+    depth: int  # relative to the collection the tree was loaded for
+    as_json: dict[str, Any] = field(default_factory=dict)
+    items: list[dict[str, Any]] = field(default_factory=list)
+
+    def items_of(self, model: str) -> list[dict[str, Any]]:
+        return [i for i in self.items if i["model"] == model]
+
+
+def _card_model(card_json: dict[str, Any]) -> str:
+    """Model of a card, as '/api/collection/{id}/items' would report it."""
+    card_type = card_json.get("type")
+    if card_type == "model" or card_json.get("dataset", False):
+        return "dataset"
+    if card_type == "metric":
+        return "metric"
+    return "card"
+
+
+def _as_item(obj_json: dict[str, Any], model: str) -> dict[str, Any]:
+    return {
+        "id": obj_json["id"],
+        "name": obj_json["name"],
+        "model": model,
+        "collection_id": obj_json.get("collection_id"),
+        "updated_at": obj_json.get("updated_at"),
+    }
+
+
+class CollectionTree:
+    """A collection, its sub-collections (at any depth) and all their items."""
+
+    def __init__(
+        self,
+        root_id: int,
+        nodes: dict[int, CollectionNode],
+        cards: Optional[dict[int, dict[str, Any]]] = None,
+    ):
+        self.root_id = root_id
+        # collection id -> node
+        self.nodes = nodes
+        # full json of the cards in the tree, by id
+        self.cards: dict[int, dict[str, Any]] = cards if cards is not None else dict()
+
+    @classmethod
+    def load(
+        cls, metabase_api: Any, root_collection_id: int, max_workers: int = 4
+    ) -> "CollectionTree":
+        """
+        Loads the tree under a collection (included), with 4 requests that run concurrently.
+        Archived collections and items are left out, as '/api/collection/{id}/items' does.
+        """
+        _logger.info(f"Loading the tree of collection '{root_collection_id}'...")
+        endpoints = {
+            "tree": ("/api/collection/tree", {"exclude-archived": "true"}),
+            "card": ("/api/card/", {"f": "all"}),
+            "dashboard": ("/api/dashboard/", {"f": "all"}),
+            "pulse": ("/api/pulse/", {}),
+        }
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            results = dict(
+                zip(
+                    endpoints.keys(),
+                    executor.map(
+                        lambda e: metabase_api.get(e[0], params=e[1]),
+                        endpoints.values(),
+                    ),
+                )
+            )
+        for what, res in results.items():
+            if res is False:
+                raise ValueError(
+                    f"Impossible to list the {what}s (endpoint '{endpoints[what][0]}')"
+                )
+        return cls.from_listings(
+            root_collection_id,
+            collections_tree=results["tree"],
+            cards=results["card"],
+            dashboards=results["dashboard"],
+            pulses=results["pulse"],
+        )
+
+    @classmethod
+    def from_listings(
+        cls,
+        root_collection_id: int,
+        collections_tree: list[dict[str, Any]],
+        cards: list[dict[str, Any]],
+        dashboards: list[dict[str, Any]],
+        pulses: list[dict[str, Any]],
+    ) -> "CollectionTree":
+        """Builds the tree under a collection from the (already fetched) listings of Metabase."""
+        root_json = None
+        stack = list(collections_tree)
+        while stack:
+            c = stack.pop()
+            if c.get("id") == root_collection_id:
+                root_json = c
+                break
+            stack.extend(c.get("children", []))
+        if root_json is None:
+            raise ValueError(
+                f'There is no collection with the id "{root_collection_id}"'
+            )
+        nodes: dict[int, CollectionNode] = dict()
+        to_visit: list[tuple[dict[str, Any], Optional[int], int]] = [
+            (root_json, None, 0)
+        ]
+        while to_visit:
+            c, parent_id, depth = to_visit.pop(0)
+            if c.get("archived", False) and parent_id is not None:
+                continue
+            children = c.get("children", [])
+            nodes[c["id"]] = CollectionNode(
+                id=c["id"],
+                name=c["name"],
+                parent_id=parent_id,
+                depth=depth,
+                as_json={k: v for k, v in c.items() if k != "children"},
+                items=[_as_item(child, "collection") for child in children],
+            )
+            to_visit.extend((child, c["id"], depth + 1) for child in children)
+        tree_cards: dict[int, dict[str, Any]] = dict()
+        for objs, model_of in [
+            (cards, _card_model),
+            (dashboards, lambda _: "dashboard"),
+            (pulses, lambda _: "pulse"),
+        ]:
+            for obj_json in objs:
+                node = nodes.get(obj_json.get("collection_id"))  # type: ignore
+                if node is None or obj_json.get("archived", False):
+                    continue
+                item = _as_item(obj_json, model_of(obj_json))
+                node.items.append(item)
+                if item["model"] == "card":
+                    tree_cards[obj_json["id"]] = obj_json
+        for node in nodes.values():
+            node.items = [i for i in node.items if i["model"] != "collection"] + [
+                i for i in node.items if i["model"] == "collection" and i["id"] in nodes
+            ]
+        return cls(root_id=root_collection_id, nodes=nodes, cards=tree_cards)
+
+    @property
+    def root(self) -> CollectionNode:
+        return self.nodes[self.root_id]
+
+    def subtree(self, collection_id: int) -> "CollectionTree":
+        """The tree under one of the collections of this one (no requests)."""
+        if collection_id not in self.nodes:
+            raise ValueError(
+                f"Collection '{collection_id}' is not in the tree of collection '{self.root_id}'"
+            )
+        return CollectionTree(root_id=collection_id, nodes=self.nodes, cards=self.cards)
+
+    def children(self, collection_id: int) -> list[CollectionNode]:
+        return [
+            self.nodes[i["id"]]
+            for i in self.nodes[collection_id].items_of("collection")
+        ]
+
+    def walk(self) -> Iterator[CollectionNode]:
+        """Nodes of the tree, parents first (depth-first)."""
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(self.children(node.id)))
+
+    def levels(self) -> list[list[CollectionNode]]:
+        """Nodes of the tree, grouped by depth (relative to its root)."""
+        result: list[list[CollectionNode]] = []
+        level = [self.root]
+        while level:
+            result.append(level)
+            level = [child for node in level for child in self.children(node.id)]
+        return result
@@ -0,0 +1,503 @@
+"""
+Engine for copying collections.
+The engine first discovers the whole tree of items to copy (including the dependencies between cards,
+via 'card__N' source tables); then it creates the objects in topological waves: collections
+(parents before children), cards (referenced cards before the cards referencing them),
+and finally dashboards and pulses. Inside a wave, objects are created concurrently.
+"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional
+
+from metabase_api.collection_tree import CollectionNode, CollectionTree
+from metabase_api.copy_methods import _pulse_json_for_copy
+from metabase_api.copy_plan import (
+    CopyPlan,
+    PlanWave,
+    PlannedObject,
+    json_size,
+    REQUESTS_TO_CREATE,
+    REQUESTS_TO_DISCOVER,
+    REQUESTS_TO_UPDATE,
+)
+from metabase_api.utility.journal import Journal
+from metabase_api.utility.mbql import card_references, replace_card_references
+from metabase_api.utility.progress import ProgressTracker
+
+_logger = logging.getLogger(__name__)
+
+COPIED_MODELS = {"card", "collection", "dashboard", "pulse"}
+
+
+def dependency_waves(dependencies: dict[int, set[int]]) -> list[list[int]]:
+    """
+    Groups the nodes of a dependency graph in waves: every node only depends on nodes of previous waves.
+    Dependencies on nodes that are not in the graph are ignored.
+    Raises ValueError if there is a cycle.
+    """
+    remaining = {
+        n: {d for d in deps if d in dependencies and d != n}
+        for n, deps in dependencies.items()
+    }
+    waves: list[list[int]] = []
+    while len(remaining) > 0:
+        wave = sorted(n for n, deps in remaining.items() if len(deps) == 0)
+        if len(wave) == 0:
+            raise ValueError(
+                f"Circular references between items {sorted(remaining.keys())}"
+            )
+        waves.append(wave)
+        for n in wave:
+            del remaining[n]
+        for deps in remaining.values():
+            deps.difference_update(wave)
+    return waves
+
+
+class CollectionCopier:
+    """Copies a collection (and all its contents) into a parent collection."""
+
+    def __init__(
+        self,
+        metabase_api: Any,
+        deepcopy_dashboards: bool = False,
+        child_items_postfix: str = "",
+        max_workers: int = 4,
+        verbose: bool = False,
+        journal: Optional[Journal] = None,
+        destination_api: Any = None,
+        tables_equivalencies: Any = None,
+        progress: Optional[ProgressTracker] = None,
+    ):
+        # objects are read from 'metabase_api' and created on 'destination_api' (if any)
+        self.metabase_api = metabase_api
+        self.destination_api = (
+            destination_api if destination_api is not None else metabase_api
+        )
+        self.cross_instance = self.destination_api is not self.metabase_api
+        # 'InstancesTablesEquivalencies', between the source and the destination
+        self.tables_equivalencies = tables_equivalencies
+        # copies on another instance can only use copies of the cards
+        self.deepcopy_dashboards = deepcopy_dashboards or self.cross_instance
+        self.child_items_postfix = child_items_postfix
+        self.max_workers = max(1, max_workers)
+        self.verbose = verbose
+        # objects already copied (by a previous run) are skipped
+        self.journal = journal
+        self.progress = progress if progress is not None else ProgressTracker("copy")
+        self.tree: Optional[CollectionTree] = None
+        # src collection id -> node
+        self.collections: dict[int, CollectionNode] = dict()
+        # full json of the cards to copy, by id
+        self.cards: dict[int, dict[str, Any]] = dict()
+
+    def _print(self, msg: str) -> None:
+        self.metabase_api.verbose_print(self.verbose, msg)
+
+    def _done(self, model: str, src_id: int) -> Optional[Any]:
+        """What was recorded for this object, if it was already copied."""
+        if self.journal is not None and self.journal.has(model, src_id):
+            return self.journal.get(model, src_id)
+        return None
+
+    def _record(self, model: str, src_id: int, value: Any) -> None:
+        if self.journal is not None:
+            self.journal.record(model, src_id, value)
+
+    def discover(self, source_collection_id: int) -> None:
+        """Loads the tree of collections to copy, with all their items."""
+        tree = CollectionTree.load(
+            self.metabase_api, source_collection_id, max_workers=self.max_workers
+        )
+        self.collections = {node.id: node for node in tree.walk()}
+        for node in self.collections.values():
+            for item in node.items:
+                if item["model"] not in COPIED_MODELS:
+                    raise ValueError(
+                        f"We are not copying objects of type '{item['model']}'; specifically the one named '{item['name']}'!!!"
+                    )
+        if self.deepcopy_dashboards:
+            self.cards = {
+                i["id"]: tree.cards[i["id"]]
+                for node in self.collections.values()
+                for i in node.items_of("card")
+            }
+        self.tree = tree
+
+    def card_waves(self) -> list[list[int]]:
+        """Cards, grouped so that referenced cards are copied before the cards referencing them."""
+        return dependency_waves(
+            {
+                card_id: card_references(card_json.get("dataset_query", {}))
+                for card_id, card_json in self.cards.items()
+            }
+        )
+
+    def _create_collections(
+        self,
+        executor: ThreadPoolExecutor,
+        destination_collection_name: str,
+        destination_parent_collection_id: Optional[int],
+        destination_parent_collection_name: Optional[str],
+    ) -> dict[int, int]:
+        """Creates the collections, parents before children. Returns src -> dst ids."""
+        collections_mapping: dict[int, int] = dict()
+
+        def _create(node: CollectionNode) -> int:
+            done = self._done("collection", node.id)
+            if done is not None:
+                self.progress.skipped("collection", node.id)
+                return int(done)
+            with self.progress.item("collection", node.id):
+                return _create_new(node)
+
+        def _create_new(node: CollectionNode) -> int:
+            if node.id == source_collection_id:
+                name = destination_collection_name
+                parent_id = destination_parent_collection_id
+                parent_name = destination_parent_collection_name
+            else:
+                self._print('Copying the collection "{}" ...'.format(node.name))
+                name = node.name
+                assert node.parent_id is not None
+                parent_id = collections_mapping[node.parent_id]
+                parent_name = None
+            res = self.destination_api.create_collection(
+                name,
+                parent_collection_id=parent_id,
+                parent_collection_name=parent_name,
+                return_results=True,
+            )
+            if not res:
+                raise ConnectionRefusedError(
+                    "Current user does not have permissions to create destination collection."
+                )
+            self._record("collection", node.id, int(res["id"]))
+            return int(res["id"])
+
+        assert self.tree is not None
+        source_collection_id = self.tree.root_id
+        for level in self.tree.levels():
+            for node, dst_id in zip(level, executor.map(_create, level)):
+                collections_mapping[node.id] = dst_id
+        return collections_mapping
+
+    def _collection_of(self, model: str) -> dict[int, int]:
+        """src item id -> src collection id, for all items of a model."""
+        return {
+            i["id"]: node.id
+            for node in self.collections.values()
+            for i in node.items_of(model)
+        }
+
+    def _copy_cards(
+        self, executor: ThreadPoolExecutor, collections_mapping: dict[int, int]
+    ) -> dict[int, int]:
+        card_collection = self._collection_of("card")
+        card_id_mapping: dict[int, int] = dict()
+
+        def _copy(card_id: int) -> int:
+            done = self._done("card", card_id)
+            if done is not None:
+                self.progress.skipped("card", card_id)
+                return int(done)
+            with self.progress.item("card", card_id):
+                return _copy_new(card_id)
+
+        def _copy_new(card_id: int) -> int:
+            card_json = self.cards[card_id]
+            self._print('Copying the card "{}" ...'.format(card_json["name"]))
+            if self.cross_instance:
+                card_json = self.tables_equivalencies.card_json_for_destination(
+                    card_json
+                )
+            if "dataset_query" in card_json:
+                # the cards it references are already copied: point to the copies
+                card_json = dict(card_json)
+                card_json["dataset_query"] = replace_card_references(
+                    card_json["dataset_query"], card_id_mapping
+                )
+            dup_card_id = int(
+                self.destination_api.copy_card(
+                    source_card_json=card_json,
+                    destination_collection_id=collections_mapping[
+                        card_collection[card_id]
+                    ],
+                    destination_card_name=card_json["name"] + self.child_items_postfix,
+                )
+            )
+            self._record("card", card_id, dup_card_id)
+            return dup_card_id
+
+        for wave in self.card_waves():
+            for card_id, dup_card_id in zip(wave, executor.map(_copy, wave)):
+                card_id_mapping[card_id] = dup_card_id
+        return card_id_mapping
+
+    def plan(
+        self, source_collection_id: int, migrate: bool = False, translate: bool = False
+    ) -> CopyPlan:
+        """
+        What a copy would do, without doing it: only the tree of the source is loaded.
+        If 'migrate' (or 'translate'), the plan includes the updates of the copied cards and dashboards
+        done by 'migrate_collection'. Objects already copied according to the journal are left out.
+        """
+        self.discover(source_collection_id)
+        assert self.tree is not None
+        plan = CopyPlan(
+            source_collection_id=source_collection_id, max_workers=self.max_workers
+        )
+        plan.waves.append(
+            PlanWave(
+                name="discovery", action="read", extra_requests=REQUESTS_TO_DISCOVER
+            )
+        )
+
+        def _planned(
+            model: str, obj_id: int, payload: Any, requests: dict[str, int]
+        ) -> PlannedObject:
+            name = (
+                self.collections[obj_id].name
+                if model == "collection"
+                else name_of[(model, obj_id)]
+            )
+            return PlannedObject(
+                model=model,
+                id=obj_id,
+                name=name,
+                payload_bytes=json_size(payload),
+                requests=requests,
+            )
+
+        name_of = {
+            (i["model"], i["id"]): i["name"]
+            for node in self.collections.values()
+            for i in node.items
+        }
+        for depth, level in enumerate(self.tree.levels()):
+            plan.waves.append(
+                PlanWave(
+                    name=f"collections at depth {depth}",
+                    action="create",
+                    objects=[
+                        _planned(
+                            "collection",
+                            node.id,
+                            {"name": node.name, "parent_id": 0},
+                            REQUESTS_TO_CREATE["collection"],
+                        )
+                        for node in level
+                        if self._done("collection", node.id) is None
+                    ],
+                )
+            )
+        for idx, wave in enumerate(self.card_waves()):
+            plan.waves.append(
+                PlanWave(
+                    name=f"cards, wave {idx + 1}",
+                    action="create",
+                    objects=[
+                        _planned(
+                            "card",
+                            card_id,
+                            self.cards[card_id],
+                            REQUESTS_TO_CREATE["card"],
+                        )
+                        for card_id in wave
+                        if self._done("card", card_id) is None
+                    ],
+                )
+            )
+        dashboard_requests = REQUESTS_TO_CREATE["dashboard"]
+        items = [i for node in self.collections.values() for i in node.items]
+        plan.waves.append(
+            PlanWave(
+                name="dashboards and pulses",
+                action="create",
+                objects=[
+                    _planned(
+                        i["model"],
+                        i["id"],
+                        i,
+                        dashboard_requests
+                        if i["model"] == "dashboard"
+                        else REQUESTS_TO_CREATE["pulse"],
+                    )
+                    for i in items
+                    if i["model"] in {"dashboard", "pulse"}
+                    and self._done(i["model"], i["id"]) is None
+                ],
+            )
+        )
+        # objects are migrated and translated in the same pass
+        updates = [
+            step
+            for step, wanted in [("migration", migrate), ("translation", translate)]
+            if wanted
+        ]
+        if len(updates) > 0:
+            plan.waves.append(
+                PlanWave(
+                    name=f"{' and '.join(updates)} of the copies",
+                    action="update",
+                    concurrent=False,
+                    objects=[
+                        _planned(
+                            i["model"],
+                            i["id"],
+                            self.tree.cards.get(i["id"], i),
+                            REQUESTS_TO_UPDATE[i["model"]],
+                        )
+                        for i in items
+                        if i["model"] in REQUESTS_TO_UPDATE
+                    ],
+                )
+            )
+        return plan
+
+    def copy(
+        self,
+        source_collection_id: int,
+        destination_collection_name: str,
+        destination_parent_collection_id: Optional[int],
+        destination_parent_collection_name: Optional[str] = None,
+    ) -> dict[str, dict[int, int]]:
+        """Copies; returns a trace of all transformations (see 'copy_collection')."""
+        transf: dict[str, dict[int, int]] = dict()
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor, ThreadPoolExecutor(max_workers=self.max_workers) as reader:
+            self.discover(source_collection_id)
+            self.progress.add_total(
+                len(self.collections)
+                + len(self.cards)
+                + sum(len(self._collection_of(m)) for m in ("dashboard", "pulse"))
+            )
+            # dashboards and pulses are read from the source
+            # while collections and cards are being written on the destination
+            source_jsons: dict[tuple[str, int], Future] = {  # type: ignore
+                (model, obj_id): reader.submit(
+                    self.metabase_api.get, f"/api/{model}/{obj_id}"
+                )
+                for model in ("dashboard", "pulse")
+                for obj_id in self._collection_of(model).keys()
+                if self._done(model, obj_id) is None
+            }
+            collections_mapping = self._create_collections(
+                executor,
+                destination_collection_name=destination_collection_name,
+                destination_parent_collection_id=destination_parent_collection_id,
+                destination_parent_collection_name=destination_parent_collection_name,
+            )
+            transf["collections"] = collections_mapping
+            # first thing we want to do is copy the cards:
+            if self.deepcopy_dashboards:
+                transf["cards"] = self._copy_cards(executor, collections_mapping)
+
+            # then dashboards and pulses, all at once
+            dashboard_collection = self._collection_of("dashboard")
+            pulse_collection = self._collection_of("pulse")
+            name_of = {
+                (i["model"], i["id"]): i["name"]
+                for node in self.collections.values()
+                for i in node.items
+            }
+
+            def _copy_dashboard(dashboard_id: int) -> tuple[int, dict[int, int]]:
+                done = self._done("dashboard", dashboard_id)
+                if done is not None:
+                    self.progress.skipped("dashboard", dashboard_id)
+                    # tabs are kept as pairs: json keys can not be integers
+                    return int(done["id"]), {int(k): int(v) for k, v in done["tabs"]}
+                with self.progress.item("dashboard", dashboard_id):
+                    return _copy_new_dashboard(dashboard_id)
+
+            def _copy_new_dashboard(dashboard_id: int) -> tuple[int, dict[int, int]]:
+                dashboard_name = name_of[("dashboard", dashboard_id)]
+                self._print('Copying the dashboard "{}" ...'.format(dashboard_name))
+                destination_collection_id = collections_mapping[
+                    dashboard_collection[dashboard_id]
+                ]
+                (
+                    dup_dashboard_id,
+                    tabs_equiv,
+                ) = self.destination_api.copy_dashboard_from_json(
+                    source_dashboard_json=source_jsons[
+                        ("dashboard", dashboard_id)
+                    ].result(),
+                    destination_collection_id=destination_collection_id,
+                    destination_dashboard_name=dashboard_name
+                    + self.child_items_postfix,
+                    card_id_mapping=transf["cards"]
+                    if self.deepcopy_dashboards
+                    else None,
+                    remap=self.tables_equivalencies.remap
+                    if self.cross_instance
+                    else None,
+                )
+                self._record(
+                    "dashboard",
+                    dashboard_id,
+                    {"id": dup_dashboard_id, "tabs": sorted(tabs_equiv.items())},
+                )
+                return dup_dashboard_id, tabs_equiv
+
+            dashboard_ids = sorted(dashboard_collection.keys())
+            dashboard_futures = {
+                dashboard_id: executor.submit(_copy_dashboard, dashboard_id)
+                for dashboard_id in dashboard_ids
+            }
+
+            def _copy_pulse(pulse_id: int) -> Optional[int]:
+                done = self._done("pulse", pulse_id)
+                if done is not None:
+                    self.progress.skipped("pulse", pulse_id)
+                    # (older journals only recorded that the pulse was copied)
+                    return None if isinstance(done, bool) else int(done)
+                with self.progress.item("pulse", pulse_id):
+                    return _copy_new_pulse(pulse_id)
+
+            def _copy_new_pulse(pulse_id: int) -> int:
+                pulse_name = name_of[("pulse", pulse_id)]
+                self._print('Copying the pulse "{}" ...'.format(pulse_name))
+                source_pulse_json = source_jsons[("pulse", pulse_id)].result()
+                # a dashboard subscription goes to the copy of its dashboard
+                # (dashboards are submitted before pulses: this wait can not block the workers)
+                dashboard_id = source_pulse_json.get("dashboard_id")
+                dashboard_id_mapping = (
+                    {dashboard_id: dashboard_futures[dashboard_id].result()[0]}
+                    if dashboard_id in dashboard_futures
+                    else None
+                )
+                res = self.destination_api.post(
+                    "/api/pulse",
+                    json=_pulse_json_for_copy(
+                        source_pulse_json,
+                        destination_collection_id=collections_mapping[
+                            pulse_collection[pulse_id]
+                        ],
+                        destination_pulse_name=pulse_name + self.child_items_postfix,
+                        card_id_mapping=transf.get("cards"),
+                        dashboard_id_mapping=dashboard_id_mapping,
+                    ),
+                )
+                if not res:
+                    raise ValueError(f"Impossible to copy the pulse '{pulse_name}'")
+                self._record("pulse", pulse_id, int(res["id"]))
+                return int(res["id"])
+
+            pulse_ids = sorted(pulse_collection.keys())
+            pulses_future = executor.map(_copy_pulse, pulse_ids)
+            transf["dashboards"] = dict()
+            transf["tabs"] = dict()
+            for dashboard_id in dashboard_ids:
+                dup_dashboard_id, tabs_equiv = dashboard_futures[dashboard_id].result()
+                transf["dashboards"][dashboard_id] = dup_dashboard_id
+                transf["tabs"] = transf["tabs"] | tabs_equiv
+            transf["pulses"] = {
+                pulse_id: dup_pulse_id
+                for pulse_id, dup_pulse_id in zip(pulse_ids, pulses_future)
+                if dup_pulse_id is not None
+            }
+        self.progress.finish()
+        return transf
@@ -1,4 +1,5 @@
-from typing import Optional
+from copy import deepcopy
+from typing import Any, Callable, Optional
 
 
 def copy_card(
@@ -12,6 +13,7 @@ def copy_card(
     destination_collection_id=None,
     postfix="",
     verbose=False,
+    source_card_json=None,
 ):
     """
     Copy the card with the given name/id to the given destination collection.
@@ -27,8 +29,13 @@ def copy_card(
     destination_collection_id -- id of the collection to copy the card to (default None)
     postfix -- if destination_card_name is None, adds this string to the end of source_card_name
                             to make destination_card_name
+    source_card_json -- the full json of the source card, if already fetched (default None:
+                        taken from the object store, or fetched)
     """
     ### Making sure we have the data that we need
+    if source_card_json is not None:
+        source_card_id = source_card_json["id"]
+        source_card_name = source_card_json["name"]
     if not source_card_id:
         if not source_card_name:
             raise ValueError(
@@ -52,15 +59,13 @@ def copy_card(
                 "collection", destination_collection_name
             )
 
-    if not destination_card_name:
-        if not source_card_name:
-            source_card_name = self.get_item_name(
-                item_type="card", item_id=source_card_id
-            )
-        destination_card_name = source_card_name + postfix
-
     # Get the source card info
-    source_card = self.get("/api/card/{}".format(source_card_id))
+    if source_card_json is None:
+        source_card_json = self.get_card_json(source_card_id)
+    source_card = deepcopy(source_card_json)
+
+    if not destination_card_name:
+        destination_card_name = source_card["name"] + postfix
 
     # Update the name and collection_id
     card_json = source_card
@@ -147,6 +152,91 @@ def copy_pulse(
     self.post("/api/pulse", json=pulse_json)
 
 
+def _pulse_json_for_copy(
+    source_pulse_json,
+    destination_collection_id,
+    destination_pulse_name,
+    card_id_mapping: Optional[dict[int, int]] = None,
+    dashboard_id_mapping: Optional[dict[int, int]] = None,
+) -> dict:
+    """
+    Json to create a copy of a pulse (or of a dashboard subscription).
+    Cards (and the dashboard) are replaced by their copies; the ones that were not copied are kept.
+    """
+    card_id_mapping = card_id_mapping if card_id_mapping is not None else dict()
+    dashboard_id_mapping = (
+        dashboard_id_mapping if dashboard_id_mapping is not None else dict()
+    )
+    pulse_json = {
+        k: deepcopy(v)
+        for k, v in source_pulse_json.items()
+        if k not in {"id", "created_at", "updated_at", "creator", "entity_id"}
+    }
+    pulse_json["collection_id"] = destination_collection_id
+    pulse_json["name"] = destination_pulse_name
+    dashboard_id = pulse_json.get("dashboard_id")
+    dashboard_copied = dashboard_id in dashboard_id_mapping
+    if dashboard_copied:
+        pulse_json["dashboard_id"] = dashboard_id_mapping[dashboard_id]
+    pulse_json["cards"] = [
+        dict(
+            c,
+            id=card_id_mapping.get(c["id"], c["id"]),
+            # the cards of the copied dashboard have new ids, unknown here
+            **({"dashboard_card_id": None} if dashboard_copied else {}),
+        )
+        for c in pulse_json.get("cards", list())
+    ]
+    return pulse_json
+
+
+def copy_pulses(
+    self,
+    source_pulse_ids,
+    destination_collection_id,
+    card_id_mapping=None,
+    dashboard_id_mapping=None,
+    postfix="",
+    max_workers=4,
+) -> dict[int, int]:
+    """
+    Copy several pulses (or dashboard subscriptions) to the given destination collection, concurrently.
+
+    Keyword arguments:
+    source_pulse_ids -- ids of the pulses to copy
+    destination_collection_id -- id of the collection to copy the pulses to
+    card_id_mapping -- old card id -> new card id, for the cards already copied (default None: same cards)
+    dashboard_id_mapping -- old dashboard id -> new dashboard id, for the dashboards already copied (default None)
+    postfix -- added to the end of the name of each pulse (default '')
+    max_workers -- maximum number of pulses copied at the same time (default 4)
+
+    :return the mapping old pulse id -> new pulse id.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _copy(pulse_id: int) -> int:
+        source_pulse = self.get("/api/pulse/{}".format(pulse_id))
+        if not source_pulse:
+            raise ValueError(f"Impossible to get the pulse '{pulse_id}'")
+        res = self.post(
+            "/api/pulse",
+            json=_pulse_json_for_copy(
+                source_pulse,
+                destination_collection_id=destination_collection_id,
+                destination_pulse_name=source_pulse["name"] + postfix,
+                card_id_mapping=card_id_mapping,
+                dashboard_id_mapping=dashboard_id_mapping,
+            ),
+        )
+        if not res:
+            raise ValueError(f"Impossible to copy the pulse '{source_pulse['name']}'")
+        return int(res["id"])
+
+    source_pulse_ids = list(source_pulse_ids)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return dict(zip(source_pulse_ids, executor.map(_copy, source_pulse_ids)))
+
+
 def copy_dashboard(
     self,
     source_dashboard_name=None,
@@ -158,7 +248,8 @@ def copy_dashboard(
     destination_collection_id=None,
     postfix="",
     card_id_mapping: Optional[dict[int, int]] = None,
-):
+    source_dashboard_json=None,
+) -> tuple[int, dict[int, int]]:
     """
     Copy the dashboard with the given name/id to the given destination collection.
 
@@ -177,8 +268,14 @@ def copy_dashboard(
     postfix -- if destination_dashboard_name is None, adds this string to the end of source_dashboard_name
                             to make destination_dashboard_name
     card_id_mapping -- Optionally, a mapping for cards: old_id -> new_id for the dashboard to update itself.
+    source_dashboard_json -- json of the source dashboard, if already fetched (default None: it is fetched).
+                                                    With it, copying a dashboard takes 2 requests.
+
+    :return the id of the new dashboard, and the mapping old tab id -> new tab id.
     """
     ### making sure we have the data that we need
+    if source_dashboard_json is not None:
+        source_dashboard_id = source_dashboard_json["id"]
     if not source_dashboard_id:
         if not source_dashboard_name:
             raise ValueError(
@@ -192,6 +289,14 @@ def copy_dashboard(
                 collection_name=source_collection_name,
             )
 
+    # the dashboard is created from the json of the source (fetched only if it was not given),
+    # then filled with its tabs and cards in one go
+    if source_dashboard_json is None:
+        source_dashboard_json = self.get(
+            "/api/dashboard/{}".format(source_dashboard_id)
+        )
+    source_dashboard_name = source_dashboard_json["name"]
+
     if not destination_collection_id:
         if not destination_collection_name:
             raise ValueError(
@@ -203,52 +308,166 @@ def copy_dashboard(
             )
 
     if not destination_dashboard_name:
-        if not source_dashboard_name:
-            source_dashboard_name = self.get_item_name(
-                item_type="dashboard", item_id=source_dashboard_id
-            )
         destination_dashboard_name = source_dashboard_name + postfix
 
-    # tabs
-    tabs_equiv: dict[int, int] = {}
-    # shallow-copy
-    shallow_copy_json = {
-        "collection_id": destination_collection_id,
-        "name": destination_dashboard_name,
-    }
-    shallow_dashboard = self.post(
-        "/api/dashboard/{}/copy".format(source_dashboard_id), json=shallow_copy_json
+    return self.copy_dashboard_from_json(
+        source_dashboard_json=source_dashboard_json,
+        destination_collection_id=destination_collection_id,
+        destination_dashboard_name=destination_dashboard_name,
+        card_id_mapping=card_id_mapping,
     )
-    dup_dashboard_id = shallow_dashboard["id"]
-    dup_dashboard = self.get("/api/dashboard/{}".format(dup_dashboard_id))
-    # tabs' equivalence generation
-    src_dashboard = self.get("/api/dashboard/{}".format(source_dashboard_id))
-    for dup_tab in dup_dashboard.get("tabs", list()):
-        # equiv in src
-        src_tab = [t for t in src_dashboard["tabs"] if t["name"] == dup_tab["name"]][0]
-        tabs_equiv[src_tab["id"]] = dup_tab["id"]
-    # do we need to re-map?
-    # cards
-    if card_id_mapping is not None:
-        for card in dup_dashboard["dashcards"]:
-            # ignore text boxes. These get copied in the shallow-copy stage.
-            if card["card_id"] is None:
-                continue
-            # replace values
-            # todo: should we change update date/creation date too...?
-            try:
-                new_card_id = card_id_mapping[card["card_id"]]
-            except KeyError as ke:
-                raise KeyError(
-                    f"Card {card['card_id']} is referenced in dashboard but we can't find the card itself."
-                ) from ke
-            card["card_id"] = new_card_id
-            card["card"]["id"] = new_card_id
-            # we need not to hit any existing id... that's why '100 *'.
-            # todo: Can we do anything better?
-            card["id"] = 100 * card["id"] + 1
-        assert self.put(f"/api/dashboard/{dup_dashboard_id}", json=dup_dashboard) == 200
 
+
+# settings of a dashboard that are kept in its copies
+COPIED_DASHBOARD_SETTINGS = ("width", "auto_apply_filters", "cache_ttl")
+
+
+def _card_id_mapper(
+    card_id_mapping: Optional[dict[int, int]]
+) -> Callable[[Optional[int]], Optional[int]]:
+    """old card id -> new card id; ids are kept if there is no mapping."""
+
+    def _card_id(card_id):
+        if card_id is None or card_id_mapping is None:
+            return card_id
+        try:
+            return card_id_mapping[card_id]
+        except KeyError as ke:
+            raise KeyError(
+                f"Card {card_id} is referenced in dashboard but we can't find the card itself."
+            ) from ke
+
+    return _card_id
+
+
+def _dashboard_parameters(source_dashboard_json, card_id) -> list:
+    parameters = deepcopy(source_dashboard_json.get("parameters", []))
+    for param in parameters:
+        values_source = param.get("values_source_config") or {}
+        if "card_id" in values_source:
+            values_source["card_id"] = card_id(values_source["card_id"])
+    return parameters
+
+
+def _fill_dashboard(
+    metabase_api,
+    dashboard_id,
+    source_dashboard_json,
+    card_id_mapping: Optional[dict[int, int]] = None,
+    remap: Optional[Callable[[Any], Any]] = None,
+    extra_json: Optional[dict] = None,
+) -> dict[int, int]:
+    """
+    Replaces the tabs and cards of a dashboard by the ones of another one (with one PUT).
+    Returns the mapping old tab id -> new tab id.
+    """
+    src = source_dashboard_json
+    card_id = _card_id_mapper(card_id_mapping)
+    remap = remap if remap is not None else (lambda x: x)
+    # new tabs and cards are the ones with negative ids; the ones not mentioned are removed
+    src_tabs = sorted(src.get("tabs", list()), key=lambda t: t.get("position", 0))
+    new_tab_ids = {t["id"]: -(idx + 1) for idx, t in enumerate(src_tabs)}
+    dashcards = []
+    for idx, dashcard in enumerate(src.get("dashcards", list())):
+        new_dashcard = {
+            k: deepcopy(v)
+            for k, v in dashcard.items()
+            if k
+            not in {
+                "id",
+                "dashboard_id",
+                "card",
+                "created_at",
+                "updated_at",
+                "entity_id",
+            }
+        }
+        new_dashcard["id"] = -(idx + 1)
+        new_dashcard["card_id"] = card_id(dashcard.get("card_id"))
+        new_dashcard["dashboard_tab_id"] = new_tab_ids.get(
+            dashcard.get("dashboard_tab_id")
+        )
+        new_dashcard["series"] = [
+            {"id": card_id(c["id"])} for c in dashcard.get("series", list())
+        ]
+        new_dashcard["parameter_mappings"] = [
+            remap(dict(m, card_id=card_id(m.get("card_id"))))
+            for m in dashcard.get("parameter_mappings", list())
+        ]
+        new_dashcard["visualization_settings"] = remap(
+            dashcard.get("visualization_settings", dict())
+        )
+        dashcards.append(new_dashcard)
+    put_json = {
+        **(extra_json if extra_json is not None else dict()),
+        "dashcards": dashcards,
+        "tabs": [
+            {"id": new_tab_ids[t["id"]], "name": t["name"], "position": idx}
+            for idx, t in enumerate(src_tabs)
+        ],
+    }
+    r = metabase_api.put(f"/api/dashboard/{dashboard_id}", "raw", json=put_json)
+    if not r.ok:
+        raise ValueError(
+            f"Problems filling dashboard '{dashboard_id}'; code {r.status_code}"
+        )
+    dup_tabs = r.json().get("tabs")
+    if dup_tabs is None:
+        dup_tabs = metabase_api.get(f"/api/dashboard/{dashboard_id}").get(
+            "tabs", list()
+        )
+    # tabs keep their position
+    dup_tab_at = {t.get("position", idx): t["id"] for idx, t in enumerate(dup_tabs)}
+    return {
+        t["id"]: dup_tab_at[idx] for idx, t in enumerate(src_tabs) if idx in dup_tab_at
+    }
+
+
+def copy_dashboard_from_json(
+    self,
+    source_dashboard_json,
+    destination_collection_id,
+    destination_dashboard_name,
+    card_id_mapping: Optional[dict[int, int]] = None,
+    remap: Optional[Callable[[Any], Any]] = None,
+) -> tuple[int, dict[int, int]]:
+    """
+    Creates a copy of a dashboard from its json (eg, fetched from another Metabase instance):
+    the dashboard is created, then its tabs and cards are added in one go.
+
+    Keyword arguments:
+    source_dashboard_json -- json of the dashboard to copy, as given by '/api/dashboard/{id}'
+    destination_collection_id -- id of the collection to copy the dashboard to
+    destination_dashboard_name -- name used for the dashboard in destination
+    card_id_mapping -- mapping for cards: old_id -> new_id (default None: the copy shows the same cards)
+    remap -- function applied to the parameter mappings and settings of the dashboard's cards,
+                    eg to use the columns of another database (default None: they are kept as they are)
+
+    :return the id of the new dashboard, and the mapping old tab id -> new tab id.
+    """
+    src = source_dashboard_json
+    res = self.post(
+        "/api/dashboard",
+        json={
+            "name": destination_dashboard_name,
+            "collection_id": destination_collection_id,
+            "description": src.get("description"),
+            "parameters": _dashboard_parameters(src, _card_id_mapper(card_id_mapping)),
+        },
+    )
+    if not res:
+        raise ValueError(
+            f"Impossible to create the dashboard '{destination_dashboard_name}'"
+        )
+    dup_dashboard_id = res["id"]
+    tabs_equiv = _fill_dashboard(
+        self,
+        dup_dashboard_id,
+        src,
+        card_id_mapping=card_id_mapping,
+        remap=remap,
+        extra_json={k: src[k] for k in COPIED_DASHBOARD_SETTINGS if k in src},
+    )
     return dup_dashboard_id, tabs_equiv
 
 
@@ -263,6 +482,11 @@ def copy_collection(
     postfix="",
     child_items_postfix="",
     verbose=False,
+    max_workers=4,
+    journal_path=None,
+    destination_api=None,
+    tables_equivalencies=None,
+    progress=None,
 ) -> dict[str, dict[int, int]]:
     """
     Copy the collection with the given name/id into the given destination parent collection.
@@ -283,15 +507,36 @@ def copy_collection(
     postfix -- if destination_collection_name is None, adds this string to the end of source_collection_name to make destination_collection_name.
     child_items_postfix -- this string is added to the end of the child items' names, when saving them in the destination (default '').
     verbose -- prints extra information (default False)
+    max_workers -- maximum number of objects created at the same time (default 4).
+                                The whole tree is discovered first; then collections, cards (referenced cards first;
+                                references to copied cards are updated), dashboards and pulses (pointing to the copied cards)
+                                are created in waves.
+    journal_path -- file where every copied object is recorded (default None: no journal).
+                                If the file exists, the copy resumes from it: the objects already copied are not copied again.
+    destination_api -- Metabase_API of another instance, to copy the collection to (default None: this instance).
+                                The destination parent collection is one of that instance; the cards are always copied.
+    tables_equivalencies -- when copying to another instance, the equivalencies between the databases
+                                of both instances ('InstancesTablesEquivalencies'); cards and dashboards are updated to use them.
+    progress -- callable (or list of callables) called with a 'ProgressEvent' after each object copied (default None).
+                                See 'metabase_api.utility.progress' for a log sink and a terminal progress bar.
 
     :return (eg)
         transf: dict[str, dict[int, int]] = {
+        'collections': {
+            5: 50
+        },
         'cards': {
             764: 876,
             22: 33
         },
-        'dashboard': {
+        'dashboards': {
             1: 11
+        },
+        'tabs': {
+            3: 30
+        },
+        'pulses': {
+            8: 80
         }
     }
 
@@ -307,6 +552,12 @@ def copy_collection(
                 "collection", source_collection_name
             )
 
+    if (destination_api is not None) and (tables_equivalencies is None):
+        raise ValueError(
+            "Copying to another instance needs the equivalencies between the tables of both instances."
+        )
+    destination = destination_api if destination_api is not None else self
+
     if not destination_parent_collection_id:
         if not destination_parent_collection_name:
             raise ValueError(
@@ -314,7 +565,9 @@ def copy_collection(
             )
         else:
             destination_parent_collection_id = (
-                self.get_item_id("collection", destination_parent_collection_name)
+                destination.get_item_id(
+                    "collection", destination_parent_collection_name
+                )
                 if destination_parent_collection_name != "Root"
                 else None
             )
@@ -327,95 +580,90 @@ def copy_collection(
         destination_collection_name = source_collection_name + postfix
 
     # we'll return a trace of all transformations, in format 'src:dst'
-    transf: dict[str, dict[int, int]] = dict()
-
-    # create a collection in the destination to hold the contents of the source collection
-    res = self.create_collection(
-        destination_collection_name,
-        parent_collection_id=destination_parent_collection_id,
-        parent_collection_name=destination_parent_collection_name,
-        return_results=True,
-    )
-    if not res:
-        raise ConnectionRefusedError(
-            "Current user does not have permissions to create destination collection."
-        )
-    destination_collection_id = res["id"]
-
-    # get the items to copy
-    items = self.get("/api/collection/{}/items".format(source_collection_id))["data"]
-
-    # copy the items of the source collection to the new collection
-    # first thing we want to do is copy the cards:
-    card_id_mapping = {}
-    if deepcopy_dashboards:
-        card_items = [c for c in items if c["model"] == "card"]
-        for card in card_items:
-            card_id = card["id"]
-            card_name = card["name"]
-            destination_card_name = card_name + child_items_postfix
-            self.verbose_print(verbose, 'Copying the card "{}" ...'.format(card_name))
-            dup_card_id = self.copy_card(
-                source_card_id=card_id,
-                destination_collection_id=destination_collection_id,
-                destination_card_name=destination_card_name,
-            )
-            card_id_mapping[card_id] = dup_card_id
-        transf["cards"] = card_id_mapping
-    # next we want to copy all internal collections (as they might contain cards too)
-    collection_items = [c for c in items if c["model"] == "collection"]
-    for collection in collection_items:
-        collection_id = collection["id"]
-        collection_name = collection["name"]
-        # destination_collection_name = collection_name + child_items_postfix
-        self.verbose_print(
-            verbose, 'Copying the collection "{}" ...'.format(collection_name)
-        )
-        int_transf = self.copy_collection(
-            source_collection_id=collection_id,
-            destination_parent_collection_id=destination_collection_id,
-            child_items_postfix=child_items_postfix,
-            deepcopy_dashboards=deepcopy_dashboards,
-            verbose=verbose,
+    from metabase_api.copy_engine import CollectionCopier
+    from metabase_api.utility.journal import Journal, copy_journal_header
+    from metabase_api.utility.progress import ProgressTracker
+
+    return CollectionCopier(
+        self,
+        deepcopy_dashboards=deepcopy_dashboards,
+        child_items_postfix=child_items_postfix,
+        max_workers=max_workers,
+        verbose=verbose,
+        journal=Journal(
+            journal_path,
+            header=copy_journal_header(
+                source_collection_id,
+                destination_parent_collection_id=destination_parent_collection_id,
+                destination_collection_name=destination_collection_name,
+            ),
         )
-        # updates the transformations
-        for k in set(transf.keys()).union(int_transf.keys()):
-            transf[k] = transf.get(k, {}) | int_transf.get(k, {})
-    # let's now create all other items
-    transf["dashboards"]: dict[int, int] = dict()
-    transf["tabs"]: dict[int, int] = dict()
-    for item in items:
-        if item["model"] == "dashboard":  # copy a dashboard
-            dashboard_id = item["id"]
-            dashboard_name = item["name"]
-            destination_dashboard_name = dashboard_name + child_items_postfix
-            self.verbose_print(
-                verbose, 'Copying the dashboard "{}" ...'.format(dashboard_name)
-            )
-            dup_dashboard_id, tabs_equiv = self.copy_dashboard(
-                source_dashboard_id=dashboard_id,
-                destination_collection_id=destination_collection_id,
-                destination_dashboard_name=destination_dashboard_name,
-                card_id_mapping=transf["cards"] if deepcopy_dashboards else None,
-            )
-            transf["dashboards"][dashboard_id] = dup_dashboard_id
-            transf["tabs"] = transf["tabs"] | tabs_equiv
-        # copy a pulse
-        elif item["model"] == "pulse":
-            pulse_id = item["id"]
-            pulse_name = item["name"]
-            destination_pulse_name = pulse_name + child_items_postfix
-            self.verbose_print(verbose, 'Copying the pulse "{}" ...'.format(pulse_name))
-            self.copy_pulse(
-                source_pulse_id=pulse_id,
-                destination_collection_id=destination_collection_id,
-                destination_pulse_name=destination_pulse_name,
-            )
-        elif (item["model"] == "card") or (item["model"] == "collection"):
-            # all good, we already copied it! (see just before this loop)
-            continue
-        else:
+        if journal_path is not None
+        else None,
+        destination_api=destination_api,
+        tables_equivalencies=tables_equivalencies,
+        progress=ProgressTracker("copy", progress),
+    ).copy(
+        source_collection_id=source_collection_id,
+        destination_collection_name=destination_collection_name,
+        destination_parent_collection_id=destination_parent_collection_id,
+        destination_parent_collection_name=destination_parent_collection_name,
+    )
+
+
+def plan_copy_collection(
+    self,
+    source_collection_name=None,
+    source_collection_id=None,
+    deepcopy_dashboards=False,
+    max_workers=4,
+    migrate=False,
+    translate=False,
+    measure_latency=True,
+    journal_path=None,
+    verbose=False,
+):
+    """
+    Plan of what 'copy_collection' would do, without doing it (dry run): the objects to create
+    (and to update, for a migration), in order, with the expected number of requests and bytes sent.
+
+    Keyword arguments:
+    source_collection_name -- name of the collection to copy (default None)
+    source_collection_id -- id of the collection to copy (default None)
+    deepcopy_dashboards -- whether the cards would be copied too (default False). See 'copy_collection'.
+    max_workers -- maximum number of objects created at the same time (default 4)
+    migrate -- whether to plan for the migration of the copy too, as 'migrate_collection' does it (default False)
+    translate -- whether to plan for the translation of the copy too (default False)
+    measure_latency -- whether to time a few requests to the server to estimate the duration (default True)
+    journal_path -- journal of a previous copy, to plan only for what is left to do (default None)
+    verbose -- prints the summary of the plan (default False)
+
+    :return the plan ('CopyPlan'); its 'summary' describes it.
+    """
+    from metabase_api.copy_engine import CollectionCopier
+    from metabase_api.copy_plan import measure_latency as _measure_latency
+    from metabase_api.utility.journal import Journal, copy_journal_header
+
+    if not source_collection_id:
+        if not source_collection_name:
             raise ValueError(
-                f"We are not copying objects of type '{item['model']}'; specifically the one named '{item['name']}'!!!"
+                "Either the name or id of the source collection must be provided."
             )
-    return transf
+        source_collection_id = self.get_item_id("collection", source_collection_name)
+    plan = CollectionCopier(
+        self,
+        deepcopy_dashboards=deepcopy_dashboards or migrate,
+        max_workers=max_workers,
+        verbose=verbose,
+        # (planning does not create nor change the journal)
+        journal=Journal(
+            journal_path,
+            header=copy_journal_header(source_collection_id),
+            read_only=True,
+        )
+        if journal_path is not None
+        else None,
+    ).plan(source_collection_id, migrate=migrate, translate=translate)
+    latency = _measure_latency(self) if measure_latency else None
+    self.verbose_print(verbose, plan.summary(latency=latency))
+    return plan
@@ -0,0 +1,146 @@
+"""
+Plans of copies (and migrations) of collections: what would be created or updated, in which order,
+and what it would cost in requests, bytes and time. Computing a plan does not change anything.
+"""
+import json
+import logging
+import math
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+_logger = logging.getLogger(__name__)
+
+# requests needed to create one object, by method
+REQUESTS_TO_CREATE: dict[str, dict[str, int]] = {
+    "collection": {"POST": 1},
+    "card": {"POST": 1},
+    "dashboard": {"GET": 1, "POST": 1, "PUT": 1},
+    "pulse": {"GET": 1, "POST": 1},
+}
+# requests needed to update (migrate, translate) one object, by method
+REQUESTS_TO_UPDATE: dict[str, dict[str, int]] = {
+    "card": {"PUT": 1},
+    "dashboard": {"GET": 1, "PUT": 1},
+}
+# requests needed to load a tree of collections (see 'CollectionTree.load')
+REQUESTS_TO_DISCOVER: dict[str, int] = {"GET": 4}
+
+
+def json_size(obj: Any) -> int:
+    """Size (in bytes) of an object, sent as json."""
+    return len(json.dumps(obj).encode("utf-8"))
+
+
+def measure_latency(metabase_api: Any, samples: int = 3) -> float:
+    """Median duration (in seconds) of a small request to the server."""
+    durations = []
+    for _ in range(max(1, samples)):
+        start = time.perf_counter()
+        metabase_api.get("/api/user/current")
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+@dataclass
+class PlannedObject:
+    model: str
+    id: int
+    name: str
+    payload_bytes: int
+    requests: dict[str, int]
+
+
+@dataclass
+class PlanWave:
+    """Objects handled together; waves are done one after the other."""
+
+    name: str
+    action: str  # 'read', 'create' or 'update'
+    objects: list[PlannedObject] = field(default_factory=list)
+    concurrent: bool = True
+    extra_requests: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def requests(self) -> Counter:  # type: ignore
+        c: Counter = Counter(self.extra_requests)  # type: ignore
+        for o in self.objects:
+            c.update(o.requests)
+        return c
+
+    @property
+    def payload_bytes(self) -> int:
+        return sum(o.payload_bytes for o in self.objects)
+
+    def estimated_seconds(self, latency: float, max_workers: int) -> float:
+        """Objects are handled by 'max_workers' threads (or one by one), each request costing 'latency'."""
+        seconds = sum(self.extra_requests.values()) * latency
+        if len(self.objects) == 0:
+            return seconds
+        per_object = max(sum(o.requests.values()) for o in self.objects) * latency
+        workers = max_workers if self.concurrent else 1
+        return seconds + math.ceil(len(self.objects) / workers) * per_object
+
+
+@dataclass
+class CopyPlan:
+    """Plan of a copy (and, optionally, a migration) of a collection."""
+
+    source_collection_id: int
+    max_workers: int
+    waves: list[PlanWave] = field(default_factory=list)
+
+    @property
+    def requests(self) -> Counter:  # type: ignore
+        c: Counter = Counter()  # type: ignore
+        for w in self.waves:
+            c.update(w.requests)
+        return c
+
+    @property
+    def payload_bytes(self) -> int:
+        return sum(w.payload_bytes for w in self.waves)
+
+    def estimated_seconds(self, latency: float) -> float:
+        return sum(w.estimated_seconds(latency, self.max_workers) for w in self.waves)
+
+    def largest_objects(self, n: int = 5) -> list[PlannedObject]:
+        """The objects with the biggest payloads; good candidates for trouble."""
+        all_objects = {(o.model, o.id): o for w in self.waves for o in w.objects}
+        return sorted(all_objects.values(), key=lambda o: -o.payload_bytes)[:n]
+
+    def summary(self, latency: Optional[float] = None) -> str:
+        lines = [f"Plan for collection {self.source_collection_id}:"]
+        for idx, w in enumerate(self.waves):
+            models = Counter(o.model for o in w.objects)
+            lines.append(
+                f"  {idx + 1}. {w.name} ({w.action}): "
+                + (
+                    ", ".join(f"{n} {m}(s)" for m, n in sorted(models.items()))
+                    or "no objects"
+                )
+                + f"; {sum(w.requests.values())} requests, {w.payload_bytes} bytes"
+            )
+        requests = self.requests
+        lines.append(
+            "Total: "
+            + ", ".join(f"{n} {m}" for m, n in sorted(requests.items()))
+            + f" ({sum(requests.values())} requests), {self.payload_bytes} bytes sent"
+        )
+        largest = self.largest_objects()
+        if len(largest) > 0:
+            lines.append(
+                "Largest: "
+                + ", ".join(
+                    f"{o.model} {o.id} '{o.name}' ({o.payload_bytes} bytes)"
+                    for o in largest
+                )
+            )
+        if latency is not None:
+            lines.append(
+                f"Estimated duration: {self.estimated_seconds(latency):.1f} seconds "
+                f"(latency {1000 * latency:.0f} ms, {self.max_workers} workers)"
+            )
+        return "\n".join(lines)
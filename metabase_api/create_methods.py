@@ -1,4 +1,4 @@
-def create_card(
+def _card_json(
     self,
     card_name=None,
     collection_name=None,
@@ -10,27 +10,10 @@ def create_card(
     column_order="db_table_order",
     custom_json=None,
     verbose=False,
-    return_card=False,
 ):
     """
-    Create a card using the given arguments utilizing the endpoint 'POST /api/card/'.
-    If collection is not given, the root collection is used.
-
-    Keyword arguments:
-    card_name -- the name used to create the card (default None)
-    collection_name -- name of the collection to place the card (default None).
-    collection_id -- id of the collection to place the card (default None)
-    db_name -- name of the db that is used as the source of data (default None)
-    db_id -- id of the db used as the source of data (default None)
-    table_name -- name of the table used as the source of data (default None)
-    table_id -- id of the table used as the source of data (default None)
-    column_order -- order for showing columns. Accepted values are 'alphabetical', 'db_table_order' (default)
-                                    or a list of column names
-    custom_json -- key-value pairs that can provide some or all the data needed for creating the card (default None).
-                                    If you are providing only this argument, the keys 'name', 'dataset_query' and 'display' are required
-                                    (https://github.com/metabase/metabase/blob/master/docs/api-documentation.md#post-apicard).
-    verbose -- whether to print extra information (default False)
-    return_card --    whather to return the created card info (default False)
+    The json that 'create_card' posts, for the same arguments (see there).
+    Returns None if some of the columns in 'column_order' are not in the table.
     """
     if custom_json:
         assert type(custom_json) == dict
@@ -72,13 +55,7 @@ def create_card(
                 )
 
             # Create the card using only the provided custom_json
-            res = self.post("/api/card/", json=custom_json)
-            if res and not res.get("error"):
-                self.verbose_print(verbose, "The card was created successfully.")
-                return res if return_card else None
-            else:
-                print("Card Creation Failed.\n", res)
-                return res
+            return custom_json
 
     # Making sure we have the required data
     if not card_name and (not custom_json or not custom_json.get("name")):
@@ -89,10 +66,11 @@ def create_card(
         if not table_name:
             raise ValueError("Either the name or id of the table must be provided.")
         table_id = self.get_item_id("table", table_name, db_id=db_id, db_name=db_name)
-    if not table_name:
-        table_name = self.get_item_name(item_type="table", item_id=table_id)
-    if not db_id:
-        db_id = self.get_db_id_from_table_id(table_id)
+    # name and db of the table, together with its columns, come from its (cached) metadata
+    table_columns = self.get_table_columns_in_order(table_id)
+    table_md = self.get_table_metadata(table_id=table_id, use_cache=True)
+    table_name = table_md["name"]
+    db_id = table_md["db_id"]
 
     # Get collection_id if it is not given
     if not collection_id:
@@ -106,51 +84,23 @@ def create_card(
 
     if type(column_order) == list:
 
-        column_name_id_dict = self.get_columns_name_id(
-            db_id=db_id, table_id=table_id, table_name=table_name, verbose=verbose
-        )
+        column_name_id_dict = {c["name"]: c["id"] for c in table_columns}
         try:
             column_id_list = [column_name_id_dict[i] for i in column_order]
-        except ValueError as e:
+        except KeyError as e:
             print(
                 "The column name {} is not in the table {}. \nThe card creation failed!".format(
                     e, table_name
                 )
             )
-            return False
+            return None
 
         column_id_list_str = [["field-id", i] for i in column_id_list]
 
     elif column_order == "db_table_order":  # default
 
-        ### find the actual order of columns in the table as they appear in the database
-        # Create a temporary card for retrieving column ordering
-        json_str = """{{'dataset_query': {{ 'database': {1},
-                                            'native': {{'query': 'SELECT * from "{2}";' }},
-                                            'type': 'native' }},
-                        'display': 'table',
-                        'name': '{0}',
-                        'visualization_settings': {{}} }}""".format(
-            card_name, db_id, table_name
-        )
-
-        res = self.post("/api/card/", json=eval(json_str))
-        if not res:
-            print("Card Creation Failed!")
-            return res
-        ordered_columns = [
-            i["name"] for i in res["result_metadata"]
-        ]  # retrieving the column ordering
-
-        # Delete the temporary card
-        card_id = res["id"]
-        self.delete("/api/card/{}".format(card_id))
-
-        column_name_id_dict = self.get_columns_name_id(
-            db_id=db_id, table_id=table_id, table_name=table_name, verbose=verbose
-        )
-        column_id_list = [column_name_id_dict[i] for i in ordered_columns]
-        column_id_list_str = [["field-id", i] for i in column_id_list]
+        # the order of columns in the table as they appear in the database
+        column_id_list_str = [["field-id", c["id"]] for c in table_columns]
 
     elif column_order == "alphabetical":
         column_id_list_str = None
@@ -162,18 +112,17 @@ def create_card(
         )
 
     # default json
-    json_str = """{{'dataset_query': {{'database': {1},
-                                        'query': {{'fields': {4},
-                                                                'source-table': {2}}},
-                                        'type': 'query'}},
-                    'display': 'table',
-                    'name': '{0}',
-                    'collection_id': {3},
-                    'visualization_settings': {{}}
-                    }}""".format(
-        card_name, db_id, table_id, collection_id, column_id_list_str
-    )
-    json = eval(json_str)
+    json = {
+        "dataset_query": {
+            "database": db_id,
+            "query": {"fields": column_id_list_str, "source-table": table_id},
+            "type": "query",
+        },
+        "display": "table",
+        "name": card_name if card_name else custom_json["name"],
+        "collection_id": collection_id,
+        "visualization_settings": {},
+    }
 
     # Add/Rewrite data to the default json from custom_json
     if custom_json:
@@ -184,23 +133,76 @@ def create_card(
                 )
                 continue
             json[key] = value
+    return json
+
+
+def create_card(
+    self,
+    card_name=None,
+    collection_name=None,
+    collection_id=None,
+    db_name=None,
+    db_id=None,
+    table_name=None,
+    table_id=None,
+    column_order="db_table_order",
+    custom_json=None,
+    verbose=False,
+    return_card=False,
+):
+    """
+    Create a card using the given arguments utilizing the endpoint 'POST /api/card/'.
+    If collection is not given, the root collection is used.
+
+    Keyword arguments:
+    card_name -- the name used to create the card (default None)
+    collection_name -- name of the collection to place the card (default None).
+    collection_id -- id of the collection to place the card (default None)
+    db_name -- name of the db that is used as the source of data (default None)
+    db_id -- id of the db used as the source of data (default None)
+    table_name -- name of the table used as the source of data (default None)
+    table_id -- id of the table used as the source of data (default None)
+    column_order -- order for showing columns. Accepted values are 'alphabetical', 'db_table_order' (default)
+                                    or a list of column names. The columns (and their order in the database)
+                                    are taken from the metadata of the table, which is cached.
+    custom_json -- key-value pairs that can provide some or all the data needed for creating the card (default None).
+                                    If you are providing only this argument, the keys 'name', 'dataset_query' and 'display' are required
+                                    (https://github.com/metabase/metabase/blob/master/docs/api-documentation.md#post-apicard).
+    verbose -- whether to print extra information (default False)
+    return_card --    whather to return the created card info (default False)
+    """
+    json = _card_json(
+        self,
+        card_name=card_name,
+        collection_name=collection_name,
+        collection_id=collection_id,
+        db_name=db_name,
+        db_id=db_id,
+        table_name=table_name,
+        table_id=table_id,
+        column_order=column_order,
+        custom_json=custom_json,
+        verbose=verbose,
+    )
+    if json is None:
+        return False
 
     res = self.post("/api/card/", json=json)
 
     # Get collection_name to be used in the final message
-    if not collection_name:
-        if not collection_id:
+    if verbose and not collection_name:
+        if not json.get("collection_id"):
             collection_name = "root"
         else:
             collection_name = self.get_item_name(
-                item_type="collection", item_id=collection_id
+                item_type="collection", item_id=json["collection_id"]
             )
 
     if res and not res.get("error"):
         self.verbose_print(
             verbose,
             "The card '{}' was created successfully in the collection '{}'.".format(
-                card_name, collection_name
+                json["name"], collection_name
             ),
         )
         if return_card:
@@ -210,6 +212,285 @@ def create_card(
         return res
 
 
+def _resolve_card_specs(self, specs: list[dict]) -> list[dict]:
+    """
+    Turns card specs into arguments for 'create_card', where all names are replaced by ids.
+    Collections, databases and tables are listed (at most) once for all the specs.
+    Raises ValueError listing ALL the problems found.
+    """
+    from copy import deepcopy
+
+    def _by_name(items: list[dict]) -> dict[str, list[dict]]:
+        d: dict[str, list[dict]] = {}
+        for i in items:
+            d.setdefault(i["name"], []).append(i)
+        return d
+
+    def _needs(*keys: str) -> bool:
+        return any(spec.get(k) for spec in specs for k in keys)
+
+    collections = (
+        _by_name([c for c in self.get("/api/collection/") if not c.get("archived")])
+        if _needs("collection_name")
+        else {}
+    )
+    dbs: dict[str, list[dict]] = {}
+    if _needs("db_name"):
+        res = self.get("/api/database/")
+        # in Metabase version *.40.0 the format of the returned result for this endpoint changed
+        dbs = _by_name(res["data"] if type(res) == dict else res)
+    tables = _by_name(self.get("/api/table/")) if _needs("table_name") else {}
+
+    errors: list[str] = []
+    resolved: list[dict] = []
+    for idx, spec in enumerate(specs):
+        kwargs = deepcopy(spec)
+        custom_json = kwargs.get("custom_json") or {}
+        name = kwargs.get("card_name") or custom_json.get("name")
+        where = f"card spec #{idx} ('{name}')"
+        if not name:
+            errors.append(f"{where}: a name must be provided for the card.")
+        # collection
+        if not kwargs.get("collection_id") and kwargs.get("collection_name"):
+            collection_name = kwargs.pop("collection_name")
+            if collection_name in {"root", "Root"}:
+                kwargs["collection_id"] = None
+            elif len(collections.get(collection_name, [])) != 1:
+                errors.append(
+                    f"{where}: found {len(collections.get(collection_name, []))} collections named '{collection_name}'."
+                )
+            else:
+                kwargs["collection_id"] = collections[collection_name][0]["id"]
+        # db
+        if not kwargs.get("db_id") and kwargs.get("db_name"):
+            db_name = kwargs.pop("db_name")
+            if len(dbs.get(db_name, [])) != 1:
+                errors.append(
+                    f"{where}: found {len(dbs.get(db_name, []))} databases named '{db_name}'."
+                )
+            else:
+                kwargs["db_id"] = dbs[db_name][0]["id"]
+        # table (not needed if the json is complete)
+        complete_json = all(
+            k in custom_json for k in ["name", "dataset_query", "display"]
+        )
+        if not complete_json and not kwargs.get("table_id"):
+            table_name = kwargs.pop("table_name", None)
+            candidates = [
+                t
+                for t in tables.get(table_name, [])
+                if not kwargs.get("db_id") or t["db_id"] == kwargs["db_id"]
+            ]
+            if not table_name:
+                errors.append(
+                    f"{where}: either the name or id of the table must be provided."
+                )
+            elif len(candidates) != 1:
+                errors.append(
+                    f"{where}: found {len(candidates)} tables named '{table_name}'."
+                )
+            else:
+                kwargs["table_id"] = candidates[0]["id"]
+        column_order = kwargs.get("column_order", "db_table_order")
+        if type(column_order) != list and column_order not in [
+            "db_table_order",
+            "alphabetical",
+        ]:
+            errors.append(f"{where}: wrong value for 'column_order'.")
+        resolved.append(kwargs)
+    if len(errors) > 0:
+        raise ValueError("Invalid card specs:\n" + "\n".join(errors))
+    return resolved
+
+
+def create_cards(
+    self,
+    specs,
+    max_workers=8,
+    verbose=False,
+):
+    """
+    Create many cards, described by specs (see 'metabase_api.utility.card_specs.load_card_specs').
+    Every spec is a dictionary with (some of) the arguments of 'create_card'.
+    All the names referenced by the specs are resolved at once, and all the specs are validated
+    before any card is created; then the cards are created concurrently.
+
+    Keyword arguments:
+    specs -- list of card specs
+    max_workers -- maximum number of cards created at the same time (default 8)
+    verbose -- whether to print extra information (default False)
+
+    :return a report per spec (same order as specs), eg
+        [{'card_name': 'Active Physicians', 'card_id': 876, 'seconds': 0.21, 'error': None}, ...]
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    assert type(specs) == list
+    t_start = time.perf_counter()
+    resolved = _resolve_card_specs(self, specs)
+
+    # fetch (and cache) the metadata of all tables; it is used for ordering the columns
+    table_ids = {kwargs["table_id"] for kwargs in resolved if kwargs.get("table_id")}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        metadata = dict(
+            zip(
+                table_ids,
+                executor.map(
+                    lambda t: self.get_table_metadata(table_id=t, use_cache=True),
+                    table_ids,
+                ),
+            )
+        )
+    errors = []
+    for idx, kwargs in enumerate(resolved):
+        table_id = kwargs.get("table_id")
+        if table_id is None:
+            continue
+        if not metadata.get(table_id):
+            errors.append(
+                f"card spec #{idx}: there is no table with the id {table_id}."
+            )
+        elif type(kwargs.get("column_order")) == list:
+            columns = {f["name"] for f in metadata[table_id]["fields"]}
+            missing = [c for c in kwargs["column_order"] if c not in columns]
+            if len(missing) > 0:
+                errors.append(
+                    f"card spec #{idx}: columns {missing} are not in the table {table_id}."
+                )
+    if len(errors) > 0:
+        raise ValueError("Invalid card specs:\n" + "\n".join(errors))
+    self.verbose_print(
+        verbose,
+        f"{len(specs)} card specs resolved and validated in {time.perf_counter() - t_start:.2f}s.",
+    )
+
+    def _create(kwargs: dict) -> dict:
+        name = kwargs.get("card_name") or kwargs["custom_json"]["name"]
+        t0 = time.perf_counter()
+        # whatever happens to one card, the others are created (and reported)
+        try:
+            res = self.create_card(**kwargs, return_card=True)
+            if not res:
+                error = "The card could not be built, or the server did not answer (see the logs)."
+            elif res.get("error"):
+                error = str(res["error"])
+            else:
+                error = None
+        except Exception as e:
+            res, error = None, str(e) or type(e).__name__
+        return {
+            "card_name": name,
+            "card_id": res["id"] if error is None else None,
+            "seconds": time.perf_counter() - t0,
+            "error": error,
+        }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        report = list(executor.map(_create, resolved))
+    self.verbose_print(
+        verbose,
+        f"{len([r for r in report if r['error'] is None])} of {len(specs)} cards created in {time.perf_counter() - t_start:.2f}s.",
+    )
+    return report
+
+
+def _collection_cards_index(self, collection_id) -> dict[str, dict]:
+    """
+    Cards (not archived) of a collection, by name: their id and (once needed, see 'upsert_card')
+    the fingerprints of their content. Built once per collection (see 'clear_cache').
+    """
+    index = self._cards_index_cache.get(collection_id)
+    if index is None:
+        index = {}
+        res = self.get(
+            "/api/collection/{}/items".format(
+                collection_id if collection_id is not None else "root"
+            ),
+            params={"models": "card"},
+        )
+        if res is False:
+            raise ValueError(
+                f"Impossible to list the cards of collection {collection_id}"
+            )
+        # (older versions of Metabase answer with a list)
+        items = res["data"] if isinstance(res, dict) else res
+        for c in sorted(items, key=lambda c: c["id"]):
+            if c["name"] in index:
+                # we keep the oldest one
+                continue
+            index[c["name"]] = {"id": c["id"], "fingerprints": None}
+        self._cards_index_cache[collection_id] = index
+    return index
+
+
+def upsert_card(self, spec, verbose=False):
+    """
+    Create a card, or update it if a card with the same name already exists in the target collection.
+    The spec is a dictionary with (some of) the arguments of 'create_card'.
+    The content of the card ('dataset_query', 'display' and 'visualization_settings') is compared
+    with the existing one through a fingerprint: if nothing changed, nothing is written;
+    otherwise only the keys that changed are updated (one 'PUT /api/card/:id').
+    The cards of the collection are listed once and cached (see 'clear_cache').
+
+    Keyword arguments:
+    spec -- a card spec
+    verbose -- whether to print extra information (default False)
+
+    :return (eg)
+        {'card_id': 876, 'action': 'updated', 'changed_keys': ['visualization_settings']}
+        where 'action' is one of 'created', 'updated' or 'unchanged'.
+    """
+    from metabase_api.utility.fingerprint import (
+        CARD_CONTENT_KEYS,
+        fingerprints_by_key,
+        changed_keys,
+    )
+
+    assert type(spec) == dict
+    kwargs = _resolve_card_specs(self, [spec])[0]
+    json = _card_json(self, **kwargs, verbose=verbose)
+    if json is None:
+        raise ValueError("Some of the columns of the card spec are not in the table")
+    index = _collection_cards_index(self, json.get("collection_id"))
+    new_fingerprints = fingerprints_by_key(json, CARD_CONTENT_KEYS)
+
+    existing = index.get(json["name"])
+    if existing is None:
+        res = self.create_card(custom_json=json, verbose=verbose, return_card=True)
+        if not res or res.get("error"):
+            raise RuntimeError(f"Card Creation Failed: {res}")
+        index[json["name"]] = {"id": res["id"], "fingerprints": new_fingerprints}
+        return {
+            "card_id": res["id"],
+            "action": "created",
+            "changed_keys": list(CARD_CONTENT_KEYS),
+        }
+
+    if existing["fingerprints"] is None:
+        # (only the cards that are upserted again are fetched)
+        existing["fingerprints"] = fingerprints_by_key(
+            self.get_card_json(existing["id"]), CARD_CONTENT_KEYS
+        )
+    keys = changed_keys(existing["fingerprints"], new_fingerprints)
+    if len(keys) == 0:
+        self.verbose_print(
+            verbose, f"The card '{json['name']}' is up-to-date; nothing to do."
+        )
+        return {"card_id": existing["id"], "action": "unchanged", "changed_keys": []}
+
+    status = self.put(
+        "/api/card/{}".format(existing["id"]), json={k: json[k] for k in keys}
+    )
+    if status != 200:
+        raise RuntimeError(f"Card Update Failed (status code {status})")
+    existing["fingerprints"] = new_fingerprints
+    self.verbose_print(
+        verbose, f"The card '{json['name']}' was updated ({', '.join(keys)})."
+    )
+    return {"card_id": existing["id"], "action": "updated", "changed_keys": keys}
+
+
 def create_collection(
     self,
     collection_name,
@@ -280,16 +561,107 @@ def create_segment(
         raise ValueError("Either the name or id of the table must be provided.")
     if not table_id:
         table_id = self.get_item_id("table", table_name, db_id=db_id, db_name=db_name)
-    if not table_name:
-        table_name = self.get_item_name(item_type="table", item_id=table_id)
-    db_id = self.get_db_id_from_table_id(table_id)
 
-    colmuns_name_id_mapping = self.get_columns_name_id(
-        table_name=table_name, db_id=db_id
-    )
+    colmuns_name_id_mapping = {
+        c["name"]: c["id"] for c in self.get_table_columns_in_order(table_id)
+    }
     column_id = colmuns_name_id_mapping[column_name]
 
-    # Create a segment blueprint
+    # Create the segment
+    res = self.post(
+        "/api/segment/",
+        json=_segment_blueprint(
+            segment_name, segment_description, table_id, column_id, column_values
+        ),
+    )
+    if return_segment:
+        return res
+
+
+def create_segments(
+    self,
+    table,
+    segments,
+    db_name=None,
+    db_id=None,
+    max_workers=8,
+    return_segments=False,
+):
+    """
+    Create many segments on the same table (see 'create_segment').
+    The table and its columns are resolved once, then the segments are created concurrently.
+
+    Keyword arguments:
+    table -- id (int) or name (str) of the table used for creating the segments on it
+    segments -- list of (segment_name, column_name, column_values) or
+                                (segment_name, column_name, column_values, segment_description)
+    db_name -- name of the db of the table, if it is given by name (default None)
+    db_id -- id of the db of the table, if it is given by name (default None)
+    max_workers -- maximum number of segments created at the same time (default 8)
+    return_segments -- whether to return the created segments info, in the same order as 'segments' (default False)
+
+    :return the created segments info (False for the ones that failed) if 'return_segments',
+            else the names of the segments that could not be created
+            (ValueError if there were segments, and none could be created).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    assert type(segments) == list
+    # Making sure we have the data needed
+    if not table:
+        raise ValueError("Either the name or id of the table must be provided.")
+    if isinstance(table, int):
+        table_id = table
+    else:
+        table_id = self.get_item_id("table", table, db_id=db_id, db_name=db_name)
+
+    colmuns_name_id_mapping = {
+        c["name"]: c["id"] for c in self.get_table_columns_in_order(table_id)
+    }
+    # validate everything before creating anything
+    blueprints = []
+    for segment in segments:
+        assert len(segment) in [3, 4]
+        segment_name, column_name, column_values = segment[:3]
+        segment_description = segment[3] if len(segment) == 4 else ""
+        if column_name not in colmuns_name_id_mapping:
+            raise ValueError(
+                f"The column name {column_name} (segment '{segment_name}') is not in the table {table_id}."
+            )
+        blueprints.append(
+            _segment_blueprint(
+                segment_name,
+                segment_description,
+                table_id,
+                colmuns_name_id_mapping[column_name],
+                column_values,
+            )
+        )
+
+    def _create(blueprint: dict):
+        # (a failure does not stop the creation of the other segments)
+        try:
+            return self.post("/api/segment/", json=blueprint)
+        except Exception as e:
+            print(f"Segment Creation Failed for '{blueprint['name']}': {e}")
+            return False
+
+    # Create the segments
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        res = list(executor.map(_create, blueprints))
+    failed = [b["name"] for b, r in zip(blueprints, res) if not r]
+    if len(failed) > 0:
+        print("Segment Creation Failed for:", failed)
+    if return_segments:
+        return res
+    if len(failed) > 0 and len(failed) == len(blueprints):
+        raise ValueError(f"No segment could be created (tried: {failed}).")
+    return failed
+
+
+def _segment_blueprint(
+    segment_name, segment_description, table_id, column_id, column_values
+) -> dict:
     segment_blueprint = {
         "name": segment_name,
         "description": segment_description,
@@ -302,8 +674,4 @@ def create_segment(
 
     # Add filtering values
     segment_blueprint["definition"]["filter"].extend(column_values)
-
-    # Create the segment
-    res = self.post("/api/segment/", json=segment_blueprint)
-    if return_segment:
-        return res
+    return segment_blueprint
@@ -0,0 +1,466 @@
+import csv
+import json
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from metabase_api._helper_methods import ItemType
+
+_logger = logging.getLogger(__name__)
+
+# Metabase caps ad-hoc queries to 2000 rows when no aggregation is involved,
+# so a page can not be bigger than this.
+MAX_PAGE_SIZE = 2000
+
+_END_OF_PARTITION = object()
+
+
+# engines whose native queries are not SQL: they can't be wrapped
+_NON_SQL_ENGINES = {"mongo", "druid", "druid-jdbc", "googleanalytics"}
+
+
+@dataclass(frozen=True)
+class SqlDialect:
+    """How the SQL wrapping the query of a native card is written, for an engine."""
+
+    quote_open: str = '"'
+    quote_close: str = '"'
+    # 'limit' (LIMIT n), 'top' (SELECT TOP n) or 'fetch' (FETCH FIRST n ROWS ONLY)
+    limit_style: str = "limit"
+    # keyword before the alias of a derived table (Oracle refuses 'AS' there)
+    alias_keyword: str = "AS "
+    booleans: bool = True
+
+    def identifier(self, name: str) -> str:
+        return (
+            self.quote_open
+            + name.replace(self.quote_close, self.quote_close * 2)
+            + self.quote_close
+        )
+
+    def literal(self, value: Any) -> str:
+        """Renders a python value as a SQL literal (to be used in keyset predicates)."""
+        if value is None:
+            raise ValueError("Impossible to paginate on a NULL key.")
+        if isinstance(value, bool):
+            if not self.booleans:
+                raise ValueError("Impossible to paginate on a boolean key.")
+            return "TRUE" if value else "FALSE"
+        if isinstance(value, (int, float)):
+            return repr(value)
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def select(
+        self,
+        columns: str,
+        sql: str,
+        where: str = "",
+        order_by: str = "",
+        limit: Optional[int] = None,
+    ) -> str:
+        """SELECT 'columns' from the query 'sql', as a derived table."""
+        top = (
+            f"TOP {limit} " if (limit is not None and self.limit_style == "top") else ""
+        )
+        query = f"SELECT {top}{columns} FROM ({sql}) {self.alias_keyword}{self.identifier('_keyset')}"
+        if where:
+            query += f" WHERE {where}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        if limit is not None and self.limit_style == "limit":
+            query += f" LIMIT {limit}"
+        if limit is not None and self.limit_style == "fetch":
+            query += f" FETCH FIRST {limit} ROWS ONLY"
+        return query
+
+
+ANSI_SQL = SqlDialect()
+SQL_DIALECTS: dict[str, SqlDialect] = {
+    "mysql": SqlDialect(quote_open="`", quote_close="`"),
+    "bigquery-cloud-sdk": SqlDialect(quote_open="`", quote_close="`"),
+    "sparksql": SqlDialect(quote_open="`", quote_close="`"),
+    "databricks": SqlDialect(quote_open="`", quote_close="`"),
+    "hive-like": SqlDialect(quote_open="`", quote_close="`"),
+    "sqlserver": SqlDialect(
+        quote_open="[", quote_close="]", limit_style="top", booleans=False
+    ),
+    # (12c and later)
+    "oracle": SqlDialect(limit_style="fetch", alias_keyword="", booleans=False),
+}
+
+
+def sql_dialect(engine: Optional[str]) -> SqlDialect:
+    """The dialect of the SQL of an engine (as Metabase names it); ANSI if it is not known."""
+    if engine in _NON_SQL_ENGINES:
+        raise ValueError(f"Native queries of engine '{engine}' can't be paginated")
+    return SQL_DIALECTS.get(engine or "", ANSI_SQL)
+
+
+def _keyset_query(
+    dataset_query: dict,
+    key_column: str,
+    key_ref: Optional[list],
+    after: Any = None,
+    lower: Any = None,
+    upper: Any = None,
+    upper_inclusive: bool = False,
+    limit: Optional[int] = None,
+    stats: bool = False,
+    dialect: SqlDialect = ANSI_SQL,
+) -> dict:
+    """
+    Wraps the query of a card so it returns a page of results
+    (or, if stats is True, the min and max of the key column, its number of (non null) values
+    and of distinct values).
+    Native queries get wrapped in a sub-select; simple/custom questions in a 'source-query'.
+    """
+    dq = deepcopy(dataset_query)
+    if dq["type"] == "native":
+        key = dialect.identifier(key_column)
+        sql = dq["native"]["query"].strip().rstrip(";")
+        if stats:
+            columns = ", ".join(
+                f"{agg} AS {dialect.identifier(name)}"
+                for agg, name in [
+                    (f"MIN({key})", "min"),
+                    (f"MAX({key})", "max"),
+                    (f"COUNT({key})", "count"),
+                    (f"COUNT(DISTINCT {key})", "distinct"),
+                ]
+            )
+            dq["native"]["query"] = dialect.select(columns, sql)
+            return dq
+        predicates = [f"{key} IS NOT NULL"]
+        if lower is not None:
+            predicates.append(f"{key} >= {dialect.literal(lower)}")
+        if upper is not None:
+            op = "<=" if upper_inclusive else "<"
+            predicates.append(f"{key} {op} {dialect.literal(upper)}")
+        if after is not None:
+            predicates.append(f"{key} > {dialect.literal(after)}")
+        dq["native"]["query"] = dialect.select(
+            "*", sql, where=" AND ".join(predicates), order_by=key, limit=limit
+        )
+    elif dq["type"] == "query":
+        assert key_ref is not None
+        wrapped: dict[str, Any] = {"source-query": dq["query"]}
+        if stats:
+            wrapped["filter"] = ["not-null", key_ref]
+            wrapped["aggregation"] = [
+                ["min", key_ref],
+                ["max", key_ref],
+                ["count"],
+                ["distinct", key_ref],
+            ]
+            dq["query"] = wrapped
+            return dq
+        predicates: list[list] = [["not-null", key_ref]]
+        if lower is not None:
+            predicates.append([">=", key_ref, lower])
+        if upper is not None:
+            predicates.append(["<=" if upper_inclusive else "<", key_ref, upper])
+        if after is not None:
+            predicates.append([">", key_ref, after])
+        wrapped["filter"] = (
+            predicates[0] if len(predicates) == 1 else ["and"] + predicates
+        )
+        wrapped["order-by"] = [["asc", key_ref]]
+        wrapped["limit"] = limit
+        dq["query"] = wrapped
+    else:
+        raise ValueError(f"Can't paginate a query of type '{dq['type']}'")
+    return dq
+
+
+def _run_dataset_query(self, dataset_query: dict) -> tuple[list[str], list[list]]:
+    """Runs an ad-hoc query; returns the names of the columns and the rows."""
+    res = self.post("/api/dataset", json=dataset_query)
+    if not res or res.get("status") != "completed":
+        raise RuntimeError(
+            f"Query failed: {res.get('error') if res else 'no response from server'}"
+        )
+    return [c["name"] for c in res["data"]["cols"]], res["data"]["rows"]
+
+
+def _iter_partition(
+    self,
+    dataset_query: dict,
+    key_column: str,
+    key_ref: Optional[list],
+    page_size: int,
+    lower: Any = None,
+    upper: Any = None,
+    upper_inclusive: bool = False,
+    dialect: SqlDialect = ANSI_SQL,
+) -> Iterator[tuple[list[str], list[list]]]:
+    """Yields the pages of a key range, one after the other, using keyset pagination."""
+    after = None
+    while True:
+        columns, rows = _run_dataset_query(
+            self,
+            _keyset_query(
+                dataset_query,
+                key_column=key_column,
+                key_ref=key_ref,
+                after=after,
+                lower=lower,
+                upper=upper,
+                upper_inclusive=upper_inclusive,
+                limit=page_size,
+                dialect=dialect,
+            ),
+        )
+        if len(rows) > 0:
+            yield columns, rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1][columns.index(key_column)]
+
+
+def _key_stats(
+    self,
+    dataset_query: dict,
+    key_column: str,
+    key_ref: Optional[list],
+    dialect: SqlDialect = ANSI_SQL,
+) -> tuple[Any, Any]:
+    """
+    Min and max of the key column (None, None if there are no rows).
+    Raises a ValueError if the key is not unique: rows sharing the last key of a page would be lost.
+    """
+    _, rows = _run_dataset_query(
+        self,
+        _keyset_query(dataset_query, key_column, key_ref, stats=True, dialect=dialect),
+    )
+    if len(rows) == 0:
+        return None, None
+    lo, hi, count, distinct = rows[0]
+    if count != distinct:
+        raise ValueError(
+            f"Key column '{key_column}' is not unique ({count} values, {distinct} distinct): "
+            "it can't be used for paginating"
+        )
+    return lo, hi
+
+
+def _partition_boundaries(
+    lo: Any, hi: Any, partitions: int, key_column: str = ""
+) -> list[tuple[Any, Any, bool]]:
+    """Splits the (numeric) range [lo, hi] of the key column in 'partitions' ranges."""
+    if lo is None or hi is None:
+        # empty result
+        return []
+    if partitions <= 1:
+        return [(None, None, False)]
+    numeric = all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lo, hi)
+    )
+    if not numeric or (lo == hi):
+        _logger.info(
+            f"Key column '{key_column}' is not numeric (or has only one value); fetching sequentially."
+        )
+        return [(None, None, False)]
+    step = (hi - lo) / partitions
+    if isinstance(lo, int) and isinstance(hi, int):
+        step = max(1, int(step))
+    bounds = []
+    start = lo
+    for idx in range(partitions):
+        end = hi if idx == partitions - 1 else lo + step * (idx + 1)
+        if end > hi:
+            end = hi
+        bounds.append((start, end, end == hi))
+        if end == hi:
+            break
+        start = end
+    return bounds
+
+
+def iter_card_data(
+    self,
+    key_column: str,
+    card_name=None,
+    card_id=None,
+    collection_name=None,
+    collection_id=None,
+    parameters=None,
+    page_size: int = MAX_PAGE_SIZE,
+    partitions: int = 1,
+    max_workers: int = 4,
+    prefetch_pages: int = 2,
+) -> Iterator[dict]:
+    """
+    Stream ALL the results of a card, without hitting the row cap of Metabase.
+    The query of the card is wrapped in keyset pagination on 'key_column', so every page is
+    an ordered query starting right after the last key of the previous page.
+    Every row is returned as a dictionary of <column-header, cell> key-value pairs (like 'get_card_data').
+
+    Only native (SQL) and simple/custom questions are supported.
+    The key column must be part of the results of the card, must be sortable and its values
+    must be unique (checked before fetching: ValueError otherwise); rows with a null key are skipped.
+    Native queries are written in the SQL dialect of the database (see 'SQL_DIALECTS').
+
+    Keyword arguments:
+    key_column -- name of the (ordered) column used for paginating
+    card_name -- name of the card (default None)
+    card_id -- id of the card (default None)
+    collection_name -- name of the collection the card is located in (default None)
+    collection_id -- id of the collection the card is located in (default None)
+    parameters -- filter values for the card; same format as for 'get_card_data' (default None)
+    page_size -- number of rows fetched per request (default 2000, which is also the maximum)
+    partitions -- when the key is numeric, splits its range in this many partitions that are
+                                fetched concurrently (default 1, ie sequentially)
+    max_workers -- maximum number of partitions fetched at the same time (default 4)
+    prefetch_pages -- number of pages each partition can fetch ahead of the consumer (default 2)
+    """
+    assert 0 < page_size <= MAX_PAGE_SIZE
+    if parameters:
+        assert type(parameters) == list
+
+    if card_id is None:
+        if card_name is None:
+            raise ValueError("Either card_id or card_name must be provided.")
+        card_id = self.get_item_id(
+            item_name=card_name,
+            collection_name=collection_name,
+            collection_id=collection_id,
+            item_type=ItemType.CARD,
+        )
+
+    card = self.get_item_info_from_id(ItemType.CARD, card_id)
+    dataset_query = deepcopy(card["dataset_query"])
+    if parameters:
+        dataset_query["parameters"] = parameters
+    key_ref = None
+    if dataset_query["type"] == "query":
+        base_types = {
+            md["name"]: md.get("base_type") for md in card.get("result_metadata") or []
+        }
+        if key_column not in base_types:
+            raise ValueError(
+                f"Column '{key_column}' is not in the results of card {card_id}"
+            )
+        key_ref = ["field", key_column, {"base-type": base_types[key_column]}]
+
+    dialect = ANSI_SQL
+    if dataset_query["type"] == "native":
+        database = self.get(f"/api/database/{card['database_id']}")
+        dialect = sql_dialect(database.get("engine") if database else None)
+
+    lo, hi = _key_stats(self, dataset_query, key_column, key_ref, dialect=dialect)
+    bounds = _partition_boundaries(lo, hi, partitions=partitions, key_column=key_column)
+
+    def _rows(pages: Iterator[tuple[list[str], list[list]]]) -> Iterator[dict]:
+        for columns, rows in pages:
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    if len(bounds) <= 1:
+        for lower, upper, inclusive in bounds:
+            yield from _rows(
+                _iter_partition(
+                    self,
+                    dataset_query,
+                    key_column,
+                    key_ref,
+                    page_size,
+                    lower=lower,
+                    upper=upper,
+                    upper_inclusive=inclusive,
+                    dialect=dialect,
+                )
+            )
+        return
+
+    # Every partition is fetched by a worker, into a bounded queue.
+    # Partitions are consumed in order, so the output is sorted on the key; workers take them
+    # in the same order, so the partition being consumed has always been started.
+    queues: list[queue.Queue] = [
+        queue.Queue(maxsize=max(1, prefetch_pages)) for _ in bounds
+    ]
+    stop = threading.Event()
+
+    def _put(q: queue.Queue, item: Any) -> bool:
+        """Blocks until there is room in the queue; gives up if the consumer went away."""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch(idx: int) -> None:
+        lower, upper, inclusive = bounds[idx]
+        try:
+            for page in _iter_partition(
+                self,
+                dataset_query,
+                key_column,
+                key_ref,
+                page_size,
+                lower=lower,
+                upper=upper,
+                upper_inclusive=inclusive,
+                dialect=dialect,
+            ):
+                if not _put(queues[idx], page):
+                    return
+            _put(queues[idx], _END_OF_PARTITION)
+        except Exception as e:  # handed over to the consumer
+            _put(queues[idx], e)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    for idx in range(len(bounds)):
+        executor.submit(_fetch, idx)
+    try:
+        for q in queues:
+            while True:
+                page = q.get()
+                if page is _END_OF_PARTITION:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                columns, rows = page
+                for row in rows:
+                    yield dict(zip(columns, row))
+    finally:
+        # producers waiting on a full queue will give up; the ones not started won't start
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_card_data(
+    self,
+    key_column: str,
+    path,
+    data_format="csv",
+    **kwargs,
+) -> int:
+    """
+    Write ALL the results of a card into a file, streaming them page by page (see 'iter_card_data').
+    The data_format keyword specifies the format of the file:
+        - 'csv': a header with the names of the columns, then one line per row
+        - 'json': json-lines; every row is a dictionary of <column-header, cell> key-value pairs
+    The rest of the keyword arguments are passed to 'iter_card_data'.
+    Returns the number of rows written.
+    """
+    assert data_format in ["json", "csv"]
+    nb_rows = 0
+    with open(path, "w", newline="") as f:
+        writer = None
+        for row in self.iter_card_data(key_column=key_column, **kwargs):
+            if data_format == "json":
+                f.write(json.dumps(row) + "\n")
+            else:
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+            nb_rows += 1
+    _logger.info(f"Wrote {nb_rows} rows into '{path}'")
+    return nb_rows
@@ -1,9 +1,105 @@
-from typing import Optional
+from copy import deepcopy
+from typing import Any, Optional
 
 import requests
 import getpass
 
 from metabase_api._helper_methods import ItemType
+from metabase_api.utility.mbql import field_ids_in, replace_field_ids
+from metabase_api.utility.object_store import ObjectStore
+
+
+def _column_id_mapping(
+    source_col_id_name: dict[int, str],
+    target_col_name_id: dict[str, int],
+    referenced_ids: set[int],
+) -> dict[int, int]:
+    """
+    Maps (by name) the columns of a source table to the ones of a target table.
+    Raises ValueError if a column referenced in the query has no equivalent in the target.
+    """
+    missing = {
+        source_col_id_name[i]
+        for i in referenced_ids
+        if i in source_col_id_name and source_col_id_name[i] not in target_col_name_id
+    }
+    if len(missing) > 0:
+        raise ValueError(
+            f"Columns {sorted(missing)} are used in the card but do not exist in the target table."
+        )
+    return {
+        col_id: target_col_name_id[col_name]
+        for col_id, col_name in source_col_id_name.items()
+        if col_name in target_col_name_id
+    }
+
+
+def _cloned_card_json(
+    card_info: dict,
+    source_table_id: int,
+    target_table_id: int,
+    source_table_name: Optional[str],
+    target_table_name: Optional[str],
+    source_table_col_id_name_mapping: dict[int, str],
+    target_table_col_name_id_mapping: dict[str, int],
+    new_card_name: Optional[str] = None,
+    new_card_collection_id: Optional[int] = None,
+    ignore_these_filters: Optional[list] = None,
+) -> dict:
+    """Json of a card, where the source table is replaced. 'card_info' is not modified."""
+    dataset_query = deepcopy(card_info["dataset_query"])
+
+    # native questions
+    if dataset_query["type"] == "native":
+        filters_data = dataset_query["native"]["template-tags"]
+        # change the underlying table for the card
+        dataset_query["native"]["query"] = dataset_query["native"]["query"].replace(
+            source_table_name, target_table_name
+        )
+        # change filters source
+        to_rewrite = {
+            filter_variable_name: data
+            for filter_variable_name, data in filters_data.items()
+            if ignore_these_filters is None
+            or filter_variable_name not in ignore_these_filters
+        }
+        column_id_mapping = _column_id_mapping(
+            source_table_col_id_name_mapping,
+            target_table_col_name_id_mapping,
+            field_ids_in(to_rewrite),
+        )
+        filters_data.update(replace_field_ids(to_rewrite, column_id_mapping))
+
+    # simple/custom questions
+    elif dataset_query["type"] == "query":
+        query_data = dataset_query["query"]
+        column_id_mapping = _column_id_mapping(
+            source_table_col_id_name_mapping,
+            target_table_col_name_id_mapping,
+            field_ids_in(query_data),
+        )
+        # change the underlying table and the columns in one pass
+        # (including nested source-queries, joins, expressions and aggregations)
+        dataset_query["query"] = replace_field_ids(
+            query_data,
+            column_mapping=column_id_mapping,
+            table_mapping={source_table_id: target_table_id},
+        )
+
+    new_card_json = {"dataset_query": dataset_query}
+    for key in ["display", "visualization_settings"]:
+        new_card_json[key] = deepcopy(card_info[key])
+
+    if new_card_name:
+        new_card_json["name"] = new_card_name
+    else:
+        new_card_json["name"] = card_info["name"]
+
+    if new_card_collection_id:
+        new_card_json["collection_id"] = new_card_collection_id
+    else:
+        new_card_json["collection_id"] = card_info["collection_id"]
+    return new_card_json
 
 
 class Metabase_API:
@@ -25,6 +121,9 @@ class Metabase_API:
         )
         self.session_id = None
         self.header = None
+        self._table_metadata_cache: dict[int, dict] = dict()
+        self._cards_index_cache: dict[Optional[int], dict[str, dict]] = dict()
+        self.object_store = ObjectStore()
         self.auth = (self.email, self.password) if basic_auth else None
         self.authenticate()
         self.is_admin = is_admin
@@ -74,7 +173,12 @@ class Metabase_API:
         get_item_name,
         get_db_id_from_table_id,
         get_table_metadata,
+        get_table_columns_in_order,
+        clear_cache,
+        get_card_json,
+        prefetch_cards,
         get_columns_name_id,
+        get_columns_name_id_many,
         friendly_names_is_disabled,
         verbose_print,
     )
@@ -82,8 +186,26 @@ class Metabase_API:
     ##################################################################
     ###################### Custom Functions ##########################
     ##################################################################
-    from .create_methods import create_card, create_collection, create_segment
-    from .copy_methods import copy_card, copy_collection, copy_dashboard, copy_pulse
+    from .create_methods import (
+        create_card,
+        create_cards,
+        upsert_card,
+        create_collection,
+        create_segment,
+        create_segments,
+    )
+    from .copy_methods import (
+        copy_card,
+        copy_collection,
+        copy_dashboard,
+        copy_dashboard_from_json,
+        copy_pulse,
+        copy_pulses,
+        plan_copy_collection,
+    )
+    from .extract_methods import iter_card_data, extract_card_data
+    from .bundle_methods import export_collection, import_bundle
+    from .sync_methods import sync_collection
 
     def search(self, q, item_type=None, archived=False):
         """
@@ -134,6 +256,7 @@ class Metabase_API:
         To pass the filter values use 'parameters' param:
             The format is like [{"type":"category","value":["val1","val2"],"target":["dimension",["template-tag","filter_variable_name"]]}]
             See the network tab when exporting the results using the web interface to get the proper format pattern.
+        Metabase caps the number of rows returned; for bigger results use 'iter_card_data' or 'extract_card_data'.
         """
         assert data_format in ["json", "csv"]
         if parameters:
@@ -211,7 +334,7 @@ class Metabase_API:
                     "Either the name or id of the target table needs to be provided."
                 )
             else:
-                source_table_id = self.get_item_id(ItemType.TABLE, source_table_name)
+                target_table_id = self.get_item_id(ItemType.TABLE, target_table_name)
 
         if ignore_these_filters:
             assert type(ignore_these_filters) == list
@@ -226,72 +349,24 @@ class Metabase_API:
             table_id=source_table_id, column_id_name=True
         )
 
-        # native questions
         if card_info["dataset_query"]["type"] == "native":
-            filters_data = card_info["dataset_query"]["native"]["template-tags"]
-            # change the underlying table for the card
             if not source_table_name:
                 source_table_name = self.get_item_name("table", source_table_id)
             if not target_table_name:
                 target_table_name = self.get_item_name("table", target_table_id)
-            card_info["dataset_query"]["native"]["query"] = card_info["dataset_query"][
-                "native"
-            ]["query"].replace(source_table_name, target_table_name)
-            # change filters source
-            for filter_variable_name, data in filters_data.items():
-                if (
-                    ignore_these_filters is not None
-                    and filter_variable_name in ignore_these_filters
-                ):
-                    continue
-                column_id = data["dimension"][1]
-                column_name = source_table_col_id_name_mapping[column_id]
-                target_col_id = target_table_col_name_id_mapping[column_name]
-                card_info["dataset_query"]["native"]["template-tags"][
-                    filter_variable_name
-                ]["dimension"][1] = target_col_id
-
-        # simple/custom questions
-        elif card_info["dataset_query"]["type"] == "query":
-
-            query_data = card_info["dataset_query"]["query"]
-
-            # change the underlying table for the card
-            query_data["source-table"] = target_table_id
-
-            # transform to string so it is easier to replace the column IDs
-            query_data_str = str(query_data)
-
-            # find column IDs
-            import re
-
-            res = re.findall("\['field', .*?\]", query_data_str)
-            source_column_IDs = [eval(i)[1] for i in res]
-
-            # replace column IDs from old table with the column IDs from new table
-            for source_col_id in source_column_IDs:
-                source_col_name = source_table_col_id_name_mapping[source_col_id]
-                target_col_id = target_table_col_name_id_mapping[source_col_name]
-                query_data_str = query_data_str.replace(
-                    "['field', {}, ".format(source_col_id),
-                    "['field', {}, ".format(target_col_id),
-                )
 
-            card_info["dataset_query"]["query"] = eval(query_data_str)
-
-        new_card_json = {}
-        for key in ["dataset_query", "display", "visualization_settings"]:
-            new_card_json[key] = card_info[key]
-
-        if new_card_name:
-            new_card_json["name"] = new_card_name
-        else:
-            new_card_json["name"] = card_info["name"]
-
-        if new_card_collection_id:
-            new_card_json["collection_id"] = new_card_collection_id
-        else:
-            new_card_json["collection_id"] = card_info["collection_id"]
+        new_card_json = _cloned_card_json(
+            card_info,
+            source_table_id=source_table_id,
+            target_table_id=target_table_id,
+            source_table_name=source_table_name,
+            target_table_name=target_table_name,
+            source_table_col_id_name_mapping=source_table_col_id_name_mapping,
+            target_table_col_name_id_mapping=target_table_col_name_id_mapping,
+            new_card_name=new_card_name,
+            new_card_collection_id=new_card_collection_id,
+            ignore_these_filters=ignore_these_filters,
+        )
 
         if return_card:
             return self.create_card(
@@ -300,6 +375,114 @@ class Metabase_API:
         else:
             self.create_card(custom_json=new_card_json, verbose=True)
 
+    def clone_card_many(
+        self,
+        card_id,
+        target_table_ids,
+        source_table_id=None,
+        source_table_name=None,
+        new_card_name=None,
+        new_card_collection_id=None,
+        ignore_these_filters=None,
+        max_workers=8,
+    ) -> dict[str, dict[int, Any]]:
+        """
+        Clone one card onto many target tables (see 'clone_card').
+        The source card and the columns of all tables are fetched once,
+        then the clones are created concurrently.
+
+        Keyword arguments:
+        card_id -- id of the card
+        target_table_ids -- list of ids of the tables the cloned cards would be based on
+        source_table_id -- The table that the filters of the card are based on
+        source_table_name -- Name of the table that the filters of the card are based on
+        new_card_name -- Name of the cloned cards. If not provided, the name of the source card is used.
+                                        '{table_name}' in it is replaced by the name of the target table.
+        new_card_collection_id -- The id of the collection that the cloned cards should be saved in,
+                                        or a dictionary target_table_id -> collection id.
+        ignore_these_filters -- A list of variable names of filters. The source of these filters would not change in the cloning process.
+        max_workers -- maximum number of cards created at the same time (default 8)
+
+        :return (eg)
+            {
+                'cards': {
+                    10: 876,  # target table id -> id of the cloned card
+                    11: 877,
+                },
+                'failed': {
+                    12: "Columns ['col1'] are used in the card but do not exist in the target table."
+                }
+            }
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        assert type(target_table_ids) == list
+        if ignore_these_filters:
+            assert type(ignore_these_filters) == list
+        if not source_table_id:
+            if not source_table_name:
+                raise ValueError(
+                    "Either the name or id of the source table needs to be provided."
+                )
+            source_table_id = self.get_item_id(ItemType.TABLE, source_table_name)
+
+        card_info = self.get_item_info_from_id("card", card_id)
+        tables = self.get("/api/table/")
+        table_names = {t["id"]: t["name"] for t in tables}
+        if source_table_id not in table_names:
+            raise ValueError(f"There is no table with the id '{source_table_id}'")
+        # unknown target tables are reported as failures, below
+        all_table_ids = [source_table_id] + [
+            t for t in target_table_ids if t != source_table_id and t in table_names
+        ]
+        columns_name_id = self.get_columns_name_id_many(
+            table_ids=all_table_ids, tables=tables
+        )
+        source_table_col_id_name_mapping = {
+            col_id: col_name
+            for col_name, col_id in columns_name_id[source_table_id].items()
+        }
+
+        def _clone(target_table_id: int) -> int:
+            if target_table_id not in table_names:
+                raise ValueError(f"There is no table with the id '{target_table_id}'")
+            collection_id = (
+                new_card_collection_id.get(target_table_id)
+                if isinstance(new_card_collection_id, dict)
+                else new_card_collection_id
+            )
+            new_card_json = _cloned_card_json(
+                card_info,
+                source_table_id=source_table_id,
+                target_table_id=target_table_id,
+                source_table_name=table_names[source_table_id],
+                target_table_name=table_names[target_table_id],
+                source_table_col_id_name_mapping=source_table_col_id_name_mapping,
+                target_table_col_name_id_mapping=columns_name_id[target_table_id],
+                new_card_name=new_card_name.format(
+                    table_name=table_names[target_table_id]
+                )
+                if new_card_name
+                else None,
+                new_card_collection_id=collection_id,
+                ignore_these_filters=ignore_these_filters,
+            )
+            res = self.create_card(custom_json=new_card_json, return_card=True)
+            if not res or res.get("error"):
+                raise RuntimeError(f"Card Creation Failed: {res}")
+            return res["id"]
+
+        report: dict[str, dict[int, Any]] = {"cards": {}, "failed": {}}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {t: executor.submit(_clone, t) for t in target_table_ids}
+        for target_table_id, future in futures.items():
+            # whatever happened to one card, the others (created, or not) are reported
+            try:
+                report["cards"][target_table_id] = future.result()
+            except Exception as e:
+                report["failed"][target_table_id] = str(e) or type(e).__name__
+        return report
+
     def move_to_archive(
         self,
         item_type: ItemType,
@@ -1,12 +1,16 @@
 import logging
+from pathlib import Path
 from typing import Optional, Collection
 
 from metabase_api import Metabase_API
 from metabase_api._helper_methods import ItemType
 from metabase_api.objects.collection import Collection
+from metabase_api.copy_plan import measure_latency
 from metabase_api.objects.defs import MigrationParameters
 from metabase_api.utility.db.tables import TablesEquivalencies
+from metabase_api.utility.journal import Journal, copy_journal_header
 from metabase_api.utility.options import Options
+from metabase_api.utility.progress import ProgressSink
 
 _logger = logging.getLogger(__name__)
 
@@ -16,6 +20,8 @@ def _do_copy_collection(
     source_collection_id: int,
     parent_collection_id: int,
     destination_collection_name: str,
+    journal_path: Optional[Path] = None,
+    progress: Optional[ProgressSink] = None,
 ) -> dict[str, dict[int, int]]:
     source_collection_name = metabase_api.get_item_name(
         item_type="collection", item_id=source_collection_id
@@ -38,6 +44,8 @@ def _do_copy_collection(
         destination_parent_collection_id=parent_collection_id,
         destination_collection_name=destination_collection_name,
         deepcopy_dashboards=True,
+        journal_path=journal_path,
+        progress=progress,
     )
     return transformations
 
@@ -52,12 +60,48 @@ def migrate_collection(
     user_options: Options,
     new_dashboard_description: Optional[str] = None,
     new_dashboard_name: Optional[str] = None,
+    journal_path: Optional[Path] = None,
+    dry_run: bool = False,
+    progress: Optional[ProgressSink] = None,
 ):
+    """
+    Copies a collection and migrates the copy to another database.
+    If journal_path is given, every step done is recorded there; if the file already exists
+    (eg, a previous migration failed half-way), the steps it records are not done again.
+    If dry_run, nothing is done: the plan of the migration is logged and returned.
+    'progress' (if any) is called with a 'ProgressEvent' after each object copied, migrated or translated.
+    """
+    if dry_run:
+        plan = metabase_api.plan_copy_collection(
+            source_collection_id=source_collection_id,
+            migrate=True,
+            translate=(len(user_options.labels_replacements) > 0)
+            or ((new_dashboard_name is not None) and (len(new_dashboard_name) > 0)),
+            journal_path=journal_path,
+            measure_latency=False,
+        )
+        _logger.info(plan.summary(latency=measure_latency(metabase_api)))
+        return plan
     transformations = _do_copy_collection(
         metabase_api,
         source_collection_id=source_collection_id,
         parent_collection_id=parent_collection_id,
         destination_collection_name=destination_collection_name,
+        journal_path=journal_path,
+        progress=progress,
+    )
+    # (the same journal as the copy: it was checked to be the one of this copy)
+    journal = (
+        Journal(
+            journal_path,
+            header=copy_journal_header(
+                source_collection_id,
+                destination_parent_collection_id=parent_collection_id,
+                destination_collection_name=destination_collection_name,
+            ),
+        )
+        if journal_path is not None
+        else None
     )
     _logger.info(f"'{source_collection_id}' duplicated - now starts the migration")
     card_params = MigrationParameters(
@@ -75,20 +119,24 @@ def migrate_collection(
     dst_collection = Collection.from_id(
         coll_id=dst_collection_id, metabase_api=metabase_api
     )
-    assert dst_collection.migrate(params=card_params, push=False)
-
     # make sure to change the name!
     if (new_dashboard_name is not None) and (len(new_dashboard_name) > 0):
         dashname, dashid = dst_collection.dashboard_name_and_id
         card_params.personalization_options.labels_replacements[
             dashname
         ] = new_dashboard_name
-
-    if len(card_params.personalization_options.labels_replacements) > 0:
-        _logger.info(f"Replacing collection {dst_collection_id}'s labels ...")
-        dst_collection.translate(
-            translation_dict=card_params.personalization_options.labels_replacements
+    labels_replacements = card_params.personalization_options.labels_replacements
+    if len(labels_replacements) > 0:
+        _logger.info(
+            f"Labels of collection {dst_collection_id} will be replaced while migrating"
         )
-        # dst_collection.push(metabase_api=metabase_api)
+    # each card and dashboard is migrated and translated in one pass
+    assert dst_collection.migrate(
+        params=card_params,
+        push=True,
+        journal=journal,
+        progress=progress,
+        translation_dict=labels_replacements if len(labels_replacements) > 0 else None,
+    )
 
     _logger.info("Migration successfully completed.")
@@ -1,4 +1,6 @@
 import logging
+import threading
+from copy import deepcopy
 from dataclasses import dataclass
 from typing import Callable, Optional, Any
 
@@ -9,13 +11,15 @@ from metabase_api.objects.defs import (
     TraverseStackElement,
     TraverseStack,
     MigrationParameters,
-)
-from metabase_api.objects.visitors.defs import (
-    number_formatter,
-    label_replacer,
+    CLICK_BEHAVIOR_PLACES,
+    COLUMN_SETTINGS_PLACES,
+    VISUALIZATION_SETTINGS_PLACES,
+    visits,
 )
 
 MIGRATED_CARDS: list[int] = list()
+# cards are claimed (in MIGRATED_CARDS) under this lock, so that concurrent migrations do a card once
+_MIGRATED_CARDS_LOCK = threading.Lock()
 
 
 _logger = logging.getLogger(__name__)
@@ -34,8 +38,10 @@ class Card(CollectionObject):
 
     @classmethod
     def from_id(cls, card_id: int, metabase_api: Metabase_API) -> "Card":
-        card_json = metabase_api.get(f"/api/card/{card_id}")
-        return Card(card_json=card_json)
+        # the json of the store is shared: the card gets its own copy
+        card = Card(card_json=deepcopy(metabase_api.get_card_json(card_id)))
+        card.track_changes()
+        return card
 
     @property
     def card_id(self) -> int:  # todo: deprecate and use 'object_id' directly.
@@ -57,59 +63,56 @@ class Card(CollectionObject):
         def _traverse_query_part(query_part: dict[Any, Any]) -> ReturnValue:
             assert call_stack is not None
             with call_stack.add(TraverseStackElement.QUERY_PART):
-                r = f(query_part, call_stack)
+                r = ReturnValue.empty().add(f(query_part, call_stack))
                 if "source-query" in query_part:
-                    r1 = _traverse_query_part(query_part["source-query"])
-                    r = r.union(r1)
+                    r.add(_traverse_query_part(query_part["source-query"]))
             return r
 
         def _visualization_settings(viz_settings: dict[Any, Any]) -> ReturnValue:
             assert call_stack is not None
             r = ReturnValue.empty()
             with call_stack.add(TraverseStackElement.VISUALIZATION_SETTINGS):
-                r = r.union(f(viz_settings, call_stack))
+                r.add(f(viz_settings, call_stack))
                 for k, v in viz_settings.items():
-                    if k == "table.columns":
+                    if (k == "table.columns") and visits(
+                        f, [TraverseStackElement.TABLE_COLUMN]
+                    ):
                         all_table_columns = v
                         for table_column in all_table_columns:
                             with call_stack.add(TraverseStackElement.TABLE_COLUMN):
-                                r = r.union(f(table_column, call_stack))
-                    elif k == "click_behavior":
+                                r.add(f(table_column, call_stack))
+                    elif (k == "click_behavior") and visits(f, CLICK_BEHAVIOR_PLACES):
                         click_behavior = v
                         with call_stack.add(TraverseStackElement.CLICK_BEHAVIOR):
-                            r = r.union(f(click_behavior, call_stack))
+                            r.add(f(click_behavior, call_stack))
                         if "parameterMapping" in click_behavior:
                             with call_stack.add(TraverseStackElement.PARAMETER_MAPPING):
-                                r = r.union(
-                                    f(click_behavior["parameterMapping"], call_stack)
-                                )
-                    elif k == "column_settings":
+                                r.add(f(click_behavior["parameterMapping"], call_stack))
+                    elif (k == "column_settings") and visits(f, COLUMN_SETTINGS_PLACES):
                         column_settings = v
-                        # col_settings_tag = TraverseStackElement.COLUMN_SETTINGS
-                        # col_settings_tag.title = viz_settings.get("card.title", "")
                         with call_stack.add(
-                            TraverseStackElement.COLUMN_SETTINGS.set_title(
+                            TraverseStackElement.COLUMN_SETTINGS.titled(
                                 viz_settings.get("card.title", "")
                             )
                         ):
-                            r = r.union(f(column_settings, call_stack))
+                            r.add(f(column_settings, call_stack))
                             for _col_set_k, _a_dict in column_settings.items():
                                 if _col_set_k == "click_behavior":
                                     with call_stack.add(
                                         TraverseStackElement.CLICK_BEHAVIOR
                                     ):
-                                        r = r.union(f(_a_dict, call_stack))
+                                        r.add(f(_a_dict, call_stack))
                                 elif "click_behavior" in _a_dict:
                                     click_behavior = _a_dict["click_behavior"]
                                     with call_stack.add(
                                         TraverseStackElement.CLICK_BEHAVIOR
                                     ):
-                                        r = r.union(f(click_behavior, call_stack))
+                                        r.add(f(click_behavior, call_stack))
                                         if "parameterMapping" in click_behavior:
                                             with call_stack.add(
                                                 TraverseStackElement.PARAMETER_MAPPING
                                             ):
-                                                r = r.union(
+                                                r.add(
                                                     f(
                                                         click_behavior[
                                                             "parameterMapping"
@@ -117,10 +120,12 @@ class Card(CollectionObject):
                                                         call_stack,
                                                     )
                                                 )
-                    elif k == "series_settings":
+                    elif (k == "series_settings") and visits(
+                        f, [TraverseStackElement.SERIES_SETTINGS]
+                    ):
                         series_settings = v
                         with call_stack.add(TraverseStackElement.SERIES_SETTINGS):
-                            r = r.union(f(series_settings, call_stack))
+                            r.add(f(series_settings, call_stack))
             return r
 
         # nb: I am using here self.as_json, which means that it will have to be
@@ -128,59 +133,72 @@ class Card(CollectionObject):
         _logger.info(f"Visiting card id '{self.card_id}'")
         if call_stack is None:
             call_stack = TraverseStack()
-        with call_stack.add(TraverseStackElement.CARD.set_title(self.name)):
+        with call_stack.add(TraverseStackElement.CARD.titled(self.name)):
             # let's first apply the function to the card itself
-            r = f(self.as_json, call_stack)
+            r = ReturnValue.empty().add(f(self.as_json, call_stack))
             # ...and then let's go on each of its sub-parts
             # todo: when we come DASHBOARD -> CARD there is a sub-section called 'card' - that we don't handle today. Should we...?
-            if "dataset_query" in self.as_json:
+            # (parts that the visitor is not interested in are skipped)
+            if ("dataset_query" in self.as_json) and visits(
+                f, [TraverseStackElement.QUERY_PART]
+            ):
                 if "query" in self.as_json["dataset_query"]:
                     r1 = _traverse_query_part(
                         query_part=self.as_json["dataset_query"]["query"]
                     )
-                    r = r.union(r1)
-            if "visualization_settings" in self.as_json:
+                    r.add(r1)
+            if ("visualization_settings" in self.as_json) and visits(
+                f, VISUALIZATION_SETTINGS_PLACES
+            ):
                 r1 = _visualization_settings(self.as_json["visualization_settings"])
-                r = r.union(r1)
+                r.add(r1)
         return r
 
-    def migrate(self, params: MigrationParameters, push: bool) -> bool:
-        """Migrates a card, based on a set of parameters. Pushes if flag is True."""
-        from metabase_api.migration.defs import migration_function
-
-        if self.card_id in MIGRATED_CARDS:
+    def migrate(
+        self,
+        params: MigrationParameters,
+        push: bool,
+        translation_dict: Optional[dict[str, str]] = None,
+    ) -> bool:
+        """
+        Migrates a card, based on a set of parameters. Pushes if flag is True.
+        A card is only migrated once (see 'MIGRATED_CARDS'); if it was already migrated
+        and there is a translation dict, it is still translated (and pushed if flag is True).
+        """
+        with _MIGRATED_CARDS_LOCK:
+            already_migrated = self.card_id in MIGRATED_CARDS
+            if not already_migrated:
+                MIGRATED_CARDS.append(self.card_id)
+        if already_migrated:
             _logger.debug(f"[already visited card id '{self.card_id}']")
-            return True
-        # I migrate it
-        self.traverse(
-            f=lambda a_json, a_stack: migration_function(
-                caller_json=a_json, params=params, call_stack=a_stack
-            ),
-        )
-        # and also I change the formatting of the numbers
-        self.traverse(
-            f=lambda a_json, a_stack: number_formatter(
-                caller_json=a_json,
-                number_format=params.personalization_options.number_format,
-                call_stack=a_stack,
-            ),
-        )
-        success = self.push(metabase_api=params.metabase_api) if push else True
-        if success:
-            MIGRATED_CARDS.append(self.card_id)
+            if not translation_dict:
+                return True
+            self.translate(translation_dict=translation_dict)
+            return self.push(metabase_api=params.metabase_api) if push else True
+        try:
+            success = super().migrate(
+                params=params, push=push, translation_dict=translation_dict
+            )
+        except BaseException:
+            success = False
+            raise
+        finally:
+            # a card that was not migrated (or not pushed) can be tried again
+            if not success:
+                with _MIGRATED_CARDS_LOCK:
+                    MIGRATED_CARDS.remove(self.card_id)
         return success
 
-    def translate(self, translation_dict: dict[str, str]) -> None:
-        self.traverse(
-            f=lambda a_json, a_stack: label_replacer(
-                caller_json=a_json, call_stack=a_stack, labels_repl=translation_dict
-            ),
-        )
-
     def push(self, metabase_api: Metabase_API) -> bool:
-        return bool(
-            metabase_api.put(f"/api/card/{self.card_id}", json=self.as_json) == 200
-        )
+        changes = self.changes()
+        if len(changes) == 0:
+            _logger.debug(f"Card '{self.card_id}' has not changed; nothing to push")
+            return True
+        if metabase_api.put(f"/api/card/{self.card_id}", json=changes) != 200:
+            return False
+        self.mark_pushed()
+        metabase_api.object_store.put("card", deepcopy(self.as_json))
+        return True
 
     def __str__(self) -> str:
         return f"Card '{str(self.as_json.get('name', 'no-name-in-json'))}'"
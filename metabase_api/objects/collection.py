@@ -1,6 +1,8 @@
 import logging
-from typing import Any, Callable, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence, Union
 
+from metabase_api.collection_tree import CollectionTree
 from metabase_api.metabase_api import Metabase_API
 from metabase_api.objects.card import Card
 from metabase_api.objects.dashboard import Dashboard
@@ -9,7 +11,11 @@ from metabase_api.objects.defs import (
     TraverseStack,
     ReturnValue,
     TraverseStackElement,
+    MigrationParameters,
+    fused,
 )
+from metabase_api.utility.journal import Journal
+from metabase_api.utility.progress import ProgressSink, ProgressTracker
 
 _logger = logging.getLogger(__name__)
 
@@ -18,8 +24,14 @@ class Collection(CollectionObject):
 
     as_json: dict[Any, Any]
 
-    def __init__(self, as_json: dict[Any, Any], metabase_api: Metabase_API):
+    def __init__(
+        self,
+        as_json: dict[Any, Any],
+        metabase_api: Metabase_API,
+        tree: Optional[CollectionTree] = None,
+    ):
         self.metabase_api = metabase_api
+        self._tree = tree
         super().__init__(as_json=as_json)
 
     @classmethod
@@ -27,8 +39,20 @@ class Collection(CollectionObject):
         as_json = metabase_api.get(f"/api/collection/{coll_id}")
         return Collection(as_json, metabase_api=metabase_api)
 
+    @property
+    def tree(self) -> CollectionTree:
+        """
+        Sub-collections (at any depth) and items of this collection; loaded on first use,
+        with the full json of all its cards (see 'prefetch_cards').
+        """
+        if self._tree is None:
+            self._tree = self.metabase_api.prefetch_cards(self.object_id)
+        return self._tree
+
     @property
     def items(self) -> list[dict[Any, Any]]:
+        if self._tree is not None:
+            return list(self._tree.root.items)
         collection_details = self.metabase_api.get(
             f"/api/collection/{self.object_id}/items"
         )
@@ -48,56 +72,218 @@ class Collection(CollectionObject):
         self,
         f: Callable[[dict[Any, Any], TraverseStack], ReturnValue],
         call_stack: Optional[TraverseStack] = None,
+        max_workers: int = 1,
     ) -> ReturnValue:
-        _logger.info(f"Visiting collection id '{self.object_id}'")
+        """
+        Visits the collection and its items (at any depth); cards and dashboards are pushed once visited.
+        With 'max_workers' > 1, cards and dashboards are fetched, visited and pushed by a pool of
+        threads, so that one is fetched while others are visited or pushed ('f' must then be thread-safe).
+        Results are collected in the order of the items, whatever the order they are done in.
+        """
         if call_stack is None:
             call_stack = TraverseStack()
-        r: ReturnValue = ReturnValue.empty()
+        results: list[Union[ReturnValue, "Future[ReturnValue]"]] = []
+        if max_workers <= 1:
+            self._traverse_items(f, call_stack, results, executor=None)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                self._traverse_items(f, call_stack, results, executor=executor)
+        r = ReturnValue.empty()
+        for res in results:
+            r.add(res.result() if isinstance(res, Future) else res)
+        return r
+
+    def _traverse_items(
+        self,
+        f: Callable[[dict[Any, Any], TraverseStack], ReturnValue],
+        call_stack: TraverseStack,
+        results: list[Union[ReturnValue, "Future[ReturnValue]"]],
+        executor: Optional[ThreadPoolExecutor],
+    ) -> None:
+        """
+        Visits the collection and appends to 'results', in order, what each place returns.
+        Cards and dashboards are handed to the executor (if any), with a copy of the stack.
+        """
+        _logger.info(f"Visiting collection id '{self.object_id}'")
         with call_stack.add(TraverseStackElement.COLLECTION):
-            r = r.union(f(self.as_json, call_stack))
-            for item in self.items:
-                if item["model"] == "card":
-                    # nb: I can't do this
-                    # r = Card(card_json=item).migrate(card_params)
-                    # because not _all_ info is there. Need to fetch it again:
-                    _card = Card.from_id(
-                        card_id=item["id"], metabase_api=self.metabase_api
-                    )
-                    r = r.union(_card.traverse(f, call_stack))
-                    if not _card.push(self.metabase_api):
-                        raise RuntimeError(f"Impossible to push card '{item['id']}'")
-                elif (
-                    item["model"] == "collection"
-                ):  # todo: do I need to go depth-first...?
-                    r = r.union(
-                        Collection.from_id(
-                            coll_id=item["id"], metabase_api=self.metabase_api
-                        ).traverse(f, call_stack)
-                    )
-                elif item["model"] == "dashboard":
-                    # Dashboard(as_json=item)
-                    dashboard_id = item["id"]
-                    _logger.info(f"Obtaining details of dashboard {dashboard_id}...")
-                    dash = self.metabase_api.get(f"/api/dashboard/{dashboard_id}")
-                    if dash["archived"]:
-                        _logger.info(
-                            f"Dashboard {dashboard_id} is archived. Will migrate anyways."
+            results.append(f(self.as_json, call_stack))
+            for item in self.tree.root.items:
+                if item["model"] in {"card", "dashboard"}:
+                    if executor is None:
+                        results.append(self._traverse_object(item, f, call_stack))
+                    else:
+                        results.append(
+                            executor.submit(
+                                self._traverse_object, item, f, call_stack.snapshot()
+                            )
                         )
-                    _logger.info(f"Migrating dashboard {dashboard_id}...")
-                    _dashboard = Dashboard(dash)
-                    r = r.union(_dashboard.traverse(f, call_stack))
-                    assert _dashboard.push(
-                        self.metabase_api
-                    ), f"Problems updating dashboard '{dashboard_id}'"
+                elif item["model"] == "collection":
+                    subtree = self.tree.subtree(item["id"])
+                    Collection(
+                        subtree.root.as_json,
+                        metabase_api=self.metabase_api,
+                        tree=subtree,
+                    )._traverse_items(f, call_stack, results, executor)
                 # copy a pulse
                 elif item["model"] == "pulse":
                     with call_stack.add(TraverseStackElement.PULSE):
-                        r = r.union(f(self.as_json, call_stack))
+                        results.append(f(self.as_json, call_stack))
                 else:
                     raise ValueError(
                         f"We are not copying objects of type '{item['model']}'; specifically the one named '{item['name']}'!!!"
                     )
+
+    def _traverse_object(
+        self,
+        item: dict[Any, Any],
+        f: Callable[[dict[Any, Any], TraverseStack], ReturnValue],
+        call_stack: TraverseStack,
+    ) -> ReturnValue:
+        """Fetches a card or dashboard (cards are in the object store), visits it and pushes it."""
+        obj = self._load_object(item)
+        r = obj.traverse(f, call_stack)
+        if not obj.push(self.metabase_api):
+            raise RuntimeError(f"Impossible to push {item['model']} '{item['id']}'")
         return r
 
+    def _load_object(self, item: dict[Any, Any]) -> CollectionObject:
+        if item["model"] == "card":
+            return Card.from_id(item["id"], metabase_api=self.metabase_api)
+        _logger.info(f"Obtaining details of dashboard {item['id']}...")
+        dash = self.metabase_api.get(f"/api/dashboard/{item['id']}")
+        if dash.get("archived", False):
+            _logger.info(f"Dashboard {item['id']} is archived. Will migrate anyways.")
+        dashboard = Dashboard(dash)
+        dashboard.track_changes()
+        return dashboard
+
+    def _visit_own_places(
+        self, f: Callable[[dict[Any, Any], TraverseStack], ReturnValue]
+    ) -> ReturnValue:
+        """
+        Applies a function to the places 'traverse' visits that are not in a card or dashboard:
+        the collections (at any depth) and their pulses. Nothing is pushed.
+        """
+        call_stack = TraverseStack()
+        r = ReturnValue.empty()
+
+        def _visit(node: Any) -> None:
+            with call_stack.add(TraverseStackElement.COLLECTION):
+                r.add(f(node.as_json, call_stack))
+                for item in node.items:
+                    if item["model"] == "collection":
+                        _visit(self.tree.nodes[item["id"]])
+                    elif item["model"] == "pulse":
+                        with call_stack.add(TraverseStackElement.PULSE):
+                            r.add(f(node.as_json, call_stack))
+
+        _visit(self.tree.root)
+        return r
+
+    def _for_each_object(
+        self,
+        steps: Sequence[str],
+        action: Callable[[CollectionObject, list[str]], None],
+        push: bool,
+        journal: Optional[Journal],
+        progress: ProgressTracker,
+    ) -> None:
+        """
+        Applies an action to each card and dashboard of the collection (at any depth), one by one;
+        the action gets the steps to do on the object.
+        If there is a journal, the steps it has for an object are not done again (the object is
+        skipped if they all are) and the others are recorded once the object is pushed.
+        """
+        items = [
+            item
+            for node in self.tree.walk()
+            for item in node.items
+            if item["model"] in {"card", "dashboard"}
+        ]
+        progress.add_total(len(items))
+        for item in items:
+            todo = [
+                step
+                for step in steps
+                if journal is None
+                or not journal.has(f"{step}_{item['model']}", item["id"])
+            ]
+            if len(todo) == 0:
+                _logger.info(
+                    f"{item['model']} '{item['id']}' already done ({', '.join(steps)}); skipping"
+                )
+                progress.skipped(item["model"], item["id"])
+                continue
+            with progress.item(item["model"], item["id"]):
+                obj = self._load_object(item)
+                action(obj, todo)
+                if push:
+                    if not obj.push(self.metabase_api):
+                        raise RuntimeError(
+                            f"Impossible to push {item['model']} '{item['id']}'"
+                        )
+                    if journal is not None:
+                        for step in todo:
+                            journal.record(f"{step}_{item['model']}", item["id"])
+        progress.finish()
+
+    def migrate(
+        self,
+        params: MigrationParameters,
+        push: bool,
+        journal: Optional[Journal] = None,
+        progress: Optional[ProgressSink] = None,
+        translation_dict: Optional[dict[str, str]] = None,
+    ) -> bool:
+        """
+        Migrates the collection (at any depth: collections, pulses, cards and dashboards),
+        pushing each card and dashboard if flag is True.
+        If there is a translation dict, they are also translated, in the same pass (see 'translate').
+        'progress' (if any) is called with a 'ProgressEvent' after each of them.
+        """
+
+        visitors = self.migration_visitors(params)
+        if translation_dict:
+            visitors += self.translation_visitors(translation_dict)
+        self._visit_own_places(fused(visitors))
+
+        def _migrate(obj: CollectionObject, todo: list[str]) -> None:
+            if "migrated" in todo:
+                obj.migrate(
+                    params=params,
+                    push=False,
+                    translation_dict=translation_dict if "translated" in todo else None,
+                )
+            else:
+                obj.translate(translation_dict=translation_dict)  # type: ignore
+
+        self._for_each_object(
+            ["migrated", "translated"] if translation_dict else ["migrated"],
+            action=_migrate,
+            push=push,
+            journal=journal,
+            progress=ProgressTracker("migrate", progress),
+        )
+        return True
+
+    def translate(
+        self,
+        translation_dict: dict[str, str],
+        journal: Optional[Journal] = None,
+        progress: Optional[ProgressSink] = None,
+    ) -> None:
+        """
+        Changes labels in the collection (at any depth: collections, pulses, cards and dashboards);
+        cards and dashboards are pushed.
+        """
+        self._visit_own_places(fused(self.translation_visitors(translation_dict)))
+        self._for_each_object(
+            ["translated"],
+            action=lambda obj, _: obj.translate(translation_dict=translation_dict),
+            push=True,
+            journal=journal,
+            progress=ProgressTracker("translate", progress),
+        )
+
     def push(self, metabase_api: Metabase_API) -> bool:
         raise NotImplementedError()
@@ -11,6 +11,9 @@ from metabase_api.objects.defs import (
     TraverseStack,
     TraverseStackElement,
     MigrationParameters,
+    Visitor,
+    CARD_PLACES,
+    visits,
 )
 
 _logger = logging.getLogger(__name__)
@@ -37,55 +40,71 @@ class Dashboard(CollectionObject):
         r = ReturnValue(None)  # basically: init with 'nothing' inside.
         if call_stack is None:
             call_stack = TraverseStack()
-        with call_stack.add(TraverseStackElement.DASHBOARD):
-            if "dashcards" in self.as_json:
+        with call_stack.add(
+            TraverseStackElement.DASHBOARD.titled(self.as_json.get("name", ""))
+        ):
+            # (parts that the visitor is not interested in are skipped)
+            if ("dashcards" in self.as_json) and visits(f, CARD_PLACES):
                 for card_idx, card_json in enumerate(self.as_json["dashcards"]):
                     # NB: I enumerate to make debugging easier
-                    r = r.union(Card(card_json).traverse(f, call_stack))
-            r = r.union(f(self.as_json, call_stack))
+                    r.add(Card(card_json).traverse(f, call_stack))
+            r.add(f(self.as_json, call_stack))
             for k, v in self.as_json.items():
-                if k == "tabs":  # tabs in dashboard
+                # tabs in dashboard
+                if (k == "tabs") and visits(f, [TraverseStackElement.TABS]):
                     with call_stack.add(TraverseStackElement.TABS):
-                        r = r.union(f(v, call_stack))
-                if k == "parameters":
+                        r.add(f(v, call_stack))
+                if (k == "parameters") and visits(f, [TraverseStackElement.PARAMETER]):
                     parameters = v
                     for params_dict in parameters:
                         with call_stack.add(TraverseStackElement.PARAMETER):
-                            r = r.union(f(params_dict, call_stack))
-                elif k == "param_values":
+                            r.add(f(params_dict, call_stack))
+                elif (k == "param_values") and visits(
+                    f, [TraverseStackElement.PARAM_VALUES]
+                ):
                     param_values = v
                     if param_values is not None:
                         with call_stack.add(TraverseStackElement.PARAM_VALUES):
-                            r = r.union(f(param_values, call_stack))
-                elif k == "param_fields":
+                            r.add(f(param_values, call_stack))
+                elif (k == "param_fields") and visits(
+                    f, [TraverseStackElement.PARAM_FIELDS]
+                ):
                     old_param_fields = deepcopy(v)
                     if old_param_fields is not None:
                         with call_stack.add(TraverseStackElement.PARAM_FIELDS):
-                            r = r.union(f(old_param_fields, call_stack))
+                            r.add(f(old_param_fields, call_stack))
         return r
 
-    def migrate(self, params: MigrationParameters, push: bool) -> bool:
-        from metabase_api.migration.defs import migration_function
+    def migration_visitors(self, params: MigrationParameters) -> list[Visitor]:
+        from metabase_api.migration.defs import migration_visitor
 
-        self.traverse(
-            f=lambda a_json, a_stack: migration_function(
-                caller_json=a_json, params=params, call_stack=a_stack
-            ),
-        )
-        # todo: think about this.
-        # # and also I change the formatting of the numbers
-        # self.traverse(
-        #     f=lambda a_json, a_stack: number_formatter(
-        #         caller_json=a_json,
-        #         number_format=params.personalization_options.number_format,
-        #         call_stack=a_stack,
-        #     ),
-        # )
-        return self.push(metabase_api=params.metabase_api) if push else True
+        # todo: think about this (numbers are not formatted in dashboards).
+        return [migration_visitor(params)]
+
+    def changes(self) -> dict[Any, Any]:
+        """As for any object - but cards and tabs are reconciled together: both are sent if one changed."""
+        changes = super().changes()
+        if ("dashcards" in changes) or ("tabs" in changes):
+            for k in ("dashcards", "tabs"):
+                if k in self.as_json:
+                    changes[k] = self.as_json[k]
+        return changes
 
     def push(self, metabase_api: Metabase_API) -> bool:
-        _logger.info(f"Using API to update dashboard '{self.dashboard_id}'...")
-        r = metabase_api.put(f"/api/dashboard/{self.dashboard_id}", json=self.as_json)
-        # sanity check
-        assert r == 200, f"Problems updating dashboard '{self.dashboard_id}'; code {r}"
-        return bool(r == 200)
+        changes = self.changes()
+        if len(changes) == 0:
+            _logger.debug(
+                f"Dashboard '{self.dashboard_id}' has not changed; nothing to push"
+            )
+            return True
+        _logger.info(
+            f"Using API to update dashboard '{self.dashboard_id}' ({', '.join(changes.keys())})..."
+        )
+        r = metabase_api.put(f"/api/dashboard/{self.dashboard_id}", json=changes)
+        if r != 200:
+            _logger.error(
+                f"Problems updating dashboard '{self.dashboard_id}'; code {r}"
+            )
+            return False
+        self.mark_pushed()
+        return True
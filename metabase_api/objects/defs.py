@@ -1,11 +1,15 @@
 import abc
 import logging
+import threading
+import warnings
+from collections import Counter, defaultdict
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Callable, Any, Optional
+from typing import Callable, Any, Iterable, Optional, Sequence, Union
 
 from metabase_api.metabase_api import Metabase_API
 from metabase_api.utility.db.tables import TablesEquivalencies
+from metabase_api.utility.fingerprint import changed_keys, exact_fingerprints_by_key
 from metabase_api.utility.options import Options
 
 _logger = logging.getLogger(__name__)
@@ -38,56 +42,113 @@ class TraverseStackElement(Enum):
     VISUALIZATION_SETTINGS = auto()
 
     def __str__(self) -> str:
-        return self.name + (f" (title: {self.title})" if self.has_title() else "")
+        return self.name
 
-    def __new__(cls, *args, **kwds):  # type:ignore
-        value = len(cls.__members__) + 1
-        obj = object.__new__(cls)
-        obj._value_ = value
-        return obj
+    def titled(self, title: str) -> "TraverseFrame":
+        """This element, with a title (eg, the name of a card)."""
+        return TraverseFrame(kind=self, title=title)
 
-    def __init__(self, value: int) -> None:
-        self._title: str = ""
+    # Elements used to carry their title, shared by all traversals. Kept for compatibility:
+    # the title is now the one of the innermost element of this kind, in the traversal
+    # running in this thread.
+
+    @property
+    def title(self) -> str:
+        warnings.warn(
+            "'TraverseStackElement.title' is deprecated: use 'TraverseStack.top_frame.title' "
+            "or 'TraverseStack.enclosing_title'",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        stack = getattr(_current_stacks, "stack", None)
+        title = stack.enclosing_title(self) if stack is not None else None
+        return title if title is not None else ""
 
     def has_title(self) -> bool:
         return self.title != ""
 
-    @property
-    def title(self) -> str:
-        return self._title
+    def set_title(self, value: str) -> "TraverseFrame":
+        warnings.warn(
+            "'TraverseStackElement.set_title' is deprecated: use 'titled'",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self.titled(value)
 
-    @title.setter
-    def title(self, value: str) -> None:
-        self._title = value
 
-    def set_title(self, value: str) -> "TraverseStackElement":
-        self.title = value
-        return self
+@dataclass(frozen=True)
+class TraverseFrame:
+    """
+    An element of one traversal, with its title.
+    Frames belong to the traversal that created them (elements are shared by all of them):
+    traversals running in different threads do not see each other's titles.
+    """
 
+    kind: TraverseStackElement
+    title: str = ""
 
-class TraverseStack:
-    """A stack containing the elements we visit."""
+    def __str__(self) -> str:
+        return self.kind.name + (f" (title: {self.title})" if self.title != "" else "")
+
+
+# stack of the traversal running in each thread (see 'TraverseStackElement.title')
+_current_stacks = threading.local()
 
-    def __init__(self, l: Optional[list[TraverseStackElement]] = None) -> None:
-        # super().__init__()
-        self._as_list: list[TraverseStackElement] = l if l else []
+
+class TraverseStack:
+    """
+    A stack containing the elements we visit, one per traversal.
+    The innermost element of each kind is indexed: "what card am I in?" is answered
+    without walking down the stack.
+    """
+
+    def __init__(
+        self, l: Optional[list[Union[TraverseStackElement, TraverseFrame]]] = None
+    ) -> None:
+        self._frames: list[TraverseFrame] = []
+        # kind of element -> its positions in the stack (innermost last)
+        self._positions: dict[TraverseStackElement, list[int]] = defaultdict(list)
+        for elt in l if l else []:
+            self.add(elt)
 
     @property
     def top(self) -> TraverseStackElement:
-        return self._as_list[-1]
+        return self._frames[-1].kind
+
+    @property
+    def top_frame(self) -> TraverseFrame:
+        return self._frames[-1]
 
     @property
     def bottom(self) -> "TraverseStack":
-        """Take off the top and return the rest."""
-        return TraverseStack(l=self._as_list[:-1])
+        """Take off the top and return the rest (a copy: prefer 'enclosing_title' to look down the stack)."""
+        return TraverseStack(l=list(self._frames[:-1]))
+
+    def snapshot(self) -> "TraverseStack":
+        """A copy of the stack, to go on with the traversal somewhere else (eg, in another thread)."""
+        return TraverseStack(l=list(self._frames))
 
     def __len__(self) -> int:
-        return len(self._as_list)
+        return len(self._frames)
 
-    def add(self, elt: TraverseStackElement) -> "TraverseStack":
-        self._as_list.append(elt)
+    def add(self, elt: Union[TraverseStackElement, TraverseFrame]) -> "TraverseStack":
+        frame = elt if isinstance(elt, TraverseFrame) else TraverseFrame(kind=elt)
+        self._positions[frame.kind].append(len(self._frames))
+        self._frames.append(frame)
+        _current_stacks.stack = self
         return self
 
+    def inside(self, kind: TraverseStackElement) -> bool:
+        """Is there an element of this kind in the stack?"""
+        return len(self._positions[kind]) > 0
+
+    def enclosing_title(self, kind: TraverseStackElement) -> Optional[str]:
+        """Title of the innermost element of this kind in the stack (None if there is none)."""
+        positions = self._positions[kind]
+        if len(positions) == 0:
+            return None
+        return self._frames[positions[-1]].title
+
     @property
     def empty(self) -> bool:
         return len(self) == 0
@@ -96,40 +157,252 @@ class TraverseStack:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):  # type:ignore
-        _ = self._as_list.pop()
+        frame = self._frames.pop()
+        self._positions[frame.kind].pop()
+        _current_stacks.stack = self
 
     def __str__(self) -> str:
-        return (
-            "--[bottom]--" + " | ".join([str(v) for v in self._as_list]) + "--[top]--"
-        )
+        return "--[bottom]--" + " | ".join([str(f) for f in self._frames]) + "--[top]--"
+
+
+class Collector(abc.ABC):
+    """Values collected while traversing an object, merged in place."""
+
+    @abc.abstractmethod
+    def add(self, v: Any) -> None:
+        pass
+
+    @property
+    @abc.abstractmethod
+    def value(self) -> Any:
+        pass
+
+    @staticmethod
+    def for_value(v: Any) -> "Collector":
+        """A collector for values of the type of this one."""
+        if isinstance(v, Counter):
+            return CounterCollector()
+        if isinstance(v, (set, frozenset)):
+            return SetCollector()
+        if isinstance(v, list):
+            return ListCollector()
+        raise NotImplementedError(f"Impossible to collect values of type {type(v)}")
+
+
+class SetCollector(Collector):
+    def __init__(self) -> None:
+        self._items: set[Any] = set()
+
+    def add(self, v: Any) -> None:
+        if not isinstance(v, (set, frozenset)):
+            raise TypeError("Impossible to union")
+        self._items.update(v)
+
+    @property
+    def value(self) -> set[Any]:
+        return self._items
+
+
+class ListCollector(Collector):
+    def __init__(self) -> None:
+        self._items: list[Any] = []
+
+    def add(self, v: Any) -> None:
+        if not isinstance(v, list):
+            raise TypeError("Impossible to union")
+        self._items.extend(v)
+
+    @property
+    def value(self) -> list[Any]:
+        return self._items
+
+
+class CounterCollector(Collector):
+    def __init__(self) -> None:
+        self._counts: Counter[Any] = Counter()
+
+    def add(self, v: Any) -> None:
+        if not isinstance(v, Counter):
+            raise TypeError("Impossible to union")
+        self._counts.update(v)
+
+    @property
+    def value(self) -> Counter[Any]:
+        return self._counts
 
 
 class ReturnValue:
-    """todo: document."""
+    """
+    What is returned when visiting an object: nothing (None), or a set, list or counter of things.
+    Values are collected in place with 'add' - a traversal builds one value for all its nodes.
+    """
 
     def __init__(self, v: Any):
-        self.v = v
+        self._v = v
+        # created on the first 'add' (so that returning a value does not copy it)
+        self._collector: Optional[Collector] = None
+
+    @property
+    def v(self) -> Any:
+        return self._collector.value if self._collector is not None else self._v
 
     @classmethod
     def empty(cls) -> "ReturnValue":
         return ReturnValue(None)
 
-    def union(self, v: Any) -> "ReturnValue":
+    def add(self, v: Any) -> "ReturnValue":
+        """Collects a value (or the content of a ReturnValue) in this one, in place."""
         if isinstance(v, ReturnValue):
             v = v.v
-        # union-ing with None always works:
-        if self.v is None:
-            return ReturnValue(v)
         if v is None:
-            return ReturnValue(self.v)
-        # two values need to be the same type
-        if not isinstance(v, type(self.v)):
-            raise TypeError("Impossible to union")
-        if isinstance(self.v, set):
-            return ReturnValue(set(self.v).union(set(v)))
-        if isinstance(self.v, list):
-            return ReturnValue(self.v + v)
-        raise NotImplementedError("not sure what happened here")
+            return self
+        if self._collector is None:
+            self._collector = Collector.for_value(self._v if self._v is not None else v)
+            if self._v is not None:
+                self._collector.add(self._v)
+                self._v = None
+        self._collector.add(v)
+        return self
+
+    def union(self, v: Any) -> "ReturnValue":
+        """A new value, with the content of both (copies everything: in loops, prefer 'add')."""
+        return ReturnValue.empty().add(self).add(v)
+
+
+# a function applied to each place visited when traversing an object
+Visitor = Callable[[Any, TraverseStack], ReturnValue]
+# a function working on one kind of place; returns whether it modified it, and a value
+Handler = Callable[[Any, TraverseStack], tuple[bool, ReturnValue]]
+
+# places that can be found under a place, when traversing objects (the place itself included)
+CLICK_BEHAVIOR_PLACES = frozenset(
+    {TraverseStackElement.CLICK_BEHAVIOR, TraverseStackElement.PARAMETER_MAPPING}
+)
+COLUMN_SETTINGS_PLACES = (
+    frozenset({TraverseStackElement.COLUMN_SETTINGS}) | CLICK_BEHAVIOR_PLACES
+)
+VISUALIZATION_SETTINGS_PLACES = (
+    frozenset(
+        {
+            TraverseStackElement.VISUALIZATION_SETTINGS,
+            TraverseStackElement.TABLE_COLUMN,
+            TraverseStackElement.SERIES_SETTINGS,
+        }
+    )
+    | COLUMN_SETTINGS_PLACES
+)
+CARD_PLACES = (
+    frozenset({TraverseStackElement.CARD, TraverseStackElement.QUERY_PART})
+    | VISUALIZATION_SETTINGS_PLACES
+)
+
+
+def visits(f: Visitor, places: Iterable[TraverseStackElement]) -> bool:
+    """
+    Whether a visitor is interested in any of these places; traversals skip the parts
+    of an object that no visitor is interested in. Plain functions are interested in all places.
+    """
+    interests = getattr(f, "places", None)
+    return interests is None or not interests.isdisjoint(places)
+
+
+@dataclass(frozen=True)
+class _Registration:
+    visitor_name: str
+    handler: Handler
+    predicate: Optional[Callable[[Any], bool]] = None
+
+
+class DispatchVisitor:
+    """
+    A visitor made of handlers, registered per kind of place (and, optionally, only for the places
+    whose json satisfies a predicate). Visiting a place calls the handlers registered for it, and only them.
+    """
+
+    def __init__(
+        self, name: str, handlers: Optional[dict[TraverseStackElement, Handler]] = None
+    ):
+        self.name = name
+        self._table: dict[TraverseStackElement, list[_Registration]] = defaultdict(list)
+        for place, handler in (handlers if handlers is not None else dict()).items():
+            self.on(place, handler)
+
+    def on(
+        self,
+        place: TraverseStackElement,
+        handler: Handler,
+        predicate: Optional[Callable[[Any], bool]] = None,
+    ) -> "DispatchVisitor":
+        self._table[place].append(_Registration(self.name, handler, predicate))
+        return self
+
+    @property
+    def places(self) -> frozenset[TraverseStackElement]:
+        return frozenset(self._table.keys())
+
+    @classmethod
+    def merged(cls, visitors: Sequence["DispatchVisitor"]) -> "DispatchVisitor":
+        """One visitor with the handlers of all of them: on each place, they are called in order."""
+        result = cls(" + ".join(v.name for v in visitors))
+        for v in visitors:
+            for place, registrations in v._table.items():
+                result._table[place].extend(registrations)
+        return result
+
+    def __call__(self, caller_json: Any, call_stack: TraverseStack) -> ReturnValue:
+        if call_stack.empty:
+            raise RuntimeError("Call stack is empty - this shouldn't happen!")
+        top_of_stack = call_stack.top
+        r = ReturnValue.empty()
+        for registration in self._table.get(top_of_stack, ()):
+            if (registration.predicate is not None) and not registration.predicate(
+                caller_json
+            ):
+                continue
+            modified, v = registration.handler(caller_json, call_stack)
+            if modified:
+                _logger.debug(
+                    f"[{registration.visitor_name}] worked on {top_of_stack.name} (stack: {call_stack})"
+                )
+            r.add(v)
+        return r
+
+
+def fused(visitors: Sequence[Visitor]) -> Visitor:
+    """
+    A visitor applying several ones (in order) to each place visited:
+    the object is traversed once, whatever the number of visitors.
+    """
+    if len(visitors) == 1:
+        return visitors[0]
+    if all(isinstance(v, DispatchVisitor) for v in visitors):
+        return DispatchVisitor.merged(visitors)  # type: ignore
+
+    def _f(a_json: Any, a_stack: TraverseStack) -> ReturnValue:
+        r = ReturnValue.empty()
+        for visitor in visitors:
+            r.add(visitor(a_json, a_stack))
+        return r
+
+    return _f
+
+
+def reusing_last(factory: Callable[[Any], Visitor]) -> Callable[[Any], Visitor]:
+    """
+    Wraps a visitor factory: the visitor is built again only when it is asked for
+    other parameters (not the same object) than the last time.
+    """
+    last: Optional[tuple[Any, Visitor]] = None
+
+    def _visitor_for(parameters: Any) -> Visitor:
+        nonlocal last
+        cached = last  # (read once: another thread may replace it)
+        if (cached is None) or (cached[0] is not parameters):
+            cached = (parameters, factory(parameters))
+            last = cached
+        return cached[1]
+
+    return _visitor_for
 
 
 @dataclass
@@ -239,6 +512,33 @@ class CollectionObject(abc.ABC):
     def __init__(self, as_json: dict[Any, Any]):
         self.as_json = as_json
         self._labels: set[str] = set()
+        # fingerprints of the json as the server has it (see 'track_changes'); None if not tracked
+        self._pushed_fingerprints: Optional[dict[str, str]] = None
+
+    def track_changes(self) -> "CollectionObject":
+        """
+        From now on, only what changes in the object is pushed. Called on the objects loaded to be
+        pushed (fingerprinting every key is not free): the others push their whole json.
+        """
+        self._pushed_fingerprints = exact_fingerprints_by_key(self.as_json)
+        return self
+
+    @property
+    def changed_keys(self) -> list[str]:
+        """Top-level keys of the json that changed since the object was loaded (or last pushed)."""
+        if self._pushed_fingerprints is None:
+            return sorted(self.as_json.keys())
+        return changed_keys(
+            self._pushed_fingerprints, exact_fingerprints_by_key(self.as_json)
+        )
+
+    def changes(self) -> dict[Any, Any]:
+        """What changed since the object was loaded (or last pushed); keys that are gone are None."""
+        return {k: self.as_json.get(k) for k in self.changed_keys}
+
+    def mark_pushed(self) -> None:
+        """The server now has the json of the object as it is."""
+        self.track_changes()
 
     @property
     def object_id(self) -> int:
@@ -271,34 +571,46 @@ class CollectionObject(abc.ABC):
 
     @abc.abstractmethod
     def push(self, metabase_api: Metabase_API) -> bool:
+        """Sends what changed in the object to the server (nothing is sent if nothing changed)."""
         pass
 
-    def migrate(self, params: MigrationParameters, push: bool) -> bool:
-        """Migrates the object, based on a set of parameters. Pushes if flag is True."""
-        from metabase_api.migration.defs import migration_function
-        from metabase_api.objects.visitors.defs import number_formatter
+    def visit(
+        self, visitors: Sequence[Visitor], call_stack: Optional[TraverseStack] = None
+    ) -> ReturnValue:
+        """Traverses the object once, applying all visitors (in order) to each visited place."""
+        return self.traverse(f=fused(visitors), call_stack=call_stack)
+
+    def migration_visitors(self, params: MigrationParameters) -> list[Visitor]:
+        """What migrates the object: the references are replaced, and the numbers are formatted."""
+        from metabase_api.migration.defs import migration_visitor
+        from metabase_api.objects.visitors.defs import number_formatting_visitor
 
-        self.traverse(
-            f=lambda a_json, a_stack: migration_function(
-                caller_json=a_json, params=params, call_stack=a_stack
-            ),
-        )
-        # and also I change the formatting of the numbers
-        self.traverse(
-            f=lambda a_json, a_stack: number_formatter(
-                caller_json=a_json,
-                number_format=params.personalization_options.number_format,
-                call_stack=a_stack,
-            ),
-        )
+        return [
+            migration_visitor(params),
+            number_formatting_visitor(params.personalization_options.number_format),
+        ]
+
+    def translation_visitors(self, translation_dict: dict[str, str]) -> list[Visitor]:
+        from metabase_api.objects.visitors.defs import label_replacing_visitor
+
+        return [label_replacing_visitor(translation_dict)]
+
+    def migrate(
+        self,
+        params: MigrationParameters,
+        push: bool,
+        translation_dict: Optional[dict[str, str]] = None,
+    ) -> bool:
+        """
+        Migrates the object, based on a set of parameters. Pushes if flag is True.
+        If there is a translation dict, the object is also translated - in the same pass.
+        """
+        visitors = self.migration_visitors(params)
+        if translation_dict:
+            visitors += self.translation_visitors(translation_dict)
+        self.visit(visitors)
         return self.push(metabase_api=params.metabase_api) if push else True
 
     def translate(self, translation_dict: dict[str, str]) -> None:
         """Changes labels in the object - aka, 'translates' it."""
-        from metabase_api.objects.visitors.defs import label_replacer
-
-        self.traverse(
-            f=lambda a_json, a_stack: label_replacer(
-                caller_json=a_json, call_stack=a_stack, labels_repl=translation_dict
-            ),
-        )
+        self.visit(self.translation_visitors(translation_dict))
@@ -1,183 +1,268 @@
 import logging
 from copy import deepcopy
-from typing import Optional
+from typing import Any, Optional
 
-from metabase_api.objects.defs import TraverseStack, ReturnValue, TraverseStackElement
+from metabase_api.objects.defs import (
+    DispatchVisitor,
+    TraverseStack,
+    ReturnValue,
+    TraverseStackElement,
+    reusing_last,
+)
 from metabase_api.utility.options import NumberFormat
-from copy import copy
 
 _logger = logging.getLogger(__name__)
 
 
+def _is_column_numeric(column_d: dict[str, str]) -> bool:
+    """Based on the definition of the column, tries to determine if it is numeric."""
+    FIELDS_IN_NUMERIC_COLUMN = {
+        "number_style",
+        "number_separators",
+        "suffix",
+        "prefix",
+        "currency_in_header",
+        "decimals",
+    }
+    if len(FIELDS_IN_NUMERIC_COLUMN.intersection(column_d.keys())) > 0:
+        return True
+    return False
+
+
+def _is_currency(parent_title: str, d: dict[str, str]) -> bool:
+    """Builds the dictionary for number formatting."""
+    CURRENCY_HINTS = {"cost", "price", "money", "income"}
+    parent_title_looks_like_currency = (
+        next(
+            (x for x in CURRENCY_HINTS if x in parent_title.lower()),
+            None,
+        )
+        is not None
+    )
+    title_looks_like_currency = (
+        next(
+            (x for x in CURRENCY_HINTS if x in d.get("column_title", "").lower()),
+            None,
+        )
+        is not None
+    )
+    return (
+        (d.get("prefix", "") == "$")
+        or (d.get("suffix", "") == "$")
+        or (d.get("number_style", "") == "currency")
+        or (d.get("number_style", "") == "devise")  # :shrug:
+        # or ("currency_in_header" in d)
+        or title_looks_like_currency
+        or parent_title_looks_like_currency
+    )
+
+
+def _formatting_settings_from(
+    number_format: NumberFormat, is_currency: bool
+) -> dict[str, str]:
+    """Builds the dictionary for number formatting."""
+    common = {
+        "number_style": number_format.number_style,
+        "number_separators": number_format.number_separators,
+    }
+    suffix_prefix = {
+        "suffix": number_format.number_currency_suffix
+        if is_currency
+        else number_format.number_other_suffix,
+        "prefix": number_format.number_currency_prefix
+        if is_currency
+        else number_format.number_other_prefix,
+    }
+    return common | suffix_prefix
+
+
+def _format_column_settings(
+    column_settings: dict, call_stack: TraverseStack, number_format: NumberFormat
+) -> tuple[bool, ReturnValue]:
+    modified = False
+    card_title_opt = call_stack.enclosing_title(TraverseStackElement.CARD)
+    for _col_set_k, _a_dict in column_settings.items():
+        # sanity check. Probably not needed.
+        assert isinstance(_a_dict, dict)
+        if _is_column_numeric(column_d=_a_dict):
+            # let's take care of the formatting elements on one side, and the rest on another
+            # we only use the title of the card as an indicator for currency is in the case
+            # of having only ONE value in the card
+            is_currency = _is_currency(
+                parent_title=card_title_opt
+                if (card_title_opt is not None) and (len(column_settings) == 1)
+                else "",
+                d=_a_dict,
+            )
+            formatting_d = _formatting_settings_from(number_format, is_currency)
+            rest_of_d = deepcopy(
+                {k: v for (k, v) in _a_dict.items() if k not in formatting_d.keys()}
+            )
+            # and now I combine both
+            column_settings[_col_set_k] = formatting_d | rest_of_d
+            modified = True
+    return modified, ReturnValue.empty()
+
+
+def number_formatting_visitor(number_format: NumberFormat) -> DispatchVisitor:
+    return DispatchVisitor(
+        "number formatter",
+        {
+            TraverseStackElement.COLUMN_SETTINGS: lambda a_json, a_stack: _format_column_settings(
+                a_json, a_stack, number_format
+            )
+        },
+    )
+
+
+_last_number_formatting_visitor = reusing_last(number_formatting_visitor)
+
+
 def number_formatter(
     caller_json: dict,  # type:ignore
     number_format: NumberFormat,
     call_stack: TraverseStack,
 ) -> ReturnValue:
-    def _is_column_numeric(column_d: dict[str, str]) -> bool:
-        """Based on the definition of the column, tries to determine if it is numeric."""
-        FIELDS_IN_NUMERIC_COLUMN = {
-            "number_style",
-            "number_separators",
-            "suffix",
-            "prefix",
-            "currency_in_header",
-            "decimals",
-        }
-        if len(FIELDS_IN_NUMERIC_COLUMN.intersection(column_d.keys())) > 0:
-            return True
-        return False
-
-    def _is_currency(parent_title: str, d: dict[str, str]) -> bool:
-        """Builds the dictionary for number formatting."""
-        CURRENCY_HINTS = {"cost", "price", "money", "income"}
-        parent_title_looks_like_currency = (
-            next(
-                (x for x in CURRENCY_HINTS if x in parent_title.lower()),
-                None,
-            )
-            is not None
-        )
-        title_looks_like_currency = (
-            next(
-                (x for x in CURRENCY_HINTS if x in d.get("column_title", "").lower()),
-                None,
-            )
-            is not None
-        )
+    """Kept for compatibility: prefer 'number_formatting_visitor' (built once for all the places of an object)."""
+    return _last_number_formatting_visitor(number_format)(caller_json, call_stack)
+
+
+def _is_title_key(k: str) -> bool:
+    return (
+        (k == "text")
+        or (k == "graph.x_axis.title_text")
+        or (k == "graph.y_axis.title_text")
+        or k.endswith("title_text")
+    )
+
+
+def _fetch_object_labels(obj_json: dict, _: TraverseStack) -> tuple[bool, ReturnValue]:
+    _labels = {
+        v
+        for k, v in obj_json.items()
+        if (k in {"description", "name"}) and (v is not None)
+    }
+    return len(_labels) > 0, ReturnValue(_labels)
+
+
+def _fetch_tabs_labels(tabs: list, _: TraverseStack) -> tuple[bool, ReturnValue]:
+    _labels = {a_tab["name"] for a_tab in tabs}
+    return len(_labels) > 0, ReturnValue(_labels)
+
+
+def _fetch_parameter_labels(
+    params_dict: dict, _: TraverseStack
+) -> tuple[bool, ReturnValue]:
+    return True, ReturnValue({params_dict["name"]})
+
+
+def _fetch_viz_labels(viz_set: dict, _: TraverseStack) -> tuple[bool, ReturnValue]:
+    _labels = {v for k, v in viz_set.items() if _is_title_key(k)}
+    return len(_labels) > 0, ReturnValue(_labels)
+
+
+def _nested_labels_fetcher(label_key: str) -> Any:
+    """Fetches the labels of a dictionary of dictionaries (column settings, series settings)."""
+
+    def _fetch(settings: dict, _: TraverseStack) -> tuple[bool, ReturnValue]:
+        _labels = {v for d in settings.values() for k, v in d.items() if k == label_key}
+        return len(_labels) > 0, ReturnValue(_labels)
+
+    return _fetch
+
+
+# fetches labels from a structure.
+label_fetcher = DispatchVisitor(
+    "label fetcher",
+    {
+        TraverseStackElement.CARD: _fetch_object_labels,
+        TraverseStackElement.DASHBOARD: _fetch_object_labels,
+        TraverseStackElement.TABS: _fetch_tabs_labels,
+        TraverseStackElement.PARAMETER: _fetch_parameter_labels,
+        TraverseStackElement.VISUALIZATION_SETTINGS: _fetch_viz_labels,
+        TraverseStackElement.COLUMN_SETTINGS: _nested_labels_fetcher("column_title"),
+        TraverseStackElement.SERIES_SETTINGS: _nested_labels_fetcher("title"),
+    },
+)
+
+
+def _try_replace_str(v: str, labels_repl: dict[str, str]) -> tuple[bool, str]:
+    """Searches for a replacement for the input string; returns it along with a flag (True if replaced)."""
+    changed: bool
+    # we'll handle the string as-is first, but also we'll look at the case were the string
+    # is surrounded by white-spaces
+    repl = labels_repl.get(v, v)
+    changed = repl != v
+    if changed:
+        return changed, repl
+    # ok, then let's handle whitespaces
+    # how many at the left? And at the right?
+    lblanks = len(v) - len(v.lstrip())
+    rblanks = len(v) - len(v.rstrip())
+    v_stripped = v.strip()
+    repl = labels_repl.get(v_stripped, v_stripped)
+    # let's re-add the white spaces
+    repl = " " * lblanks + repl + " " * rblanks
+    return repl != v, repl
+
+
+def label_replacing_visitor(labels_repl: dict[str, str]) -> DispatchVisitor:
+    """Changes the labels of a structure - aka, 'translates' it."""
+
+    def _replace_in(d: dict, keys: Any) -> bool:
+        modified = False
+        for k, v in d.items():
+            if keys(k) and (v is not None):
+                changed, d[k] = _try_replace_str(v, labels_repl)
+                modified = modified or changed
+        return modified
+
+    def _object(obj_json: dict, _: TraverseStack) -> tuple[bool, ReturnValue]:
         return (
-            (d.get("prefix", "") == "$")
-            or (d.get("suffix", "") == "$")
-            or (d.get("number_style", "") == "currency")
-            or (d.get("number_style", "") == "devise")  # :shrug:
-            # or ("currency_in_header" in d)
-            or title_looks_like_currency
-            or parent_title_looks_like_currency
+            _replace_in(obj_json, lambda k: k in {"description", "name"}),
+            ReturnValue.empty(),
         )
 
-    def _formatting_settings_from(is_currency: bool) -> dict[str, str]:
-        """Builds the dictionary for number formatting."""
-        common = {
-            "number_style": number_format.number_style,
-            "number_separators": number_format.number_separators,
-        }
-        suffix_prefix = {
-            "suffix": number_format.number_currency_suffix
-            if is_currency
-            else number_format.number_other_suffix,
-            "prefix": number_format.number_currency_prefix
-            if is_currency
-            else number_format.number_other_prefix,
-        }
-        return common | suffix_prefix
-
-    def _enclosing_card_title(_stack_copy: TraverseStack) -> Optional[str]:
-        """Go up in stack until I find a card - and return its name. None if no card."""
-        if len(_stack_copy) == 0:
-            return None
-        top = _stack_copy.top
-        if top == TraverseStackElement.CARD:
-            return top.title
-        return _enclosing_card_title(_stack_copy.bottom)
-
-    if call_stack.empty:
-        raise RuntimeError("Call stack is empty - this shouldn't happen!")
-    top_of_stack: TraverseStackElement = call_stack.top
-    modified: bool = False
-    card_title_opt: Optional[str]
-    if top_of_stack == TraverseStackElement.COLUMN_SETTINGS:
-        card_title_opt = _enclosing_card_title(copy(call_stack))
-        # print(f"card_title_opt: {card_title_opt}")
-        column_settings = caller_json
-        for _col_set_k, _a_dict in column_settings.items():
-            # sanity check. Probably not needed.
-            assert isinstance(_a_dict, dict)
-            if _is_column_numeric(column_d=_a_dict):
-                # let's take care of the formatting elements on one side, and the rest on another
-                # we only use the title of the card as an indicator for currency is in the case
-                # of having only ONE value in the card
-                is_currency = _is_currency(
-                    parent_title=card_title_opt
-                    if (card_title_opt is not None) and (len(column_settings) == 1)
-                    else "",
-                    d=_a_dict,
-                )
-                formatting_d = _formatting_settings_from(is_currency)
-                rest_of_d = deepcopy(
-                    {k: v for (k, v) in _a_dict.items() if k not in formatting_d.keys()}
-                )
-                # and now I combine both
-                column_settings[_col_set_k] = formatting_d | rest_of_d
-                modified = True
-    if modified:
-        _logger.debug(
-            f"[number formatter] worked on {top_of_stack.name} (stack: {call_stack})"
+    def _tabs(tabs: list, _: TraverseStack) -> tuple[bool, ReturnValue]:
+        modified = False
+        for a_tab in tabs:
+            changed, a_tab["name"] = _try_replace_str(a_tab["name"], labels_repl)
+            modified = modified or changed
+        return modified, ReturnValue.empty()
+
+    def _parameter(params_dict: dict, _: TraverseStack) -> tuple[bool, ReturnValue]:
+        modified, params_dict["name"] = _try_replace_str(
+            params_dict["name"], labels_repl
         )
-    return ReturnValue(None)
+        return modified, ReturnValue.empty()
 
+    def _viz(viz_set: dict, _: TraverseStack) -> tuple[bool, ReturnValue]:
+        return _replace_in(viz_set, _is_title_key), ReturnValue.empty()
+
+    def _nested(label_key: str) -> Any:
+        def _replace(settings: dict, _: TraverseStack) -> tuple[bool, ReturnValue]:
+            modified = False
+            for d in settings.values():
+                modified = _replace_in(d, lambda k: k == label_key) or modified
+            return modified, ReturnValue.empty()
+
+        return _replace
+
+    return DispatchVisitor(
+        "label replacer",
+        {
+            TraverseStackElement.CARD: _object,
+            TraverseStackElement.DASHBOARD: _object,
+            TraverseStackElement.TABS: _tabs,
+            TraverseStackElement.PARAMETER: _parameter,
+            TraverseStackElement.VISUALIZATION_SETTINGS: _viz,
+            TraverseStackElement.COLUMN_SETTINGS: _nested("column_title"),
+            TraverseStackElement.SERIES_SETTINGS: _nested("title"),
+        },
+    )
 
-def label_fetcher(
-    caller_json: dict,  # type:ignore
-    call_stack: TraverseStack,
-) -> ReturnValue:
-    """Fetches labels from a structure."""
-    if call_stack.empty:
-        raise RuntimeError("Call stack is empty - this shouldn't happen!")
-    top_of_stack = call_stack.top
-    _labels: set[str] = set()
-    modified = False
-    if top_of_stack == TraverseStackElement.CARD:
-        card_json = caller_json
-        for k, v in card_json.items():
-            if (k == "description") or (k == "name"):
-                if v is not None:
-                    _labels.add(v)
-                    modified = True
-    elif top_of_stack == TraverseStackElement.DASHBOARD:
-        dash = caller_json
-        for k, v in dash.items():
-            if k in {"description", "name"}:
-                _labels.add(v)
-                modified = True
-    elif top_of_stack == TraverseStackElement.TABS:
-        tabs = caller_json
-        for a_tab in tabs:
-            _labels.add(a_tab["name"])
-            modified = True
-    elif top_of_stack == TraverseStackElement.PARAMETER:
-        params_dict = caller_json
-        _labels.add(params_dict["name"])
-        modified = True
-    elif top_of_stack == TraverseStackElement.VISUALIZATION_SETTINGS:
-        viz_set = caller_json
-        for k, v in viz_set.items():
-            if (
-                (k == "text")
-                or (k == "graph.x_axis.title_text")
-                or (k == "graph.y_axis.title_text")
-                or k.endswith("title_text")
-            ):
-                _labels.add(v)
-                modified = True
-    elif top_of_stack == TraverseStackElement.COLUMN_SETTINGS:
-        cols_set = caller_json
-        for _, d in cols_set.items():
-            for k, v in d.items():
-                if k == "column_title":
-                    _labels.add(v)
-                    modified = True
-    elif top_of_stack == TraverseStackElement.SERIES_SETTINGS:
-        series_set = caller_json
-        for _, d in series_set.items():
-            for k, v in d.items():
-                if k == "title":
-                    _labels.add(v)
-                    modified = True
-    if modified:
-        _logger.debug(
-            f"[label fetcher] grabbed label(s) from {top_of_stack.name} (stack: {call_stack})"
-        )
-    return ReturnValue(_labels)
+
+_last_label_replacing_visitor = reusing_last(label_replacing_visitor)
 
 
 def label_replacer(
@@ -185,74 +270,5 @@ def label_replacer(
     call_stack: TraverseStack,
     labels_repl: dict[str, str],
 ) -> ReturnValue:
-    def _try_replace_str(v: str) -> tuple[bool, str]:
-        """Searches for a replacement for the input string; returns it along with a flag (True if replaced)."""
-        changed: bool
-        # we'll handle the string as-is first, but also we'll look at the case were the string
-        # is surrounded by white-spaces
-        repl = labels_repl.get(v, v)
-        changed = repl != v
-        if changed:
-            return changed, repl
-        # ok, then let's handle whitespaces
-        # how many at the left? And at the right?
-        lblanks = len(v) - len(v.lstrip())
-        rblanks = len(v) - len(v.rstrip())
-        v_stripped = v.strip()
-        repl = labels_repl.get(v_stripped, v_stripped)
-        # let's re-add the white spaces
-        repl = " " * lblanks + repl + " " * rblanks
-        return repl != v, repl
-
-    if call_stack.empty:
-        raise RuntimeError("Call stack is empty - this shouldn't happen!")
-    top_of_stack = call_stack.top
-    _labels: set[str] = set()
-    modified: bool = False
-    if top_of_stack == TraverseStackElement.CARD:
-        card_json = caller_json
-        for k, v in card_json.items():
-            if (k == "description") or (k == "name"):
-                if v is not None:
-                    modified, card_json[k] = _try_replace_str(v)
-    elif top_of_stack == TraverseStackElement.DASHBOARD:
-        dash = caller_json
-        for k, v in dash.items():
-            if k in {"description", "name"}:
-                if v is not None:
-                    modified, dash[k] = _try_replace_str(v)
-    elif top_of_stack == TraverseStackElement.TABS:
-        tabs = caller_json
-        for a_tab in tabs:
-            modified, a_tab["name"] = _try_replace_str(a_tab["name"])
-    elif top_of_stack == TraverseStackElement.PARAMETER:
-        params_dict = caller_json
-        modified, params_dict["name"] = _try_replace_str(params_dict["name"])
-    elif top_of_stack == TraverseStackElement.VISUALIZATION_SETTINGS:
-        modified = True
-        viz_set = caller_json
-        for k, v in viz_set.items():
-            if (
-                (k == "text")
-                or (k == "graph.x_axis.title_text")
-                or (k == "graph.y_axis.title_text")
-                or k.endswith("title_text")
-            ):
-                modified, viz_set[k] = _try_replace_str(v)
-    elif top_of_stack == TraverseStackElement.COLUMN_SETTINGS:
-        cols_set = caller_json
-        for _, d in cols_set.items():
-            for k, v in d.items():
-                if k == "column_title":
-                    modified, d[k] = _try_replace_str(v)
-    elif top_of_stack == TraverseStackElement.SERIES_SETTINGS:
-        series_set = caller_json
-        for _, d in series_set.items():
-            for k, v in d.items():
-                if k == "title":
-                    modified, d[k] = _try_replace_str(v)
-    if modified:
-        _logger.debug(
-            f"[label replacer] modified on: {top_of_stack.name} (stack: {call_stack})"
-        )
-    return ReturnValue(None)
+    """Kept for compatibility: prefer 'label_replacing_visitor' (built once for all the places of an object)."""
+    return _last_label_replacing_visitor(labels_repl)(caller_json, call_stack)
@@ -0,0 +1,323 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+from metabase_api.copy_methods import (
+    _card_id_mapper,
+    _dashboard_parameters,
+    _fill_dashboard,
+)
+from metabase_api.utility.fingerprint import CARD_CONTENT_KEYS, fingerprint
+from metabase_api.utility.mbql import card_references, replace_card_references
+
+_logger = logging.getLogger(__name__)
+
+# what is compared (and updated) when syncing cards
+SYNCED_CARD_KEYS = CARD_CONTENT_KEYS + ("name", "description")
+# what is compared (and updated) when syncing dashboards
+SYNCED_DASHBOARD_KEYS = ("name", "description", "parameters", "tabs", "dashcards")
+
+
+def card_content_hash(card_json: dict) -> str:
+    return fingerprint({k: card_json.get(k) for k in SYNCED_CARD_KEYS})
+
+
+def dashboard_content_hash(dashboard_json: dict) -> str:
+    content = {k: dashboard_json.get(k) for k in SYNCED_DASHBOARD_KEYS}
+    # the embedded cards (and dates) change without the dashboard changing
+    content["dashcards"] = [
+        {
+            k: v
+            for k, v in dashcard.items()
+            if k not in {"card", "created_at", "updated_at"}
+        }
+        for dashcard in dashboard_json.get("dashcards", list())
+    ]
+    content["tabs"] = [
+        {k: v for k, v in tab.items() if k not in {"created_at", "updated_at"}}
+        for tab in dashboard_json.get("tabs", list())
+    ]
+    return fingerprint(content)
+
+
+def _read_sync_state(p: Path) -> Optional[dict]:
+    """State of a previous sync (json keys are strings: ids are turned back into integers)."""
+    if not p.exists():
+        return None
+    with open(p) as f:
+        state = json.load(f)
+    state["transf"] = {
+        what: {int(k): v for k, v in mapping.items()}
+        for what, mapping in state["transf"].items()
+    }
+    state["objects"] = {
+        model: {int(k): v for k, v in objs.items()}
+        for model, objs in state["objects"].items()
+    }
+    return state
+
+
+def _write_sync_state(p: Path, state: dict) -> None:
+    tmp = p.with_name(p.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    tmp.replace(p)
+
+
+def sync_collection(
+    self,
+    source_collection_id,
+    state_path,
+    destination_parent_collection_id=None,
+    destination_collection_name=None,
+    max_workers=4,
+    verbose=False,
+) -> dict[str, Any]:
+    """
+    Keeps a copy of a collection up to date. The first sync copies the collection (with its cards,
+    see 'copy_collection') and saves, in 'state_path', the mapping src -> dst of all objects with the
+    'updated_at' and content hash of each source card and dashboard.
+    Next syncs load the tree of the source only; objects that have not been updated since are left alone,
+    the ones with a new content are updated (with one PUT) and the new ones are copied.
+    Objects removed from the source are kept in the copy.
+
+    Keyword arguments:
+    source_collection_id -- id of the collection to copy
+    state_path -- file with the state of the sync (created on the first sync)
+    destination_parent_collection_id -- id of the collection to put the copy in (first sync only)
+    destination_collection_name -- name of the copy (first sync only; default None: same name as the source)
+    max_workers -- maximum number of objects created or updated at the same time (default 4)
+    verbose -- prints extra information (default False)
+
+    :return the mapping of all objects ('transf', as 'copy_collection'), and the ids of the
+            source objects that were 'created' and 'updated', by model.
+    """
+    from metabase_api.collection_tree import CollectionTree
+
+    state_path = Path(state_path)
+    state = _read_sync_state(state_path)
+    if (state is not None) and (state["source_collection_id"] != source_collection_id):
+        raise ValueError(
+            f"'{str(state_path)}' is the state of the sync of collection {state['source_collection_id']}"
+        )
+    tree = CollectionTree.load(self, source_collection_id, max_workers=max_workers)
+    items = {
+        (i["model"], i["id"]): dict(i, collection_id=node.id)
+        for node in tree.walk()
+        for i in node.items
+    }
+    created: dict[str, list[int]] = dict()
+    updated: dict[str, list[int]] = dict()
+    if state is None:
+        self.verbose_print(verbose, "First sync: copying the whole collection...")
+        transf = self.copy_collection(
+            source_collection_id=source_collection_id,
+            destination_parent_collection_id=destination_parent_collection_id,
+            destination_parent_collection_name=None
+            if destination_parent_collection_id
+            else "Root",
+            destination_collection_name=destination_collection_name,
+            deepcopy_dashboards=True,
+            max_workers=max_workers,
+            verbose=verbose,
+        )
+        state = {
+            "source_collection_id": source_collection_id,
+            "transf": transf,
+            "objects": {"card": dict(), "dashboard": dict()},
+        }
+        for model, what in [
+            ("collection", "collections"),
+            ("card", "cards"),
+            ("dashboard", "dashboards"),
+        ]:
+            created[model] = sorted(transf[what].keys())
+    objects = state["objects"]
+    # only the objects updated since the last sync are looked at
+    changed_cards = [
+        c_id
+        for c_id, card_json in tree.cards.items()
+        if objects["card"].get(c_id, dict()).get("updated_at")
+        != card_json.get("updated_at")
+    ]
+    changed_dashboards = [
+        d_id
+        for (model, d_id), i in items.items()
+        if model == "dashboard"
+        and objects["dashboard"].get(d_id, dict()).get("updated_at")
+        != i.get("updated_at")
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        source_dashboards = dict(
+            zip(
+                changed_dashboards,
+                executor.map(
+                    lambda d_id: self.get(f"/api/dashboard/{d_id}"), changed_dashboards
+                ),
+            )
+        )
+        if len(created) == 0:
+            try:
+                created, updated = _apply_changes(
+                    self,
+                    executor,
+                    tree=tree,
+                    items=items,
+                    state=state,
+                    changed_cards=changed_cards,
+                    source_dashboards=source_dashboards,
+                )
+            except Exception:
+                # keep what was created (but nothing is in sync yet)
+                _write_sync_state(state_path, state)
+                raise
+
+    # what the copy is now in sync with
+    for c_id in changed_cards:
+        objects["card"][c_id] = {
+            "updated_at": tree.cards[c_id].get("updated_at"),
+            "hash": card_content_hash(tree.cards[c_id]),
+        }
+    for d_id, src in source_dashboards.items():
+        objects["dashboard"][d_id] = {
+            "updated_at": items[("dashboard", d_id)].get("updated_at"),
+            "hash": dashboard_content_hash(src),
+        }
+    _write_sync_state(state_path, state)
+    _logger.info(
+        f"Collection {source_collection_id} synced: created {created}, updated {updated}"
+    )
+    return {"transf": state["transf"], "created": created, "updated": updated}
+
+
+def _apply_changes(
+    metabase_api,
+    executor: ThreadPoolExecutor,
+    tree,
+    items: dict,
+    state: dict,
+    changed_cards: list[int],
+    source_dashboards: dict[int, dict],
+) -> tuple[dict[str, list[int]], dict[str, list[int]]]:
+    """Creates the new objects, and updates the ones whose content changed. Returns their ids, by model."""
+    from metabase_api.copy_engine import dependency_waves
+
+    transf = state["transf"]
+    objects = state["objects"]
+    created: dict[str, list[int]] = dict()
+    updated: dict[str, list[int]] = dict()
+
+    # new collections, parents first
+    new_collections = [n for n in tree.walk() if n.id not in transf["collections"]]
+    for node in new_collections:
+        res = metabase_api.create_collection(
+            node.name,
+            parent_collection_id=transf["collections"][node.parent_id],
+            return_results=True,
+        )
+        transf["collections"][node.id] = int(res["id"])
+    created["collection"] = [n.id for n in new_collections]
+
+    # new cards, referenced cards first
+    def _copy_card(card_id: int) -> int:
+        card_json = dict(tree.cards[card_id])
+        card_json["dataset_query"] = replace_card_references(
+            card_json.get("dataset_query", {}), transf["cards"]
+        )
+        return int(
+            metabase_api.copy_card(
+                source_card_json=card_json,
+                destination_collection_id=transf["collections"][
+                    items[("card", card_id)]["collection_id"]
+                ],
+                destination_card_name=card_json["name"],
+            )
+        )
+
+    created["card"] = [c_id for c_id in changed_cards if c_id not in transf["cards"]]
+    for wave in dependency_waves(
+        {
+            c_id: card_references(tree.cards[c_id].get("dataset_query", {}))
+            for c_id in created["card"]
+        }
+    ):
+        for card_id, dup_card_id in zip(wave, executor.map(_copy_card, wave)):
+            transf["cards"][card_id] = dup_card_id
+
+    # cards whose content changed
+    def _update_card(card_id: int) -> bool:
+        card_json = tree.cards[card_id]
+        if card_content_hash(card_json) == objects["card"][card_id]["hash"]:
+            return False
+        put_json = {k: card_json.get(k) for k in SYNCED_CARD_KEYS}
+        put_json["dataset_query"] = replace_card_references(
+            card_json.get("dataset_query", {}), transf["cards"]
+        )
+        r = metabase_api.put(f"/api/card/{transf['cards'][card_id]}", json=put_json)
+        if r != 200:
+            raise ValueError(f"Problems updating card '{card_id}'; code {r}")
+        return True
+
+    to_check = [c_id for c_id in changed_cards if c_id in objects["card"]]
+    updated["card"] = [
+        c_id
+        for c_id, changed in zip(to_check, executor.map(_update_card, to_check))
+        if changed
+    ]
+
+    # dashboards: new ones are copied, the others are filled again if their content changed.
+    # (workers return the new ids: 'transf' is only updated here, in this thread)
+    def _sync_dashboard(
+        dashboard_id: int,
+    ) -> tuple[Optional[str], Optional[int], dict[int, int]]:
+        src = source_dashboards[dashboard_id]
+        if dashboard_id not in transf["dashboards"]:
+            dup_id, tabs_equiv = metabase_api.copy_dashboard_from_json(
+                source_dashboard_json=src,
+                destination_collection_id=transf["collections"][
+                    items[("dashboard", dashboard_id)]["collection_id"]
+                ],
+                destination_dashboard_name=src["name"],
+                card_id_mapping=transf["cards"],
+            )
+            return "created", dup_id, tabs_equiv
+        if dashboard_content_hash(src) == objects["dashboard"][dashboard_id]["hash"]:
+            return None, None, dict()
+        tabs_equiv = _fill_dashboard(
+            metabase_api,
+            transf["dashboards"][dashboard_id],
+            src,
+            card_id_mapping=transf["cards"],
+            extra_json={
+                "name": src["name"],
+                "description": src.get("description"),
+                "parameters": _dashboard_parameters(
+                    src, _card_id_mapper(transf["cards"])
+                ),
+            },
+        )
+        return "updated", None, tabs_equiv
+
+    dashboard_ids = sorted(source_dashboards.keys())
+    futures = [executor.submit(_sync_dashboard, d_id) for d_id in dashboard_ids]
+    created["dashboard"], updated["dashboard"] = [], []
+    first_error: Optional[BaseException] = None
+    for dashboard_id, future in zip(dashboard_ids, futures):
+        # all the dashboards that were synced are recorded, even if another one failed
+        try:
+            outcome, dup_id, tabs_equiv = future.result()
+        except Exception as e:
+            first_error = first_error or e
+            continue
+        if dup_id is not None:
+            transf["dashboards"][dashboard_id] = dup_id
+        transf["tabs"] = transf["tabs"] | tabs_equiv
+        if outcome == "created":
+            created["dashboard"].append(dashboard_id)
+        elif outcome == "updated":
+            updated["dashboard"].append(dashboard_id)
+    if first_error is not None:
+        raise first_error
+    return created, updated
@@ -0,0 +1,51 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+_logger = logging.getLogger(__name__)
+
+# keys a card spec can have; they are the arguments of 'create_card'
+CARD_SPEC_KEYS = {
+    "card_name",
+    "collection_name",
+    "collection_id",
+    "db_name",
+    "db_id",
+    "table_name",
+    "table_id",
+    "column_order",
+    "custom_json",
+}
+
+
+def load_card_specs(p: Path) -> list[dict[str, Any]]:
+    """
+    Reads a list of card specs from a yaml or json file.
+    Every spec is a dictionary with (some of) the arguments of 'create_card', eg
+        - card_name: Active Physicians
+          collection_name: CHUM
+          table_name: physicians
+          db_name: dev-chum
+          column_order: [name, speciality]
+    """
+    p = Path(p)
+    if not p.exists():
+        raise FileNotFoundError(p)
+    _logger.info(f"Reading card specs from '{str(p)}'...")
+    with open(p) as f:
+        if p.suffix in {".yml", ".yaml"}:
+            specs = yaml.safe_load(f)
+        elif p.suffix == ".json":
+            specs = json.load(f)
+        else:
+            raise ValueError(f"File must be a json or a yaml (got '{str(p)}')")
+    if not isinstance(specs, list) or not all(isinstance(s, dict) for s in specs):
+        raise ValueError(f"'{str(p)}' does not contain a list of card specs")
+    for idx, spec in enumerate(specs):
+        unknown = set(spec.keys()) - CARD_SPEC_KEYS
+        if len(unknown) > 0:
+            raise ValueError(f"Card spec #{idx} has unknown keys: {sorted(unknown)}")
+    return specs
@@ -1,10 +1,11 @@
 import logging
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Any, Optional
 
 from metabase_api.metabase_api import Metabase_API
 from metabase_api._helper_methods import ItemType
 from metabase_api.utility.db.columns import ColumnReferences
+from metabase_api.utility.mbql import field_ids_in, replace_field_ids
 
 _logger = logging.getLogger(__name__)
 
@@ -266,3 +267,103 @@ class TablesEquivalencies:
             column_id=column_id
         )
         return target_column
+
+
+class InstancesTablesEquivalencies:
+    """
+    Equivalencies between the tables (and their columns) of databases on 2 Metabase instances
+    (eg, 'staging' and 'production'): tables are matched by schema and name, columns by name.
+    All of it is fetched at once, with a few requests per instance.
+    """
+
+    def __init__(
+        self,
+        src_metabase_api: Metabase_API,
+        dst_metabase_api: Metabase_API,
+        databases: dict[int, int],
+    ):
+        """databases: id of the database on the source -> id of the same database on the destination."""
+        self.src_metabase_api = src_metabase_api
+        self.dst_metabase_api = dst_metabase_api
+        self.databases = dict(databases)
+        self.table_mapping: dict[int, int] = dict()
+        self.column_mapping: dict[int, int] = dict()
+        self._resolve()
+
+    def _resolve(self) -> None:
+        src_tables = self.src_metabase_api.get("/api/table/")
+        dst_tables = self.dst_metabase_api.get("/api/table/")
+        for src_db_id, dst_db_id in self.databases.items():
+            src_in_db = {
+                (t["schema"], t["name"]): t["id"]
+                for t in src_tables
+                if t["db_id"] == src_db_id
+            }
+            dst_in_db = {
+                (t["schema"], t["name"]): t["id"]
+                for t in dst_tables
+                if t["db_id"] == dst_db_id
+            }
+            common = sorted(src_in_db.keys() & dst_in_db.keys())
+            if len(common) < len(src_in_db):
+                _logger.warning(
+                    f"{len(src_in_db) - len(common)} table(s) of database {src_db_id} are not in database {dst_db_id} of the destination"
+                )
+            src_columns = self.src_metabase_api.get_columns_name_id_many(
+                [src_in_db[k] for k in common], tables=src_tables
+            )
+            dst_columns = self.dst_metabase_api.get_columns_name_id_many(
+                [dst_in_db[k] for k in common], tables=dst_tables
+            )
+            for k in common:
+                src_table_id, dst_table_id = src_in_db[k], dst_in_db[k]
+                self.table_mapping[src_table_id] = dst_table_id
+                for column_name, column_id in src_columns[src_table_id].items():
+                    if column_name in dst_columns[dst_table_id]:
+                        self.column_mapping[column_id] = dst_columns[dst_table_id][
+                            column_name
+                        ]
+        _logger.debug(
+            f"{len(self.table_mapping)} tables and {len(self.column_mapping)} columns are equivalent"
+        )
+
+    def remap(self, node: Any) -> Any:
+        """Copy of (a part of) a query or a setting, with the ids of the destination."""
+        return replace_field_ids(
+            node, column_mapping=self.column_mapping, table_mapping=self.table_mapping
+        )
+
+    def card_json_for_destination(self, card_json: dict[str, Any]) -> dict[str, Any]:
+        """
+        Copy of the json of a card, referring to the tables and columns of the destination.
+        ValueError if the card uses a database, table or column without equivalent.
+        """
+        new_json = dict(card_json)
+        dataset_query = card_json.get("dataset_query", {})
+        unknown_columns = field_ids_in(dataset_query) - self.column_mapping.keys()
+        if len(unknown_columns) > 0:
+            raise ValueError(
+                f"Card '{card_json.get('name')}' uses columns without equivalent on the destination: {sorted(unknown_columns)}"
+            )
+        db_id = card_json.get("database_id", dataset_query.get("database"))
+        if db_id not in self.databases:
+            raise ValueError(
+                f"Card '{card_json.get('name')}' uses database {db_id}, which has no equivalent on the destination"
+            )
+        new_json["dataset_query"] = self.remap(dataset_query)
+        if "database" in dataset_query:
+            new_json["dataset_query"]["database"] = self.databases[db_id]
+        new_json["database_id"] = self.databases[db_id]
+        if isinstance(card_json.get("table_id"), int):
+            if card_json["table_id"] not in self.table_mapping:
+                raise ValueError(
+                    f"Card '{card_json.get('name')}' uses table {card_json['table_id']}, which has no equivalent on the destination"
+                )
+            new_json["table_id"] = self.table_mapping[card_json["table_id"]]
+        if "visualization_settings" in card_json:
+            new_json["visualization_settings"] = self.remap(
+                card_json["visualization_settings"]
+            )
+        # metabase computes it again (and it is full of source ids)
+        new_json.pop("result_metadata", None)
+        return new_json
@@ -0,0 +1,67 @@
+"""
+Canonical fingerprints of (parts of) metabase objects: two jsons with the same content
+(regardless of the order of keys, empty values or legacy field references) have the same fingerprint.
+"""
+import hashlib
+import json
+from typing import Any, Iterable, Optional
+
+# what defines the content of a card
+CARD_CONTENT_KEYS = ("dataset_query", "display", "visualization_settings")
+
+
+def canonical(obj: Any) -> Any:
+    """
+    Canonical version of a json structure:
+    - keys with empty values (None, {} or []) are dropped, and
+    - legacy field references (["field-id", 12]) are turned into ["field", 12, None].
+    """
+    if isinstance(obj, dict):
+        d = {k: canonical(v) for k, v in obj.items()}
+        return {k: v for k, v in d.items() if v is not None and v != {} and v != []}
+    if isinstance(obj, list):
+        if len(obj) == 2 and obj[0] == "field-id" and isinstance(obj[1], int):
+            return ["field", obj[1], None]
+        return [canonical(x) for x in obj]
+    return obj
+
+
+def fingerprint(obj: Any) -> str:
+    """Hash of the canonical version of a json structure."""
+    c = canonical(obj)
+    # an empty structure is the same as nothing
+    if c == {} or c == []:
+        c = None
+    as_str = json.dumps(c, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(as_str.encode("utf-8")).hexdigest()
+
+
+def fingerprints_by_key(
+    obj: dict, keys: Optional[Iterable[str]] = None
+) -> dict[str, str]:
+    """Fingerprint of each of the (top-level) keys of a json; all keys if none is specified."""
+    keys = obj.keys() if keys is None else keys
+    return {k: fingerprint(obj.get(k)) for k in keys}
+
+
+def exact_fingerprints_by_key(obj: dict) -> dict[str, str]:
+    """
+    Fingerprint of each of the (top-level) keys of a json, as they are: unlike 'fingerprints_by_key',
+    nothing is canonicalized (any change, even a legacy reference being replaced, counts).
+    """
+    return {
+        k: hashlib.blake2b(
+            json.dumps(v, sort_keys=True, separators=(",", ":"), default=str).encode(
+                "utf-8"
+            ),
+            digest_size=16,
+        ).hexdigest()
+        for k, v in obj.items()
+    }
+
+
+def changed_keys(old: dict[str, str], new: dict[str, str]) -> list[str]:
+    """Keys whose fingerprint is different (or new, or gone) between 2 results of 'fingerprints_by_key'."""
+    return sorted(
+        k for k in set(old.keys()) | set(new.keys()) if old.get(k) != new.get(k)
+    )
@@ -0,0 +1,138 @@
+"""
+Append-only journal of the steps done by a long run (copy, migration...), so that a run
+that failed half-way can be resumed: the steps already in the journal are skipped.
+One line per step, in json: {"step": "card", "key": 12, "value": 345}, after a header line
+describing the run ({"header": {"operation": "copy", "source_collection_id": 5, ...}}):
+a journal can not be used to resume another run.
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+_logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Journal of steps; each step is identified by its kind and an (integer) key."""
+
+    def __init__(
+        self,
+        path: Path,
+        header: Optional[dict[str, Any]] = None,
+        read_only: bool = False,
+    ):
+        """
+        Keyword arguments:
+        path -- file of the journal (created if it does not exist)
+        header -- what the run is (operation, source, destination...). A new journal starts with it;
+                  an existing one must have the same values for all its keys (ValueError otherwise).
+        read_only -- the file is never created nor written; steps can't be recorded (default False)
+        """
+        self.path = Path(path)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[int, Any]] = defaultdict(dict)
+        self.header: Optional[dict[str, Any]] = None
+        if self.path.exists():
+            self._load()
+        if header is not None:
+            self._check_header(header)
+
+    def _check_header(self, header: dict[str, Any]) -> None:
+        if self.header is None:
+            if sum(len(e) for e in self._entries.values()) > 0:
+                # journals written before headers existed
+                _logger.warning(
+                    f"Journal '{str(self.path)}' does not say what run it belongs to; assuming {header}"
+                )
+                return
+            if not self.read_only:
+                with self._lock:
+                    self._append(json.dumps({"header": header}))
+                    self.header = dict(header)
+            return
+        mismatches = {
+            k: self.header.get(k) for k, v in header.items() if self.header.get(k) != v
+        }
+        if len(mismatches) > 0:
+            raise ValueError(
+                f"Journal '{str(self.path)}' belongs to another run ({mismatches}, expected {header})"
+            )
+
+    def _load(self) -> None:
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        for idx, line in enumerate(lines):
+            if len(line.strip()) == 0:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                if idx == len(lines) - 1:
+                    # the run stopped while writing this step: it is not done
+                    _logger.warning(
+                        f"Dropping incomplete last line of journal '{str(self.path)}'"
+                    )
+                    if not self.read_only:
+                        with open(self.path, "w") as f:
+                            f.write("".join(l + "\n" for l in lines[:idx]))
+                    continue
+                raise ValueError(
+                    f"Journal '{str(self.path)}' is corrupted (line {idx + 1})"
+                )
+            if "header" in entry:
+                self.header = entry["header"]
+                continue
+            self._entries[entry["step"]][int(entry["key"])] = entry.get("value")
+        _logger.info(
+            f"Resuming from journal '{str(self.path)}' ({sum(len(e) for e in self._entries.values())} steps done)"
+        )
+
+    def done(self, step: str) -> dict[int, Any]:
+        """Keys (and values) of the steps of this kind that are done."""
+        with self._lock:
+            return dict(self._entries[step])
+
+    def has(self, step: str, key: int) -> bool:
+        with self._lock:
+            return key in self._entries[step]
+
+    def get(self, step: str, key: int) -> Any:
+        with self._lock:
+            return self._entries[step][key]
+
+    def record(self, step: str, key: int, value: Any = None) -> None:
+        """Records (on disk, right away) that a step is done."""
+        if self.read_only:
+            raise RuntimeError(f"Journal '{str(self.path)}' is read-only")
+        line = json.dumps({"step": step, "key": key, "value": value})
+        with self._lock:
+            self._append(line)
+            self._entries[step][key] = value
+
+    def _append(self, line: str) -> None:
+        """Writes a line (and waits for it to be on disk); called with the lock held."""
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def copy_journal_header(
+    source_collection_id: int,
+    destination_parent_collection_id: Optional[int] = None,
+    destination_collection_name: Optional[str] = None,
+) -> dict[str, Any]:
+    """Header of the journal of a copy of a collection (what is not known is not checked)."""
+    header: dict[str, Any] = {
+        "operation": "copy",
+        "source_collection_id": source_collection_id,
+    }
+    if destination_collection_name is not None:
+        header["destination_parent_collection_id"] = destination_parent_collection_id
+        header["destination_collection_name"] = destination_collection_name
+    return header
@@ -0,0 +1,162 @@
+"""
+Structural handling of MBQL (Metabase's query language) trees.
+A query is walked only once; field references are recognized by their shape
+(eg, ["field", 12, {...}] or the legacy ["field-id", 12]), wherever they appear:
+filters, aggregations, breakouts, expressions, joins, nested 'source-query', template tags...
+"""
+import re
+from typing import Any, Optional
+
+FIELD_REF_HEADS = {"field", "field-id"}
+
+
+def is_field_ref(node: Any) -> bool:
+    """Is this node a reference to a column (by id)?"""
+    return (
+        isinstance(node, list)
+        and len(node) >= 2
+        and isinstance(node[0], str)
+        and node[0] in FIELD_REF_HEADS
+        and isinstance(node[1], int)
+        and not isinstance(node[1], bool)
+    )
+
+
+def field_ids_in(node: Any) -> set[int]:
+    """All column ids referenced in a (part of a) query."""
+    found: set[int] = set()
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, dict):
+            source_field = n.get("source-field")
+            if isinstance(source_field, int) and not isinstance(source_field, bool):
+                found.add(source_field)
+            stack.extend(n.values())
+        elif isinstance(n, list):
+            if is_field_ref(n):
+                found.add(n[1])
+            stack.extend(n)
+    return found
+
+
+def replace_field_ids(
+    node: Any,
+    column_mapping: dict[int, int],
+    table_mapping: Optional[dict[int, int]] = None,
+) -> Any:
+    """
+    Returns a copy of the (part of a) query, where
+    - the column ids are replaced following column_mapping (ids that are not mentioned are kept), and
+    - the 'source-table' ids are replaced following table_mapping (same).
+    Args:
+        node: (part of) a query, as parsed from json.
+        column_mapping: old column id -> new column id.
+        table_mapping: old table id -> new table id (optional).
+
+    Returns: the new (part of a) query. Input is not modified.
+    """
+    table_mapping = table_mapping if table_mapping is not None else {}
+
+    def _rewrite(n: Any) -> Any:
+        if isinstance(n, dict):
+            new_d = {}
+            for k, v in n.items():
+                if (
+                    (k == "source-table")
+                    and isinstance(v, int)
+                    and not isinstance(v, bool)
+                ):
+                    new_d[k] = table_mapping.get(v, v)
+                elif (
+                    (k == "source-field")
+                    and isinstance(v, int)
+                    and not isinstance(v, bool)
+                ):
+                    new_d[k] = column_mapping.get(v, v)
+                else:
+                    new_d[k] = _rewrite(v)
+            return new_d
+        if isinstance(n, list):
+            if is_field_ref(n):
+                return [n[0], column_mapping.get(n[1], n[1])] + [
+                    _rewrite(x) for x in n[2:]
+                ]
+            return [_rewrite(x) for x in n]
+        return n
+
+    return _rewrite(node)
+
+
+def _card_id_in_source_table(source_table: Any) -> Optional[int]:
+    """'card__12' -> 12; None if this is not a reference to a card."""
+    if isinstance(source_table, str) and source_table.startswith("card__"):
+        return int(source_table.split("__")[1])
+    return None
+
+
+def card_references(dataset_query: Any) -> set[int]:
+    """
+    Ids of the cards a query is based on: 'card__N' source tables (anywhere, including joins
+    and nested queries) and, for native queries, template tags of type 'card'.
+    """
+    found: set[int] = set()
+    stack = [dataset_query]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, dict):
+            card_id = _card_id_in_source_table(n.get("source-table"))
+            if card_id is not None:
+                found.add(card_id)
+            if n.get("type") == "card" and isinstance(n.get("card-id"), int):
+                found.add(n["card-id"])
+            stack.extend(n.values())
+        elif isinstance(n, list):
+            stack.extend(n)
+    return found
+
+
+def replace_card_references(dataset_query: dict, card_mapping: dict[int, int]) -> dict:
+    """
+    Returns a copy of the query where the references to cards are replaced following card_mapping
+    (ids that are not mentioned are kept). For native queries, the tags ('{{#12-a-card}}',
+    with or without blanks inside the braces) are renamed in the text of the query too.
+    """
+
+    def _rewrite(n: Any) -> Any:
+        if isinstance(n, dict):
+            new_d = {k: _rewrite(v) for k, v in n.items()}
+            card_id = _card_id_in_source_table(n.get("source-table"))
+            if card_id is not None:
+                new_d["source-table"] = f"card__{card_mapping.get(card_id, card_id)}"
+            return new_d
+        if isinstance(n, list):
+            return [_rewrite(x) for x in n]
+        return n
+
+    new_query: dict = _rewrite(dataset_query)
+    native = new_query.get("native")
+    if isinstance(native, dict) and isinstance(native.get("template-tags"), dict):
+        new_tags = {}
+        for tag_name, tag in native["template-tags"].items():
+            old_id = tag.get("card-id") if tag.get("type") == "card" else None
+            if old_id in card_mapping:
+                new_id = card_mapping[old_id]
+                new_tag_name = tag_name.replace(f"#{old_id}", f"#{new_id}", 1)
+                tag["card-id"] = new_id
+                tag["name"] = new_tag_name
+                if "display-name" in tag:
+                    tag["display-name"] = tag["display-name"].replace(
+                        f"#{old_id}", f"#{new_id}", 1
+                    )
+                # (Metabase accepts blanks around the name of a tag: '{{ #12-a-card }}')
+                native["query"] = re.sub(
+                    r"(\{\{\s*)" + re.escape(tag_name) + r"(\s*\}\})",
+                    lambda m: m.group(1) + new_tag_name + m.group(2),
+                    native.get("query", ""),
+                )
+                new_tags[new_tag_name] = tag
+            else:
+                new_tags[tag_name] = tag
+        native["template-tags"] = new_tags
+    return new_query
@@ -0,0 +1,39 @@
+"""
+Store of the full json of objects (cards, dashboards...) already fetched from Metabase,
+shared by the threads of a run: an object in the store is not fetched again.
+"""
+import threading
+from collections import defaultdict
+from typing import Any, Iterable, Optional
+
+
+class ObjectStore:
+    """Full json of objects, by model and id. Thread-safe."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._objects: dict[str, dict[int, dict[str, Any]]] = defaultdict(dict)
+
+    def get(self, model: str, obj_id: int) -> Optional[dict[str, Any]]:
+        with self._lock:
+            return self._objects[model].get(obj_id)
+
+    def put(self, model: str, obj_json: dict[str, Any]) -> None:
+        with self._lock:
+            self._objects[model][obj_json["id"]] = obj_json
+
+    def put_many(self, model: str, objs: Iterable[dict[str, Any]]) -> None:
+        with self._lock:
+            self._objects[model].update({o["id"]: o for o in objs})
+
+    def discard(self, model: str, obj_id: int) -> None:
+        with self._lock:
+            self._objects[model].pop(obj_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._objects.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(objs) for objs in self._objects.values())
@@ -0,0 +1,171 @@
+"""
+Progress of long runs (copies, migrations...): every item started, done or failed is reported
+as a 'ProgressEvent' to sinks - any callable taking an event: a callback, 'log_sink', 'TerminalProgressBar'.
+"""
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, TextIO, Union
+
+_logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """State of a run, right after something happened to one of its items."""
+
+    operation: str  # 'copy', 'migrate'...
+    kind: str  # 'done', 'skipped', 'failed' or 'finished'
+    model: Optional[str]
+    item_id: Optional[int]
+    done: int  # skipped items included
+    failed: int
+    total: int
+    in_flight: int  # items being handled right now (each one waiting on a request)
+    elapsed: float  # seconds
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.total - self.done - self.failed)
+
+    @property
+    def items_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Seconds to go, at the current pace (None if there is no pace yet)."""
+        rate = self.items_per_second
+        return self.remaining / rate if rate > 0 else None
+
+
+ProgressSink = Callable[[ProgressEvent], None]
+
+
+class ProgressTracker:
+    """Counts the items of a run and sends an event to the sinks after each of them. Thread-safe."""
+
+    def __init__(
+        self,
+        operation: str,
+        sinks: Union[None, ProgressSink, Iterable[ProgressSink]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.operation = operation
+        if sinks is None:
+            self.sinks: list[ProgressSink] = []
+        elif callable(sinks):
+            self.sinks = [sinks]
+        else:
+            self.sinks = list(sinks)
+        self._clock = clock
+        self._start = clock()
+        self._lock = threading.Lock()
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    def add_total(self, n: int) -> None:
+        with self._lock:
+            self.total += n
+
+    def _emit(self, kind: str, model: Optional[str], item_id: Optional[int]) -> None:
+        """Sends an event to all sinks (called with the lock held, so events arrive in order)."""
+        if len(self.sinks) == 0:
+            return
+        event = ProgressEvent(
+            operation=self.operation,
+            kind=kind,
+            model=model,
+            item_id=item_id,
+            done=self.done,
+            failed=self.failed,
+            total=self.total,
+            in_flight=self.in_flight,
+            elapsed=self._clock() - self._start,
+        )
+        for sink in self.sinks:
+            try:
+                sink(event)
+            except Exception as e:  # a broken sink must not stop the run
+                _logger.warning(f"Progress sink {sink!r} failed: {e}")
+
+    @contextmanager
+    def item(self, model: str, item_id: int) -> Iterator[None]:
+        """Wraps the handling of an item: it is done when the block ends, failed if it raises."""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+                self.failed += 1
+                self._emit("failed", model, item_id)
+            raise
+        with self._lock:
+            self.in_flight -= 1
+            self.done += 1
+            self._emit("done", model, item_id)
+
+    def skipped(self, model: str, item_id: int) -> None:
+        """An item that needed nothing (eg, already done by a previous run)."""
+        with self._lock:
+            self.done += 1
+            self._emit("skipped", model, item_id)
+
+    def finish(self) -> None:
+        with self._lock:
+            self._emit("finished", None, None)
+
+
+def log_sink(
+    logger: Optional[logging.Logger] = None,
+    level: int = logging.INFO,
+    every_seconds: float = 5.0,
+) -> ProgressSink:
+    """A sink logging the progress at most every 'every_seconds' (failures and the end, always)."""
+    log = logger if logger is not None else _logger
+    last_logged = float("-inf")
+
+    def _sink(event: ProgressEvent) -> None:
+        nonlocal last_logged
+        if event.kind == "failed":
+            log.warning(f"{event.operation}: {event.model} {event.item_id} failed")
+        elif event.kind != "finished" and event.elapsed - last_logged < every_seconds:
+            return
+        last_logged = event.elapsed
+        log.log(level, describe(event))
+
+    return _sink
+
+
+def describe(event: ProgressEvent) -> str:
+    eta = event.eta_seconds
+    return (
+        f"{event.operation}: {event.done}/{event.total} done"
+        + (f", {event.failed} failed" if event.failed > 0 else "")
+        + f", {event.in_flight} in flight, {event.items_per_second:.1f} items/s"
+        + (f", ETA {eta:.0f}s" if eta is not None and event.remaining > 0 else "")
+    )
+
+
+class TerminalProgressBar:
+    """A sink drawing a progress bar on one line of a terminal."""
+
+    def __init__(self, stream: TextIO = sys.stderr, width: int = 30):
+        self.stream = stream
+        self.width = width
+
+    def __call__(self, event: ProgressEvent) -> None:
+        ratio = (event.done + event.failed) / event.total if event.total > 0 else 1.0
+        filled = int(round(self.width * min(1.0, ratio)))
+        bar = "#" * filled + "." * (self.width - filled)
+        self.stream.write(f"\r[{bar}] {describe(event)}")
+        if event.kind == "finished":
+            self.stream.write("\n")
+        self.stream.flush()
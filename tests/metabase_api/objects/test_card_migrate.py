@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from metabase_api.objects import card as card_module
+from metabase_api.objects.card import Card
+from metabase_api.objects.defs import DispatchVisitor, ReturnValue, TraverseStackElement
+from metabase_api.utility.object_store import ObjectStore
+
+
+class _FlakyApi:
+    """The first PUT fails with an exception."""
+
+    def __init__(self) -> None:
+        self.object_store = ObjectStore()
+        self.puts = 0
+
+    def put(self, endpoint: str, *args, json: Any = None) -> int:
+        self.puts += 1
+        if self.puts == 1:
+            raise ConnectionError("server went away")
+        return 200
+
+
+def _renamed(a_json: Any, a_stack: Any) -> tuple[bool, ReturnValue]:
+    a_json["name"] = a_json["name"].upper()
+    return True, ReturnValue.empty()
+
+
+def test_card_is_migrated_again_after_a_failed_push(monkeypatch) -> None:  # type: ignore
+    monkeypatch.setattr(card_module, "MIGRATED_CARDS", [])
+    monkeypatch.setattr(
+        Card,
+        "migration_visitors",
+        lambda self, params: [
+            DispatchVisitor("renamer", {TraverseStackElement.CARD: _renamed})
+        ],
+    )
+    api = _FlakyApi()
+    params = SimpleNamespace(metabase_api=api)
+    with pytest.raises(ConnectionError):
+        Card({"id": 12, "name": "q"}).migrate(params=params, push=True)  # type: ignore
+    assert card_module.MIGRATED_CARDS == []
+    # the second attempt really migrates (and pushes) the card
+    assert Card({"id": 12, "name": "q"}).migrate(params=params, push=True)  # type: ignore
+    assert api.puts == 2 and card_module.MIGRATED_CARDS == [12]
+
+
+class _Api:
+    def __init__(self) -> None:
+        self.object_store = ObjectStore()
+        self.sent: list[Any] = []
+
+    def put(self, endpoint: str, *args, json: Any = None) -> int:
+        self.sent.append(json)
+        return 200
+
+
+def test_migrated_card_is_still_translated(monkeypatch) -> None:  # type: ignore
+    monkeypatch.setattr(card_module, "MIGRATED_CARDS", [12])
+    monkeypatch.setattr(
+        Card,
+        "migration_visitors",
+        lambda self, params: [
+            DispatchVisitor("renamer", {TraverseStackElement.CARD: _renamed})
+        ],
+    )
+    api = _Api()
+    params = SimpleNamespace(metabase_api=api)
+    card = Card({"id": 12, "name": "q", "description": "d"}).track_changes()
+    # (not migrated again: the name is not upper-cased)
+    assert card.migrate(params=params, push=True)  # type: ignore
+    assert api.sent == []
+    assert card.migrate(params=params, push=True, translation_dict={"q": "c"})  # type: ignore
+    assert api.sent == [{"name": "c"}]
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from typing import Any, Optional
+
+import pytest
+
+from metabase_api.collection_tree import CollectionTree
+from metabase_api.objects.card import Card
+from metabase_api.objects.collection import Collection
+from metabase_api.objects.dashboard import Dashboard
+from metabase_api.objects.defs import (
+    DispatchVisitor,
+    ReturnValue,
+    TraverseStackElement,
+    fused,
+)
+from metabase_api.utility.object_store import ObjectStore
+
+COLLECTIONS_TREE = [
+    {
+        "id": 1,
+        "name": "top",
+        "children": [{"id": 2, "name": "sub", "children": []}],
+    }
+]
+CARDS = [
+    {"id": 10 + i, "name": f"q{i}", "collection_id": 1 + i % 2, "dataset_query": {}}
+    for i in range(8)
+]
+DASHBOARDS = [{"id": 20, "name": "dash", "collection_id": 2, "dashcards": []}]
+
+
+class _Api:
+    """Answers (slowly, in random order) with the cards and dashboards above."""
+
+    def __init__(self, failing_put: int = -1) -> None:
+        self.object_store = ObjectStore()
+        self.object_store.put_many("card", CARDS)
+        self.failing_put = failing_put
+        self.pushed: list[str] = []
+        self.sent: list[Any] = []
+        self._lock = threading.Lock()
+
+    def get_card_json(self, card_id: int) -> Any:
+        return self.object_store.get("card", card_id)
+
+    def get(self, endpoint: str, *args, **kwargs) -> Any:
+        time.sleep(random.uniform(0, 0.01))
+        return dict(DASHBOARDS[0])
+
+    def put(self, endpoint: str, *args, json: Any = None) -> int:
+        time.sleep(random.uniform(0, 0.01))
+        with self._lock:
+            self.pushed.append(endpoint)
+            self.sent.append(json)
+        return 500 if endpoint.endswith(f"/{self.failing_put}") else 200
+
+
+def _collection(api: _Api, pulses: Optional[list] = None) -> Collection:
+    tree = CollectionTree.from_listings(
+        1,
+        collections_tree=COLLECTIONS_TREE,
+        cards=CARDS,
+        dashboards=DASHBOARDS,
+        pulses=pulses if pulses is not None else [],
+    )
+    return Collection(tree.root.as_json, metabase_api=api, tree=tree)  # type: ignore
+
+
+def _names(a_json: Any, a_stack: Any) -> tuple[bool, ReturnValue]:
+    place = a_stack.top.name
+    return False, ReturnValue([f"{place} {a_json['name']}"])
+
+
+NAMES = DispatchVisitor(
+    "names",
+    {
+        TraverseStackElement.COLLECTION: _names,
+        TraverseStackElement.CARD: _names,
+        TraverseStackElement.DASHBOARD: _names,
+    },
+)
+
+
+def _renamed(a_json: Any, a_stack: Any) -> tuple[bool, ReturnValue]:
+    a_json["name"] = a_json["name"].upper()
+    return True, ReturnValue.empty()
+
+
+RENAMER = DispatchVisitor(
+    "renamer",
+    {TraverseStackElement.CARD: _renamed, TraverseStackElement.DASHBOARD: _renamed},
+)
+
+
+def test_concurrent_traversal_gives_the_sequential_result() -> None:
+    sequential_api, concurrent_api = _Api(), _Api()
+    visitors = [NAMES, RENAMER]
+    expected = _collection(sequential_api).visit(visitors).v
+    assert expected[:2] == ["COLLECTION top", "CARD q0"]
+    assert (
+        _collection(concurrent_api).traverse(fused(visitors), max_workers=4).v
+        == expected
+    )
+    assert sorted(concurrent_api.pushed) == sorted(sequential_api.pushed)
+    assert len(concurrent_api.pushed) == len(CARDS) + len(DASHBOARDS)
+
+
+def test_read_only_traversal_pushes_nothing() -> None:
+    api = _Api()
+    _collection(api).traverse(NAMES, max_workers=4)
+    assert api.pushed == []
+
+
+def test_only_what_changed_is_pushed() -> None:
+    api = _Api()
+    card = Card.from_id(10, metabase_api=api)  # type: ignore
+    assert card.changed_keys == []
+    card.as_json["visualization_settings"] = {"card.title": "Q"}
+    assert card.changed_keys == ["visualization_settings"]
+    assert card.push(api)  # type: ignore
+    assert api.sent == [{"visualization_settings": {"card.title": "Q"}}]
+    # the card is as the server has it
+    assert card.changed_keys == [] and card.push(api)  # type: ignore
+    assert len(api.sent) == 1
+
+
+def test_dashcards_and_tabs_are_pushed_together() -> None:
+    api = _Api()
+    dash_json = {"id": 20, "name": "dash", "tabs": [{"id": 1}], "dashcards": []}
+    dashboard = Dashboard(dict(dash_json)).track_changes()
+    dashboard.as_json["dashcards"] = [{"id": -1, "card_id": 10}]
+    assert dashboard.changed_keys == ["dashcards"]
+    assert dashboard.push(api)  # type: ignore
+    assert api.sent == [{"dashcards": [{"id": -1, "card_id": 10}], "tabs": [{"id": 1}]}]
+
+
+def test_untracked_objects_push_their_whole_json() -> None:
+    api = _Api()
+    card = Card(dict(CARDS[0]))
+    assert card.changed_keys == sorted(CARDS[0].keys())
+    assert card.push(api)  # type: ignore
+    assert api.sent == [CARDS[0]]
+
+
+@pytest.mark.parametrize(
+    "failing_put, message", [(13, "card '13'"), (20, "dashboard '20'")]
+)
+def test_concurrent_traversal_reports_failed_pushes(
+    failing_put: int, message: str
+) -> None:
+    with pytest.raises(RuntimeError, match=message):
+        _collection(_Api(failing_put=failing_put)).traverse(RENAMER, max_workers=4)
+
+
+def test_translation_visits_collections_and_pulses() -> None:
+    places = DispatchVisitor(
+        "places",
+        {
+            place: lambda a_json, a_stack: (False, ReturnValue([a_stack.top.name]))
+            for place in [TraverseStackElement.COLLECTION, TraverseStackElement.PULSE]
+        },
+    )
+    visited: list[str] = []
+
+    def _record(a_json: Any, a_stack: Any) -> ReturnValue:
+        r = places(a_json, a_stack)
+        visited.extend(r.v)
+        return r
+
+    class _Translated(Collection):
+        def translation_visitors(self, translation_dict: dict[str, str]) -> list:
+            return [_record]
+
+    pulses = [{"id": 30, "name": "daily", "collection_id": 2}]
+    collection = _collection(_Api(), pulses=pulses)
+    expected = collection.traverse(places).v
+    assert expected == ["COLLECTION", "COLLECTION", "PULSE"]
+    api = _Api()
+    tree = _collection(api, pulses=pulses).tree
+    _Translated(tree.root.as_json, metabase_api=api, tree=tree).translate({})  # type: ignore
+    assert visited == expected
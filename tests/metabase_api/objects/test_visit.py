@@ -0,0 +1,211 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+
+from metabase_api.objects.card import Card
+from metabase_api.objects.defs import (
+    DispatchVisitor,
+    ReturnValue,
+    TraverseStack,
+    TraverseStackElement,
+    fused,
+    reusing_last,
+)
+from metabase_api.objects.visitors.defs import label_fetcher, label_replacer
+
+CARD = {
+    "id": 12,
+    "name": "Revenue",
+    "dataset_query": {"query": {"source-table": 3, "source-query": {}}},
+    "visualization_settings": {
+        "graph.x_axis.title_text": "Month",
+        "column_settings": {'["name","total"]': {"column_title": "Total"}},
+    },
+}
+
+
+def _recorder(name: str, visits: list[tuple[str, str]]) -> Any:
+    def _visit(a_json: Any, a_stack: TraverseStack) -> ReturnValue:
+        visits.append((name, a_stack.top.name))
+        return ReturnValue(None)
+
+    return _visit
+
+
+def test_visitors_are_applied_in_one_pass() -> None:
+    visits: list[tuple[str, str]] = []
+    Card(CARD).visit([_recorder("a", visits), _recorder("b", visits)])
+    places = [place for name, place in visits if name == "a"]
+    assert places == [
+        "CARD",
+        "QUERY_PART",
+        "QUERY_PART",
+        "VISUALIZATION_SETTINGS",
+        "COLUMN_SETTINGS",
+    ]
+    # on each place, all visitors (in order) before going further
+    assert visits == [(name, place) for place in places for name in ("a", "b")]
+
+
+def test_fused_visitors_union_their_results() -> None:
+    f = fused([label_fetcher, lambda a_json, a_stack: ReturnValue(None)])
+    labels = Card(CARD).traverse(f).v
+    assert {"Revenue", "Month", "Total"} <= labels
+
+
+def test_translation_and_labels_in_one_pass() -> None:
+    card = Card(
+        {
+            "id": 1,
+            "name": "Revenue",
+            "visualization_settings": {"graph.x_axis.title_text": "Month"},
+        }
+    )
+    visitors = [label_fetcher] + card.translation_visitors(
+        {"Revenue": "Ingresos", "Month": "Mes"}
+    )
+    labels = card.visit(visitors).v
+    assert {"Revenue", "Month"} <= labels
+    assert card.as_json["name"] == "Ingresos"
+    assert card.as_json["visualization_settings"]["graph.x_axis.title_text"] == "Mes"
+
+
+def test_visitor_is_built_once_per_parameters() -> None:
+    built: list[Any] = []
+
+    def _factory(parameters: Any) -> Any:
+        built.append(parameters)
+        return lambda a_json, a_stack: ReturnValue(parameters)
+
+    visitor_for = reusing_last(_factory)
+    repl_1, repl_2 = {"a": "b"}, {"a": "b"}
+    assert visitor_for(repl_1) is visitor_for(repl_1)
+    assert visitor_for(repl_2) is not visitor_for(repl_1)
+    assert built == [repl_1, repl_2, repl_1]
+
+
+def test_label_replacer_on_every_place() -> None:
+    card = Card(
+        {
+            "id": 1,
+            "name": "Revenue",
+            "visualization_settings": {"graph.x_axis.title_text": "Month"},
+        }
+    )
+    repl = {"Revenue": "Ingresos", "Month": "Mes"}
+    card.traverse(lambda a_json, a_stack: label_replacer(a_json, a_stack, repl))
+    assert card.as_json["name"] == "Ingresos"
+    assert card.as_json["visualization_settings"]["graph.x_axis.title_text"] == "Mes"
+
+
+def test_dispatch_calls_only_interested_handlers() -> None:
+    visits: list[str] = []
+
+    def _handler(what: str) -> Any:
+        def _h(a_json: Any, a_stack: TraverseStack) -> tuple[bool, ReturnValue]:
+            visits.append(what)
+            return False, ReturnValue(None)
+
+        return _h
+
+    first = DispatchVisitor("first", {TraverseStackElement.CARD: _handler("first")})
+    second = DispatchVisitor("second").on(
+        TraverseStackElement.QUERY_PART,
+        _handler("second"),
+        predicate=lambda query_part: "source-table" in query_part,
+    )
+    f = fused([first, second])
+    assert f.places == {TraverseStackElement.CARD, TraverseStackElement.QUERY_PART}
+    Card(CARD).traverse(f)
+    # the nested query has no source table
+    assert visits == ["first", "second"]
+
+
+def test_uninteresting_parts_are_not_traversed() -> None:
+    card_only = DispatchVisitor(
+        "names",
+        {TraverseStackElement.CARD: lambda j, s: (False, ReturnValue({j["name"]}))},
+    )
+    # visualization settings that would break any visitor going through them
+    broken = dict(CARD, visualization_settings={"column_settings": None})
+    assert Card(broken).visit([card_only]).v == {"Revenue"}
+
+
+def test_enclosing_titles_follow_the_stack() -> None:
+    stack = TraverseStack()
+    assert stack.enclosing_title(TraverseStackElement.CARD) is None
+    with stack.add(TraverseStackElement.CARD.titled("outer")):
+        with stack.add(TraverseStackElement.VISUALIZATION_SETTINGS):
+            with stack.add(TraverseStackElement.CARD.titled("inner")):
+                assert stack.enclosing_title(TraverseStackElement.CARD) == "inner"
+            # the title of the outer card is the one it had when it was added
+            assert stack.enclosing_title(TraverseStackElement.CARD) == "outer"
+            assert stack.inside(TraverseStackElement.VISUALIZATION_SETTINGS)
+        assert not stack.inside(TraverseStackElement.VISUALIZATION_SETTINGS)
+    assert stack.empty and not stack.inside(TraverseStackElement.CARD)
+
+
+def test_deprecated_element_titles() -> None:
+    seen: list[str] = []
+
+    def _title(a_json: Any, a_stack: TraverseStack) -> tuple[bool, ReturnValue]:
+        seen.append(a_stack.top.title)
+        return False, ReturnValue(None)
+
+    stack = TraverseStack()
+    with pytest.deprecated_call():
+        with stack.add(TraverseStackElement.CARD.set_title("a card")):
+            assert stack.enclosing_title(TraverseStackElement.CARD) == "a card"
+    with pytest.deprecated_call():
+        Card(CARD).traverse(
+            DispatchVisitor("titles", {TraverseStackElement.CARD: _title})
+        )
+    assert seen == ["Revenue"]
+
+
+def test_concurrent_traversals_keep_their_own_titles() -> None:
+    both_inside = threading.Barrier(2, timeout=5)
+
+    def _card_title(a_json: Any, a_stack: TraverseStack) -> tuple[bool, ReturnValue]:
+        # both traversals have added their card when they get here
+        both_inside.wait()
+        return False, ReturnValue({a_stack.enclosing_title(TraverseStackElement.CARD)})
+
+    visitor = DispatchVisitor("titles", {TraverseStackElement.CARD: _card_title})
+    cards = [Card(dict(CARD, name=name)) for name in ["first", "second"]]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        titles = list(executor.map(lambda c: c.visit([visitor]).v, cards))
+    assert titles == [{"first"}, {"second"}]
+
+
+def test_return_values_are_collected_in_place() -> None:
+    labels = {"a"}
+    r = ReturnValue.empty()
+    r.add(ReturnValue(labels)).add({"b"}).add(None)
+    collected = r.v
+    r.add({"c"})
+    assert r.v is collected and collected == {"a", "b", "c"}
+    # what was added is not modified
+    assert labels == {"a"}
+    assert ReturnValue([1]).add([2]).v == [1, 2]
+    assert ReturnValue(Counter(a=1)).add(Counter(a=2, b=1)).v == Counter(a=3, b=1)
+    # 'union' makes a new value
+    u = r.union({"d"})
+    assert u.v == {"a", "b", "c", "d"} and r.v == {"a", "b", "c"}
+    with pytest.raises(TypeError):
+        r.add(["e"])
+
+
+def test_handlers_return_their_own_values() -> None:
+    card = Card({"id": 1, "name": "Revenue"})
+    [replacer] = card.translation_visitors({"Revenue": "Ingresos"})
+    [registration] = replacer._table[TraverseStackElement.CARD]  # type: ignore
+    stack = TraverseStack([TraverseStackElement.CARD])
+    _, first = registration.handler(card.as_json, stack)
+    # (adding to a value returned must not change the values returned later)
+    first.add(ReturnValue({"changed"}))
+    _, second = registration.handler(card.as_json, stack)
+    assert second.v is None
@@ -0,0 +1,176 @@
+import json
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from metabase_api import Metabase_API
+from metabase_api.bundle_methods import iter_bundle_objects, read_bundle_manifest
+
+
+class _Instance:
+    """Answers the (read-only) requests of an export."""
+
+    domain = "http://staging"
+    export_collection = Metabase_API.export_collection
+    verbose_print = staticmethod(Metabase_API.verbose_print)
+
+    OBJECTS = {
+        "/api/collection/tree": [
+            {
+                "id": 1,
+                "name": "top",
+                "children": [{"id": 2, "name": "sub", "children": []}],
+            }
+        ],
+        "/api/card/": [
+            {
+                "id": 11,
+                "name": "on base",
+                "collection_id": 2,
+                "dataset_query": {"query": {"source-table": "card__10"}},
+            },
+            {"id": 10, "name": "base", "collection_id": 1, "dataset_query": {}},
+        ],
+        "/api/dashboard/": [{"id": 20, "name": "dash", "collection_id": 2}],
+        "/api/pulse/": [],
+        "/api/dashboard/20": {
+            "id": 20,
+            "name": "dash",
+            "tabs": [{"id": 5, "name": "a tab"}],
+            "dashcards": [{"id": 1, "card_id": 11, "dashboard_tab_id": 5}],
+        },
+    }
+
+    def get(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        return self.OBJECTS[endpoint]
+
+
+def test_export_collection(tmp_path: Path) -> None:
+    p = tmp_path / "bundle.zip"
+    counts = _Instance().export_collection(1, p)
+    assert counts == {"collection": 2, "card": 2, "dashboard": 1}
+    assert read_bundle_manifest(p)["collection_id"] == 1
+    entries = list(iter_bundle_objects(p))
+    # in the order they can be created
+    assert [(e["model"], e["id"]) for e in entries] == [
+        ("collection", 1),
+        ("collection", 2),
+        ("card", 10),
+        ("card", 11),
+        ("dashboard", 20),
+    ]
+    assert entries[1]["collection_id"] == 1
+    assert entries[-1]["json"]["tabs"] == [{"id": 5, "name": "a tab"}]
+
+
+def test_corrupted_bundle(tmp_path: Path) -> None:
+    p = tmp_path / "bundle.zip"
+    _Instance().export_collection(1, p)
+    with zipfile.ZipFile(p) as zf:
+        contents = {n: zf.read(n) for n in zf.namelist()}
+    lines = contents["objects.jsonl"].decode().splitlines()
+    entry = json.loads(lines[2])
+    entry["json"]["name"] = "changed"
+    lines[2] = json.dumps(entry)
+    contents["objects.jsonl"] = ("\n".join(lines) + "\n").encode()
+    with zipfile.ZipFile(p, "w") as zf:
+        for n, c in contents.items():
+            zf.writestr(n, c)
+    with pytest.raises(ValueError):
+        list(iter_bundle_objects(p))
+
+
+class _Response:
+    ok = True
+    status_code = 200
+
+    def __init__(self, as_json: dict):
+        self._json = as_json
+
+    def json(self) -> dict:
+        return self._json
+
+
+class _Destination:
+    """Creates objects with new ids (the card named 'fail_on' can not be copied)."""
+
+    import_bundle = Metabase_API.import_bundle
+    copy_dashboard_from_json = Metabase_API.copy_dashboard_from_json
+    verbose_print = staticmethod(Metabase_API.verbose_print)
+
+    def __init__(self, fail_on: Any = None) -> None:
+        self.fail_on = fail_on
+        self.created: list[tuple[str, Any]] = []
+        self.put_json: dict = dict()
+        self._next_id = 100
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def create_collection(self, name: str, **kwargs: Any) -> dict:
+        self.created.append(("collection", name))
+        return {"id": self._new_id()}
+
+    def copy_card(self, source_card_json: dict, **kwargs: Any) -> int:
+        if source_card_json["name"] == self.fail_on:
+            raise ValueError(f"no card '{self.fail_on}'")
+        self.created.append(("card", source_card_json))
+        return self._new_id()
+
+    def post(self, endpoint: str, *args: Any, json: Any = None) -> Any:
+        self.created.append(("POST", endpoint))
+        return {"id": self._new_id()}
+
+    def put(self, endpoint: str, *args: Any, json: Any = None) -> Any:
+        self.put_json = json
+        return _Response({"tabs": [{"id": 500, "position": 0}]})
+
+
+def test_import_bundle_remaps_references(tmp_path: Path) -> None:
+    p = tmp_path / "bundle.zip"
+    _Instance().export_collection(1, p)
+    dst = _Destination()
+    transf = dst.import_bundle(p, parent_collection_id=7, collection_name="copy")
+    assert transf["collections"] == {1: 101, 2: 102}
+    assert transf["cards"] == {10: 103, 11: 104}
+    assert transf["dashboards"] == {20: 105}
+    assert transf["tabs"] == {5: 500}
+    # the card built on another one uses its copy
+    cards = {c["name"]: c for (kind, c) in dst.created if kind == "card"}
+    assert cards["on base"]["dataset_query"] == {"query": {"source-table": "card__103"}}
+    # the dashboard shows the copied card, in its tab
+    [dashcard] = dst.put_json["dashcards"]
+    assert dashcard["card_id"] == 104
+    assert dashcard["dashboard_tab_id"] == dst.put_json["tabs"][0]["id"]
+
+
+def test_import_bundle_resumes_from_journal(tmp_path: Path) -> None:
+    p = tmp_path / "bundle.zip"
+    journal_path = tmp_path / "journal.jsonl"
+    _Instance().export_collection(1, p)
+    dst = _Destination(fail_on="on base")
+    with pytest.raises(ValueError):
+        dst.import_bundle(p, journal_path=journal_path)
+    assert [kind for (kind, _) in dst.created] == ["collection", "collection", "card"]
+    dst.fail_on = None
+    dst.created = []
+    transf = dst.import_bundle(p, journal_path=journal_path)
+    # only the objects not created by the first run are created
+    assert [kind for (kind, _) in dst.created] == ["card", "POST"]
+    assert transf["collections"] == {1: 101, 2: 102}
+    assert transf["cards"] == {10: 103, 11: 104}
+    assert transf["tabs"] == {5: 500}
+
+
+def test_import_bundle_refuses_journal_of_another_import(tmp_path: Path) -> None:
+    p = tmp_path / "bundle.zip"
+    journal_path = tmp_path / "journal.jsonl"
+    _Instance().export_collection(1, p)
+    _Destination().import_bundle(p, parent_collection_id=7, journal_path=journal_path)
+    with pytest.raises(ValueError):
+        _Destination().import_bundle(
+            p, parent_collection_id=8, journal_path=journal_path
+        )
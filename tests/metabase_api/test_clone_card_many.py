@@ -0,0 +1,55 @@
+from typing import Any
+
+import requests
+
+from metabase_api.metabase_api import Metabase_API
+
+CARD = {
+    "id": 5,
+    "name": "orders",
+    "collection_id": 3,
+    "display": "table",
+    "visualization_settings": {},
+    "dataset_query": {
+        "type": "query",
+        "database": 1,
+        "query": {"source-table": 1, "fields": [["field", 100, None]]},
+    },
+}
+COLUMNS = {1: {"total": 100}, 2: {"total": 200}, 3: {"other": 300}, 4: {"total": 400}}
+
+
+class _Api:
+    """Tables 1 (the source) to 4; creating a card on table 4 fails with an HTTP error."""
+
+    def __init__(self) -> None:
+        self.created: list[dict] = []
+
+    def get_item_info_from_id(self, item_type: Any, item_id: int) -> dict:
+        return CARD
+
+    def get(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        return [{"id": t_id, "name": f"table{t_id}"} for t_id in COLUMNS]
+
+    def get_columns_name_id_many(self, table_ids: list, tables: Any) -> dict:
+        return {t_id: COLUMNS[t_id] for t_id in table_ids}
+
+    def create_card(self, custom_json: dict, return_card: bool = False) -> Any:
+        if custom_json["dataset_query"]["query"]["source-table"] == 4:
+            raise requests.HTTPError("502 Server Error")
+        self.created.append(custom_json)
+        return {"id": 800 + len(self.created)}
+
+
+def test_clone_card_many_reports_every_card() -> None:
+    api = _Api()
+    report = Metabase_API.clone_card_many(
+        api, 5, target_table_ids=[2, 3, 4, 9], source_table_id=1, max_workers=2  # type: ignore
+    )
+    assert report["cards"] == {2: 801}
+    assert api.created[0]["dataset_query"]["query"] == {
+        "source-table": 2,
+        "fields": [["field", 200, None]],
+    }
+    assert sorted(report["failed"].keys()) == [3, 4, 9]
+    assert report["failed"][4] == "502 Server Error"
@@ -0,0 +1,60 @@
+from metabase_api.collection_tree import CollectionTree
+
+COLLECTIONS_TREE = [
+    {
+        "id": 1,
+        "name": "top",
+        "children": [
+            {
+                "id": 2,
+                "name": "a",
+                "children": [{"id": 4, "name": "a.a", "children": []}],
+            },
+            {"id": 3, "name": "b", "archived": True, "children": []},
+        ],
+    },
+    {"id": 9, "name": "elsewhere", "children": []},
+]
+CARDS = [
+    {"id": 10, "name": "q1", "collection_id": 1, "dataset_query": {}},
+    {"id": 11, "name": "q2", "collection_id": 4, "dataset_query": {}},
+    {"id": 12, "name": "a model", "collection_id": 2, "dataset": True},
+    {"id": 13, "name": "not here", "collection_id": 9},
+    {"id": 14, "name": "archived", "collection_id": 1, "archived": True},
+]
+DASHBOARDS = [{"id": 20, "name": "dash", "collection_id": 2}]
+PULSES = [{"id": 30, "name": "pulse", "collection_id": 4}]
+
+
+def _tree() -> CollectionTree:
+    return CollectionTree.from_listings(
+        1,
+        collections_tree=COLLECTIONS_TREE,
+        cards=CARDS,
+        dashboards=DASHBOARDS,
+        pulses=PULSES,
+    )
+
+
+def test_tree_structure() -> None:
+    tree = _tree()
+    assert [n.id for n in tree.walk()] == [1, 2, 4]
+    assert [[n.id for n in level] for level in tree.levels()] == [[1], [2], [4]]
+    assert tree.nodes[4].parent_id == 2
+    assert set(tree.cards.keys()) == {10, 11}
+
+
+def test_tree_items() -> None:
+    tree = _tree()
+    assert [(i["model"], i["id"]) for i in tree.nodes[1].items] == [
+        ("card", 10),
+        ("collection", 2),
+    ]
+    assert {(i["model"], i["id"]) for i in tree.nodes[2].items} == {
+        ("dataset", 12),
+        ("dashboard", 20),
+        ("collection", 4),
+    }
+    subtree = tree.subtree(2)
+    assert [n.id for n in subtree.walk()] == [2, 4]
+    assert subtree.root.items_of("dashboard")[0]["name"] == "dash"
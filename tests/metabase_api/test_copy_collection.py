@@ -0,0 +1,202 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from metabase_api import Metabase_API
+
+
+class _Response:
+    ok = True
+    status_code = 200
+
+    def __init__(self, as_json: dict):
+        self._json = as_json
+
+    def json(self) -> dict:
+        return self._json
+
+
+class _Instance:
+    """
+    An instance with a collection (1) and its sub-collection (2): a card (11) built on another one (10),
+    a dashboard (20) showing it and a subscription (30) to that dashboard.
+    """
+
+    copy_collection = Metabase_API.copy_collection
+    plan_copy_collection = Metabase_API.plan_copy_collection
+    copy_dashboard_from_json = Metabase_API.copy_dashboard_from_json
+    verbose_print = staticmethod(Metabase_API.verbose_print)
+
+    LISTINGS = {
+        "/api/collection/tree": [
+            {
+                "id": 1,
+                "name": "top",
+                "children": [{"id": 2, "name": "sub", "children": []}],
+            }
+        ],
+        "/api/card/": [
+            {
+                "id": 11,
+                "name": "on base",
+                "collection_id": 2,
+                "dataset_query": {"query": {"source-table": "card__10"}},
+            },
+            {"id": 10, "name": "base", "collection_id": 1, "dataset_query": {}},
+        ],
+        "/api/dashboard/": [{"id": 20, "name": "dash", "collection_id": 2}],
+        "/api/pulse/": [{"id": 30, "name": "daily", "collection_id": 1}],
+        "/api/dashboard/20": {
+            "id": 20,
+            "name": "dash",
+            "tabs": [{"id": 5, "name": "a tab", "position": 0}],
+            "dashcards": [{"id": 1, "card_id": 11, "dashboard_tab_id": 5}],
+        },
+        "/api/pulse/30": {
+            "id": 30,
+            "name": "daily",
+            "dashboard_id": 20,
+            "cards": [{"id": 11, "dashboard_card_id": 1}],
+        },
+    }
+
+    def __init__(self, fail_on: Any = None) -> None:
+        # name of the card that can not be copied
+        self.fail_on = fail_on
+        self.created: list[tuple[str, Any]] = []
+        self._next_id = 100
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def get(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        return self.LISTINGS[endpoint]
+
+    def create_collection(self, name: str, **kwargs: Any) -> dict:
+        self.created.append(("collection", dict(kwargs, name=name)))
+        return {"id": self._new_id()}
+
+    def copy_card(self, source_card_json: dict, **kwargs: Any) -> int:
+        if source_card_json["name"] == self.fail_on:
+            raise ValueError(f"no card '{self.fail_on}'")
+        self.created.append(("card", source_card_json))
+        return self._new_id()
+
+    def post(self, endpoint: str, *args: Any, json: Any = None) -> Any:
+        self.created.append((endpoint, json))
+        return {"id": self._new_id()}
+
+    def put(self, endpoint: str, *args: Any, json: Any = None) -> Any:
+        self.created.append((endpoint, json))
+        return _Response({"tabs": [{"id": 500, "position": 0}]})
+
+
+def test_plan_then_copy_with_the_same_journal(tmp_path: Path) -> None:
+    journal_path = tmp_path / "journal.jsonl"
+    api = _Instance()
+    plan = api.plan_copy_collection(
+        source_collection_id=1,
+        deepcopy_dashboards=True,
+        measure_latency=False,
+        journal_path=journal_path,
+    )
+    assert sum(len(w.objects) for w in plan.waves) == 6
+    # planning does not start the journal of the copy
+    assert not journal_path.exists()
+    api.copy_collection(
+        source_collection_id=1,
+        destination_collection_name="copy",
+        destination_parent_collection_id=7,
+        deepcopy_dashboards=True,
+        journal_path=journal_path,
+    )
+    before = journal_path.read_text()
+    plan = api.plan_copy_collection(
+        source_collection_id=1,
+        deepcopy_dashboards=True,
+        measure_latency=False,
+        journal_path=journal_path,
+    )
+    assert sum(len(w.objects) for w in plan.waves) == 0
+    assert journal_path.read_text() == before
+
+
+EXPECTED_TRANSF = {
+    "collections": {1: 101, 2: 102},
+    "cards": {10: 103, 11: 104},
+    "dashboards": {20: 105},
+    "tabs": {5: 500},
+    "pulses": {30: 106},
+}
+
+
+def _copy(api: _Instance, **kwargs: Any) -> dict:
+    return api.copy_collection(
+        source_collection_id=1,
+        destination_collection_name="copy",
+        destination_parent_collection_id=7,
+        deepcopy_dashboards=True,
+        **kwargs,
+    )
+
+
+def test_copy_collection() -> None:
+    api = _Instance()
+    assert _copy(api) == EXPECTED_TRANSF
+    created = dict((what, json) for what, json in api.created if what != "card")
+    cards = {c["name"]: c for (what, c) in api.created if what == "card"}
+    collections = [c for (what, c) in api.created if what == "collection"]
+    assert [(c["name"], c["parent_collection_id"]) for c in collections] == [
+        ("copy", 7),
+        ("sub", 101),
+    ]
+    # the card built on another one uses its copy...
+    assert cards["on base"]["dataset_query"] == {"query": {"source-table": "card__103"}}
+    # ... and so do the dashboard and the subscription to the copy of the dashboard
+    assert [dc["card_id"] for dc in created["/api/dashboard/105"]["dashcards"]] == [104]
+    assert created["/api/pulse"]["dashboard_id"] == 105
+    assert created["/api/pulse"]["cards"] == [{"id": 104, "dashboard_card_id": None}]
+
+
+def test_copy_collection_resumes_from_journal(tmp_path: Path) -> None:
+    journal_path = tmp_path / "journal.jsonl"
+    api = _Instance(fail_on="on base")
+    with pytest.raises(ValueError):
+        _copy(api, journal_path=journal_path)
+    assert [what for what, _ in api.created] == ["collection", "collection", "card"]
+    api.fail_on = None
+    api.created = []
+    assert _copy(api, journal_path=journal_path) == EXPECTED_TRANSF
+    # only what the first run did not do is done
+    assert [what for what, _ in api.created] == [
+        "card",
+        "/api/dashboard",
+        "/api/dashboard/105",
+        "/api/pulse",
+    ]
+
+
+class _TablesEquivalencies:
+    def card_json_for_destination(self, card_json: dict) -> dict:
+        return dict(card_json, database_id=2)
+
+    def remap(self, x: Any) -> Any:
+        return x
+
+
+def test_copy_collection_to_another_instance() -> None:
+    source, destination = _Instance(), _Instance()
+    transf = source.copy_collection(
+        source_collection_id=1,
+        destination_collection_name="copy",
+        destination_parent_collection_id=7,
+        destination_api=destination,
+        tables_equivalencies=_TablesEquivalencies(),
+    )
+    assert transf == EXPECTED_TRANSF
+    assert source.created == []
+    # the cards are copied (even without 'deepcopy_dashboards'), for the other database
+    cards = [c for (what, c) in destination.created if what == "card"]
+    assert [c["database_id"] for c in cards] == [2, 2]
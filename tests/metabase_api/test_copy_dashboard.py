@@ -0,0 +1,81 @@
+from typing import Any
+
+from metabase_api.copy_methods import copy_dashboard_from_json
+
+SOURCE = {
+    "id": 1,
+    "name": "dash",
+    "width": "full",
+    "parameters": [],
+    "tabs": [
+        {"id": 11, "name": "second", "position": 1},
+        {"id": 10, "name": "first", "position": 0},
+    ],
+    "dashcards": [
+        {"id": 100, "card_id": 5, "dashboard_tab_id": 10, "card": {"id": 5}},
+        {
+            "id": 101,
+            "card_id": 6,
+            "dashboard_tab_id": 11,
+            "series": [{"id": 5}],
+            "parameter_mappings": [{"card_id": 6, "parameter_id": "p"}],
+        },
+    ],
+}
+
+
+class _Response:
+    ok = True
+    status_code = 200
+
+    def __init__(self, as_json: dict):
+        self._json = as_json
+
+    def json(self) -> dict:
+        return self._json
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.requests: list[tuple[str, str, Any]] = []
+
+    def post(self, endpoint: str, *args, json: Any = None) -> Any:
+        self.requests.append(("POST", endpoint, json))
+        return {"id": 42}
+
+    def put(self, endpoint: str, *args, json: Any = None) -> Any:
+        self.requests.append(("PUT", endpoint, json))
+        return _Response(
+            {"tabs": [{"id": 70, "position": 0}, {"id": 71, "position": 1}]}
+        )
+
+    def get(self, endpoint: str, *args, **kwargs) -> Any:
+        raise AssertionError(f"unexpected GET {endpoint}")
+
+
+def test_copy_from_json_takes_two_requests() -> None:
+    api = _Recorder()
+    dup_id, tabs_equiv = copy_dashboard_from_json(
+        api,
+        source_dashboard_json=SOURCE,
+        destination_collection_id=3,
+        destination_dashboard_name="copy",
+        card_id_mapping={5: 50, 6: 60},
+    )
+    assert dup_id == 42
+    assert tabs_equiv == {10: 70, 11: 71}
+    assert [(method, endpoint) for method, endpoint, _ in api.requests] == [
+        ("POST", "/api/dashboard"),
+        ("PUT", "/api/dashboard/42"),
+    ]
+    put_json = api.requests[1][2]
+    assert put_json["width"] == "full"
+    # new tabs and cards have negative ids
+    assert [t["id"] for t in put_json["tabs"]] == [-1, -2]
+    dashcards = put_json["dashcards"]
+    assert [(d["id"], d["card_id"], d["dashboard_tab_id"]) for d in dashcards] == [
+        (-1, 50, -1),
+        (-2, 60, -2),
+    ]
+    assert dashcards[1]["series"] == [{"id": 50}]
+    assert dashcards[1]["parameter_mappings"][0]["card_id"] == 60
@@ -0,0 +1,14 @@
+import pytest
+
+from metabase_api.copy_engine import dependency_waves
+
+
+def test_dependency_waves() -> None:
+    # 3 depends on 1 and 2, 4 on 3; 99 is not copied
+    waves = dependency_waves({1: set(), 2: {99}, 3: {1, 2}, 4: {3}})
+    assert waves == [[1, 2], [3], [4]]
+
+
+def test_dependency_waves_with_cycle() -> None:
+    with pytest.raises(ValueError):
+        dependency_waves({1: {2}, 2: {1}, 3: set()})
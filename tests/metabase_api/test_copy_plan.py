@@ -0,0 +1,60 @@
+from typing import Any
+
+from metabase_api.copy_engine import CollectionCopier
+
+
+class _ListingsOnly:
+    """Answers the (read-only) listings a plan needs."""
+
+    LISTINGS = {
+        "/api/collection/tree": [
+            {
+                "id": 1,
+                "name": "top",
+                "children": [{"id": 2, "name": "sub", "children": []}],
+            }
+        ],
+        "/api/card/": [
+            {"id": 10, "name": "base", "collection_id": 1, "dataset_query": {}},
+            {
+                "id": 11,
+                "name": "on base",
+                "collection_id": 2,
+                "dataset_query": {"query": {"source-table": "card__10"}},
+            },
+        ],
+        "/api/dashboard/": [{"id": 20, "name": "dash", "collection_id": 2}],
+        "/api/pulse/": [],
+    }
+
+    def get(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        return self.LISTINGS[endpoint]
+
+    def verbose_print(self, verbose: bool, msg: str) -> None:
+        pass
+
+
+def test_plan_of_a_deep_copy() -> None:
+    plan = CollectionCopier(
+        _ListingsOnly(), deepcopy_dashboards=True, max_workers=2
+    ).plan(1)
+    assert [[(o.model, o.id) for o in w.objects] for w in plan.waves] == [
+        [],
+        [("collection", 1)],
+        [("collection", 2)],
+        [("card", 10)],
+        [("card", 11)],
+        [("dashboard", 20)],
+    ]
+    assert plan.requests == {"GET": 4 + 1, "POST": 2 + 2 + 1, "PUT": 1}
+    # every wave waits for the previous one
+    assert plan.estimated_seconds(latency=1.0) == 4 + 1 + 1 + 1 + 1 + 3
+    assert "Estimated duration" in plan.summary(latency=0.1)
+
+
+def test_plan_of_a_migration() -> None:
+    plan = CollectionCopier(_ListingsOnly(), deepcopy_dashboards=True).plan(
+        1, migrate=True
+    )
+    assert plan.waves[-1].action == "update"
+    assert plan.waves[-1].requests == {"PUT": 3, "GET": 1}
@@ -0,0 +1,69 @@
+from typing import Any
+
+from metabase_api.copy_methods import _pulse_json_for_copy, copy_pulses
+
+PULSE = {
+    "id": 8,
+    "name": "weekly",
+    "collection_id": 5,
+    "creator": {"id": 1},
+    "dashboard_id": None,
+    "cards": [
+        {"id": 12, "include_csv": True},
+        {"id": 99, "include_csv": False},
+    ],
+    "channels": [{"channel_type": "email", "recipients": [{"id": 1}]}],
+}
+
+
+def test_pulse_points_to_copied_cards() -> None:
+    pulse_json = _pulse_json_for_copy(
+        PULSE,
+        destination_collection_id=50,
+        destination_pulse_name="weekly (copy)",
+        card_id_mapping={12: 120},
+    )
+    assert "id" not in pulse_json and "creator" not in pulse_json
+    assert pulse_json["collection_id"] == 50
+    assert pulse_json["name"] == "weekly (copy)"
+    # cards that were not copied are kept
+    assert [c["id"] for c in pulse_json["cards"]] == [120, 99]
+    assert pulse_json["channels"] == PULSE["channels"]
+    assert PULSE["cards"][0]["id"] == 12
+
+
+def test_subscription_goes_to_copied_dashboard() -> None:
+    subscription = dict(
+        PULSE, dashboard_id=3, cards=[{"id": 12, "dashboard_card_id": 7}]
+    )
+    pulse_json = _pulse_json_for_copy(
+        subscription,
+        destination_collection_id=50,
+        destination_pulse_name="weekly",
+        card_id_mapping={12: 120},
+        dashboard_id_mapping={3: 30},
+    )
+    assert pulse_json["dashboard_id"] == 30
+    assert pulse_json["cards"] == [{"id": 120, "dashboard_card_id": None}]
+
+
+class _Pulses:
+    def __init__(self) -> None:
+        self.posted: list[dict] = []
+
+    def get(self, endpoint: str, *args, **kwargs) -> Any:
+        return dict(PULSE, id=int(endpoint.split("/")[-1]))
+
+    def post(self, endpoint: str, *args, json: Any = None) -> Any:
+        self.posted.append(json)
+        return {"id": 100 + len(self.posted)}
+
+
+def test_copy_pulses_reports_mapping() -> None:
+    api = _Pulses()
+    mapping = copy_pulses(
+        api, [8, 9], destination_collection_id=50, card_id_mapping={12: 120}
+    )
+    assert sorted(mapping.keys()) == [8, 9]
+    assert sorted(mapping.values()) == [101, 102]
+    assert all(p["cards"][0]["id"] == 120 for p in api.posted)
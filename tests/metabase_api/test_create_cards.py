@@ -0,0 +1,106 @@
+from typing import Any
+
+import pytest
+import requests
+
+from metabase_api.create_methods import _resolve_card_specs, create_cards
+
+
+class _Api:
+    LISTINGS = {
+        "/api/collection/": [
+            {"id": 3, "name": "reports"},
+            {"id": 4, "name": "twice"},
+            {"id": 5, "name": "twice"},
+            {"id": 6, "name": "old", "archived": True},
+        ],
+        "/api/database/": {
+            "data": [{"id": 1, "name": "dev"}, {"id": 2, "name": "prod"}]
+        },
+        "/api/table/": [
+            {"id": 10, "name": "physicians", "db_id": 1},
+            {"id": 20, "name": "physicians", "db_id": 2},
+        ],
+    }
+
+    def __init__(self) -> None:
+        self.listed: list[str] = []
+
+    def get(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        self.listed.append(endpoint)
+        return self.LISTINGS[endpoint]
+
+    def create_card(
+        self, custom_json: dict, return_card: bool = False, **kwargs: Any
+    ) -> Any:
+        name = custom_json["name"]
+        if name == "broken":
+            return False
+        if name == "refused":
+            return {"error": "Invalid query"}
+        if name == "down":
+            raise requests.ConnectionError("server went away")
+        return {"id": 800}
+
+    def verbose_print(self, verbose: bool, msg: str) -> None:
+        pass
+
+
+def test_names_are_resolved_once_for_all_specs() -> None:
+    api = _Api()
+    spec = {
+        "card_name": "a",
+        "collection_name": "reports",
+        "db_name": "prod",
+        "table_name": "physicians",
+    }
+    resolved = _resolve_card_specs(
+        api, [spec, dict(spec, card_name="b", collection_name="Root")]
+    )
+    assert resolved[0] == {
+        "card_name": "a",
+        "collection_id": 3,
+        "db_id": 2,
+        "table_id": 20,
+    }
+    assert resolved[1]["collection_id"] is None
+    assert sorted(api.listed) == ["/api/collection/", "/api/database/", "/api/table/"]
+    # the specs are left alone
+    assert spec["collection_name"] == "reports"
+
+
+def test_all_the_problems_of_the_specs_are_reported() -> None:
+    specs = [
+        {"table_id": 10},
+        {"card_name": "a", "collection_name": "twice", "table_id": 10},
+        {"card_name": "b", "collection_name": "old", "table_name": "physicians"},
+        {"card_name": "c", "table_id": 10, "column_order": "random"},
+    ]
+    with pytest.raises(ValueError) as e:
+        _resolve_card_specs(_Api(), specs)
+    lines = str(e.value).splitlines()[1:]
+    assert lines == [
+        "card spec #0 ('None'): a name must be provided for the card.",
+        "card spec #1 ('a'): found 2 collections named 'twice'.",
+        "card spec #2 ('b'): found 0 collections named 'old'.",
+        "card spec #2 ('b'): found 2 tables named 'physicians'.",
+        "card spec #3 ('c'): wrong value for 'column_order'.",
+    ]
+
+
+def test_every_card_is_reported() -> None:
+    specs = [
+        {"custom_json": {"name": name, "dataset_query": {}, "display": "table"}}
+        for name in ["ok", "broken", "refused", "down"]
+    ]
+    report = create_cards(_Api(), specs, max_workers=2)
+    assert [(r["card_name"], r["card_id"]) for r in report] == [
+        ("ok", 800),
+        ("broken", None),
+        ("refused", None),
+        ("down", None),
+    ]
+    errors = [r["error"] for r in report]
+    assert errors[0] is None
+    assert "could not be built" in errors[1]
+    assert errors[2:] == ["Invalid query", "server went away"]
@@ -0,0 +1,60 @@
+from typing import Any
+
+import pytest
+import requests
+
+from metabase_api.create_methods import create_segments
+
+
+class _Api:
+    create_segments = create_segments
+
+    def __init__(self, failing: set[str]) -> None:
+        self.failing = failing
+        self.posted: list[str] = []
+
+    def get_item_id(self, item_type: str, item_name: str, **kwargs: Any) -> int:
+        assert (item_type, item_name) == ("table", "orders")
+        return 7
+
+    def get_table_columns_in_order(self, table_id: int) -> list[dict]:
+        assert table_id == 7
+        return [{"id": 31, "name": "state"}, {"id": 32, "name": "city"}]
+
+    def post(self, endpoint: str, *args: Any, json: Any = None) -> Any:
+        name = json["name"]
+        self.posted.append(name)
+        if name in self.failing:
+            if name == "down":
+                raise requests.ConnectionError("server went away")
+            return False
+        return {"id": 100 + len(self.posted), "name": name}
+
+
+def test_segments_are_validated_before_creation() -> None:
+    api = _Api(failing=set())
+    with pytest.raises(ValueError):
+        api.create_segments(7, [("ny", "state", ["NY"]), ("bad", "country", ["US"])])
+    assert api.posted == []
+
+
+def test_failed_segments_are_reported() -> None:
+    api = _Api(failing={"refused", "down"})
+    segments = [
+        ("ny", "state", ["NY"]),
+        ("refused", "state", ["CA"]),
+        ("down", "city", ["Boston"], "a description"),
+    ]
+    assert sorted(api.create_segments("orders", segments)) == ["down", "refused"]
+    res = api.create_segments(7, segments, return_segments=True)
+    assert res[0]["name"] == "ny"
+    assert res[1:] == [False, False]
+
+
+def test_no_segment_created() -> None:
+    api = _Api(failing={"refused", "down"})
+    segments = [("refused", "state", ["CA"]), ("down", "city", ["Boston"])]
+    with pytest.raises(ValueError):
+        api.create_segments(7, segments)
+    # the failures are returned when the segments are asked for
+    assert api.create_segments(7, segments, return_segments=True) == [False, False]
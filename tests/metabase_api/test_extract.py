@@ -0,0 +1,189 @@
+import threading
+import time
+from typing import Any
+
+import pytest
+
+from metabase_api.extract_methods import (
+    SQL_DIALECTS,
+    _key_stats,
+    _keyset_query,
+    _partition_boundaries,
+    iter_card_data,
+    sql_dialect,
+)
+
+NATIVE = {"type": "native", "native": {"query": "select * from orders;"}}
+MBQL = {"type": "query", "query": {"source-table": 3}}
+KEY_REF = ["field", "ID", {"base-type": "type/Integer"}]
+
+
+def test_native_page_query() -> None:
+    dq = _keyset_query(
+        NATIVE, 'my "id"', None, after="o'brien", lower=1, upper=9, limit=10
+    )
+    assert dq["native"]["query"] == (
+        'SELECT * FROM (select * from orders) AS "_keyset" WHERE "my ""id""" IS NOT NULL'
+        ' AND "my ""id""" >= 1 AND "my ""id""" < 9 AND "my ""id""" > \'o\'\'brien\''
+        ' ORDER BY "my ""id""" LIMIT 10'
+    )
+    # the card is left alone
+    assert NATIVE["native"]["query"] == "select * from orders;"
+
+
+@pytest.mark.parametrize(
+    "engine, expected",
+    [
+        (
+            "mysql",
+            "SELECT * FROM (q) AS `_keyset` WHERE `id` IS NOT NULL ORDER BY `id` LIMIT 5",
+        ),
+        (
+            "sqlserver",
+            "SELECT TOP 5 * FROM (q) AS [_keyset] WHERE [id] IS NOT NULL ORDER BY [id]",
+        ),
+        (
+            "oracle",
+            'SELECT * FROM (q) "_keyset" WHERE "id" IS NOT NULL ORDER BY "id" FETCH FIRST 5 ROWS ONLY',
+        ),
+    ],
+)
+def test_native_page_query_in_the_dialect_of_the_engine(
+    engine: str, expected: str
+) -> None:
+    dq = _keyset_query(
+        {"type": "native", "native": {"query": "q"}},
+        "id",
+        None,
+        limit=5,
+        dialect=sql_dialect(engine),
+    )
+    assert dq["native"]["query"] == expected
+
+
+def test_unknown_and_non_sql_engines() -> None:
+    assert sql_dialect("postgres") == sql_dialect(None)
+    with pytest.raises(ValueError):
+        sql_dialect("mongo")
+    with pytest.raises(ValueError, match="boolean"):
+        SQL_DIALECTS["sqlserver"].literal(True)
+    with pytest.raises(ValueError, match="NULL"):
+        sql_dialect(None).literal(None)
+
+
+def test_mbql_page_query() -> None:
+    dq = _keyset_query(
+        MBQL, "ID", KEY_REF, after=41, upper=100, upper_inclusive=True, limit=2
+    )
+    assert dq["query"] == {
+        "source-query": {"source-table": 3},
+        "filter": [
+            "and",
+            ["not-null", KEY_REF],
+            ["<=", KEY_REF, 100],
+            [">", KEY_REF, 41],
+        ],
+        "order-by": [["asc", KEY_REF]],
+        "limit": 2,
+    }
+    stats = _keyset_query(MBQL, "ID", KEY_REF, stats=True)["query"]
+    assert stats["aggregation"][2:] == [["count"], ["distinct", KEY_REF]]
+
+
+class _Stats:
+    def __init__(self, row: list) -> None:
+        self.row = row
+
+    def post(self, endpoint: str, json: Any = None) -> Any:
+        return {
+            "status": "completed",
+            "data": {
+                "cols": [{"name": n} for n in ["min", "max", "count", "distinct"]],
+                "rows": [self.row],
+            },
+        }
+
+
+def test_key_must_be_unique() -> None:
+    assert _key_stats(_Stats([1, 9, 5, 5]), NATIVE, "id", None) == (1, 9)
+    with pytest.raises(ValueError, match="not unique"):
+        _key_stats(_Stats([1, 9, 5, 4]), NATIVE, "id", None)
+
+
+def test_partition_boundaries() -> None:
+    assert _partition_boundaries(None, None, partitions=4) == []
+    assert _partition_boundaries(1, 9, partitions=1) == [(None, None, False)]
+    assert _partition_boundaries("a", "z", partitions=4) == [(None, None, False)]
+    assert _partition_boundaries(0, 10, partitions=3) == [
+        (0, 3, False),
+        (3, 6, False),
+        (6, 10, True),
+    ]
+    # never more partitions than values
+    assert _partition_boundaries(0, 2, partitions=5) == [(0, 1, False), (1, 2, True)]
+
+
+class _Rows:
+    """Answers the queries of 'iter_card_data' on a simple question, from rows in memory."""
+
+    iter_card_data = iter_card_data
+
+    def __init__(self, keys: list[int]) -> None:
+        self.keys = keys
+
+    def get_item_info_from_id(self, item_type: Any, item_id: int) -> dict:
+        return {
+            "dataset_query": MBQL,
+            "result_metadata": [{"name": "ID", "base_type": "type/Integer"}],
+        }
+
+    def post(self, endpoint: str, json: Any = None) -> Any:
+        query = json["query"]
+        if "aggregation" in query:
+            row = [min(self.keys), max(self.keys), len(self.keys), len(self.keys)]
+            return {"status": "completed", "data": {"cols": [], "rows": [row]}}
+        predicates = query["filter"][1:]
+        ops = {
+            ">=": lambda k, v: k >= v,
+            ">": lambda k, v: k > v,
+            "<": lambda k, v: k < v,
+            "<=": lambda k, v: k <= v,
+        }
+        keys = [
+            k
+            for k in sorted(self.keys)
+            if all(ops[p[0]](k, p[2]) for p in predicates if p[0] in ops)
+        ]
+        # the first partition is the slowest one
+        if not any(p[0] == ">=" for p in predicates):
+            time.sleep(0.05)
+        return {
+            "status": "completed",
+            "data": {
+                "cols": [{"name": "ID"}],
+                "rows": [[k] for k in keys][: query["limit"]],
+            },
+        }
+
+
+def test_more_partitions_than_workers() -> None:
+    api = _Rows(list(range(100)))
+    rows: list[dict] = []
+
+    def _consume() -> None:
+        rows.extend(
+            api.iter_card_data(
+                "ID",
+                card_id=1,
+                page_size=3,
+                partitions=8,
+                max_workers=2,
+                prefetch_pages=1,
+            )
+        )
+
+    consumer = threading.Thread(target=_consume, daemon=True)
+    consumer.start()
+    consumer.join(timeout=30)
+    assert not consumer.is_alive()
+    assert [r["ID"] for r in rows] == list(range(100))
@@ -0,0 +1,192 @@
+from copy import deepcopy
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from metabase_api.sync_methods import (
+    _read_sync_state,
+    _write_sync_state,
+    card_content_hash,
+    dashboard_content_hash,
+    sync_collection,
+)
+
+DASHBOARD = {
+    "id": 1,
+    "name": "dash",
+    "updated_at": "2024-01-01",
+    "tabs": [{"id": 3, "name": "tab", "updated_at": "2024-01-01"}],
+    "dashcards": [{"id": 7, "card_id": 12, "card": {"id": 12, "name": "q"}}],
+}
+
+
+def test_dashboard_hash_ignores_embedded_cards_and_dates() -> None:
+    other = dict(
+        DASHBOARD,
+        updated_at="2024-02-02",
+        tabs=[{"id": 3, "name": "tab", "updated_at": "2024-02-02"}],
+        dashcards=[{"id": 7, "card_id": 12, "card": {"id": 12, "name": "q2"}}],
+    )
+    assert dashboard_content_hash(DASHBOARD) == dashboard_content_hash(other)
+    moved = dict(DASHBOARD, dashcards=[{"id": 7, "card_id": 12, "row": 4}])
+    assert dashboard_content_hash(DASHBOARD) != dashboard_content_hash(moved)
+
+
+def test_card_hash_only_looks_at_content() -> None:
+    card = {"name": "q", "display": "table", "dataset_query": {"database": 1}}
+    assert card_content_hash(card) == card_content_hash(
+        dict(card, id=3, updated_at="2024-01-01")
+    )
+    assert card_content_hash(card) != card_content_hash(dict(card, display="bar"))
+
+
+def test_sync_state_round_trip(tmp_path: Path) -> None:
+    p = tmp_path / "state.json"
+    state = {
+        "source_collection_id": 4,
+        "transf": {"cards": {12: 112}, "tabs": {}},
+        "objects": {"card": {12: {"updated_at": "x", "hash": "h"}}, "dashboard": {}},
+    }
+    _write_sync_state(p, state)
+    assert _read_sync_state(p) == state
+    assert _read_sync_state(tmp_path / "nothing.json") is None
+
+
+class _Server:
+    """A source collection (1, with sub-collection 2) and what is done to its copy."""
+
+    def __init__(self) -> None:
+        self.cards = {
+            10: {
+                "id": 10,
+                "name": "base",
+                "collection_id": 1,
+                "display": "table",
+                "dataset_query": {"query": {"source-table": 3}},
+                "updated_at": "1",
+            }
+        }
+        self.dashboard = {
+            "id": 20,
+            "name": "dash",
+            "collection_id": 2,
+            "updated_at": "1",
+            "tabs": [],
+            "dashcards": [{"id": 7, "card_id": 10}],
+        }
+        self.copied_collections = 0
+        self.copied_cards: list[dict] = []
+        self.puts: list[tuple[str, Any]] = []
+        self.failing_put = ""
+
+    def get(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        listings = {
+            "/api/collection/tree": [
+                {
+                    "id": 1,
+                    "name": "top",
+                    "children": [{"id": 2, "name": "sub", "children": []}],
+                }
+            ],
+            "/api/card/": list(self.cards.values()),
+            "/api/dashboard/": [self.dashboard],
+            "/api/pulse/": [],
+            "/api/dashboard/20": self.dashboard,
+        }
+        return deepcopy(listings[endpoint])
+
+    def copy_collection(self, **kwargs: Any) -> dict:
+        self.copied_collections += 1
+        return {
+            "collections": {1: 101, 2: 102},
+            "cards": {c_id: 100 + c_id for c_id in self.cards},
+            "dashboards": {20: 120},
+            "tabs": {},
+            "pulses": {},
+        }
+
+    def copy_card(self, source_card_json: dict, **kwargs: Any) -> int:
+        self.copied_cards.append(source_card_json)
+        return 100 + source_card_json["id"]
+
+    def put(self, endpoint: str, *args: Any, json: Any = None) -> int:
+        if endpoint == self.failing_put:
+            return 500
+        self.puts.append((endpoint, json))
+        return 200
+
+    def verbose_print(self, verbose: bool, msg: str) -> None:
+        pass
+
+
+def _sync(server: _Server, state_path: Path) -> dict:
+    return sync_collection(server, 1, state_path, max_workers=2)
+
+
+def test_first_sync_copies_and_next_one_does_nothing(tmp_path: Path) -> None:
+    server = _Server()
+    first = _sync(server, tmp_path / "state.json")
+    assert server.copied_collections == 1
+    assert first["created"] == {
+        "collection": [1, 2],
+        "card": [10],
+        "dashboard": [20],
+    }
+    state = _read_sync_state(tmp_path / "state.json")
+    assert state is not None and sorted(state["objects"]["card"]) == [10]
+    second = _sync(server, tmp_path / "state.json")
+    assert server.copied_collections == 1
+    assert server.copied_cards == [] and server.puts == []
+    assert all(len(ids) == 0 for ids in second["created"].values())
+    assert all(len(ids) == 0 for ids in second["updated"].values())
+
+
+def test_changed_card_is_updated_with_one_put(tmp_path: Path) -> None:
+    server = _Server()
+    _sync(server, tmp_path / "state.json")
+    server.cards[10].update(display="bar", updated_at="2")
+    result = _sync(server, tmp_path / "state.json")
+    assert result["updated"]["card"] == [10]
+    assert [(endpoint, json["display"]) for endpoint, json in server.puts] == [
+        ("/api/card/110", "bar")
+    ]
+    # only its date changed: nothing to do
+    server.cards[10]["updated_at"] = "3"
+    assert _sync(server, tmp_path / "state.json")["updated"]["card"] == []
+    assert len(server.puts) == 1
+
+
+def test_new_card_points_to_the_copy_of_its_source(tmp_path: Path) -> None:
+    server = _Server()
+    _sync(server, tmp_path / "state.json")
+    server.cards[11] = {
+        "id": 11,
+        "name": "on base",
+        "collection_id": 2,
+        "dataset_query": {"query": {"source-table": "card__10"}},
+        "updated_at": "1",
+    }
+    result = _sync(server, tmp_path / "state.json")
+    assert result["created"]["card"] == [11]
+    assert server.copied_cards[0]["dataset_query"]["query"]["source-table"] == (
+        "card__110"
+    )
+    assert result["transf"]["cards"][11] == 111
+
+
+def test_failed_sync_keeps_what_was_created(tmp_path: Path) -> None:
+    server = _Server()
+    _sync(server, tmp_path / "state.json")
+    server.cards[10].update(display="bar", updated_at="2")
+    server.cards[11] = dict(server.cards[10], id=11, name="new", updated_at="1")
+    server.failing_put = "/api/card/110"
+    with pytest.raises(ValueError, match="card '10'"):
+        _sync(server, tmp_path / "state.json")
+    state = _read_sync_state(tmp_path / "state.json")
+    assert state is not None
+    assert state["transf"]["cards"][11] == 111
+    # the changed card is not in sync: it is updated by the next sync
+    assert state["objects"]["card"][10]["updated_at"] == "1"
+    server.failing_put = ""
+    assert _sync(server, tmp_path / "state.json")["updated"]["card"] == [10]
@@ -0,0 +1,59 @@
+from typing import Any, Optional
+
+import pytest
+
+from metabase_api import Metabase_API
+from metabase_api.utility.object_store import ObjectStore
+
+METADATA = {
+    "id": 10,
+    "fields": [
+        {"id": 3, "name": "total", "position": 2},
+        {"id": 1, "name": "id", "position": 0},
+        {"id": 4, "name": "total.amount", "position": 3, "parent_id": 3},
+        {"id": 2, "name": "state", "position": 1},
+    ],
+}
+
+
+class _Api:
+    get_table_metadata = Metabase_API.get_table_metadata
+    get_table_columns_in_order = Metabase_API.get_table_columns_in_order
+    clear_cache = Metabase_API.clear_cache
+
+    def __init__(self) -> None:
+        self._table_metadata_cache: dict = dict()
+        self._cards_index_cache: dict = dict()
+        self.object_store = ObjectStore()
+        self.gets: list[str] = []
+
+    def get(self, endpoint: str, *args: Any, params: Optional[dict] = None) -> Any:
+        self.gets.append(endpoint)
+        return METADATA if endpoint == "/api/table/10/query_metadata" else False
+
+
+def test_columns_in_order() -> None:
+    api = _Api()
+    # sorted on their position; nested fields are left out
+    columns = api.get_table_columns_in_order(10)
+    assert [c["name"] for c in columns] == ["id", "state", "total"]
+    with pytest.raises(ValueError):
+        api.get_table_columns_in_order(11)
+
+
+def test_table_metadata_cache() -> None:
+    api = _Api()
+    api.get_table_columns_in_order(10)
+    api.get_table_columns_in_order(10)
+    assert api.get_table_metadata(table_id=10, use_cache=True) == METADATA
+    assert api.gets == ["/api/table/10/query_metadata"]
+    # not cached: always fetched
+    api.get_table_metadata(table_id=10)
+    assert len(api.gets) == 2
+    # (a table that does not exist is not cached)
+    api.get_table_metadata(table_id=11, use_cache=True)
+    api.get_table_metadata(table_id=11, use_cache=True)
+    assert len(api.gets) == 4
+    api.clear_cache()
+    api.get_table_columns_in_order(10)
+    assert len(api.gets) == 5
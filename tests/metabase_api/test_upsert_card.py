@@ -0,0 +1,79 @@
+from typing import Any
+
+from metabase_api.create_methods import upsert_card
+
+QUERY = {"type": "query", "database": 1, "query": {"source-table": 10}}
+EXISTING = {
+    "id": 70,
+    "name": "revenue",
+    "collection_id": 3,
+    "dataset_query": QUERY,
+    "display": "table",
+    "visualization_settings": {},
+}
+
+
+class _Api:
+    upsert_card = upsert_card
+
+    def __init__(self) -> None:
+        self._cards_index_cache: dict = dict()
+        self.requests: list[tuple[str, Any]] = []
+
+    def get(self, endpoint: str, *args: Any, params: Any = None) -> Any:
+        self.requests.append(("GET", endpoint))
+        assert endpoint == "/api/collection/3/items" and params == {"models": "card"}
+        # (a newer card with the same name is ignored)
+        return {
+            "data": [
+                {"id": 71, "name": "revenue", "model": "card"},
+                {"id": 70, "name": "revenue", "model": "card"},
+            ]
+        }
+
+    def get_card_json(self, card_id: int) -> dict:
+        self.requests.append(("GET", f"/api/card/{card_id}"))
+        assert card_id == 70
+        return EXISTING
+
+    def create_card(self, custom_json: dict, **kwargs: Any) -> dict:
+        self.requests.append(("POST", custom_json["name"]))
+        return {"id": 80}
+
+    def put(self, endpoint: str, *args: Any, json: Any = None) -> int:
+        self.requests.append(("PUT", endpoint, json))  # type: ignore
+        return 200
+
+    def verbose_print(self, verbose: bool, msg: str) -> None:
+        pass
+
+
+def _spec(name: str, **changes: Any) -> dict:
+    custom_json = {
+        k: v for k, v in EXISTING.items() if k not in {"id", "collection_id"}
+    }
+    return {"collection_id": 3, "custom_json": dict(custom_json, name=name, **changes)}
+
+
+def test_upsert_card() -> None:
+    api = _Api()
+    assert api.upsert_card(_spec("revenue")) == {
+        "card_id": 70,
+        "action": "unchanged",
+        "changed_keys": [],
+    }
+    assert api.upsert_card(_spec("revenue", display="bar")) == {
+        "card_id": 70,
+        "action": "updated",
+        "changed_keys": ["display"],
+    }
+    assert api.upsert_card(_spec("costs"))["action"] == "created"
+    # ... and the card created is known from now on
+    assert api.upsert_card(_spec("costs"))["action"] == "unchanged"
+    assert api.requests == [
+        ("GET", "/api/collection/3/items"),
+        ("GET", "/api/card/70"),
+        # only what changed is sent
+        ("PUT", "/api/card/70", {"display": "bar"}),
+        ("POST", "costs"),
+    ]
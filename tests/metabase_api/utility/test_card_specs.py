@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+
+from metabase_api.utility.card_specs import load_card_specs
+
+
+def test_load_yaml_and_json_specs(tmp_path: Path) -> None:
+    yml = tmp_path / "specs.yml"
+    yml.write_text(
+        "- card_name: Active\n  table_name: physicians\n  column_order: [name]\n"
+    )
+    assert load_card_specs(yml) == [
+        {"card_name": "Active", "table_name": "physicians", "column_order": ["name"]}
+    ]
+    js = tmp_path / "specs.json"
+    js.write_text('[{"card_name": "Active", "table_id": 3}]')
+    assert load_card_specs(js) == [{"card_name": "Active", "table_id": 3}]
+
+
+@pytest.mark.parametrize(
+    "file_name, content, message",
+    [
+        (
+            "specs.yml",
+            "- card_name: a\n  colour: red\n",
+            "unknown keys: \\['colour'\\]",
+        ),
+        ("specs.yml", "card_name: a\n", "does not contain a list"),
+        ("specs.txt", "[]", "json or a yaml"),
+    ],
+)
+def test_invalid_spec_files(
+    tmp_path: Path, file_name: str, content: str, message: str
+) -> None:
+    p = tmp_path / file_name
+    p.write_text(content)
+    with pytest.raises(ValueError, match=message):
+        load_card_specs(p)
+    with pytest.raises(FileNotFoundError):
+        load_card_specs(tmp_path / "nothing.yml")
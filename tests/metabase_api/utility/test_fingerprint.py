@@ -0,0 +1,42 @@
+from hypothesis import strategies as st, given
+
+from metabase_api.utility.fingerprint import (
+    fingerprint,
+    fingerprints_by_key,
+    changed_keys,
+    exact_fingerprints_by_key,
+)
+
+
+@given(d=st.dictionaries(keys=st.text(), values=st.integers(), max_size=10))
+def test_fingerprint_does_not_depend_on_keys_order(d: dict) -> None:
+    assert fingerprint(d) == fingerprint(dict(reversed(list(d.items()))))
+
+
+def test_fingerprint_ignores_empty_values_and_legacy_refs() -> None:
+    stored = {
+        "query": {"fields": [["field", 12, None]], "source-table": 1},
+        "parameters": [],
+    }
+    posted = {"query": {"source-table": 1, "fields": [["field-id", 12]]}}
+    assert fingerprint(stored) == fingerprint(posted)
+
+
+def test_changed_keys() -> None:
+    old = fingerprints_by_key({"display": "table", "visualization_settings": {}})
+    new = fingerprints_by_key({"display": "bar", "visualization_settings": None})
+    assert changed_keys(old, new) == ["display"]
+    assert changed_keys(old, old) == []
+
+
+def test_exact_fingerprints_see_every_change() -> None:
+    card = {"query": {"fields": [["field-id", 12]]}, "parameters": [], "display": "bar"}
+    migrated = dict(card, query={"fields": [["field", 12, None]]}, parameters=None)
+    old = exact_fingerprints_by_key(card)
+    assert changed_keys(old, exact_fingerprints_by_key(migrated)) == [
+        "parameters",
+        "query",
+    ]
+    assert (
+        changed_keys(old, exact_fingerprints_by_key(dict(reversed(card.items())))) == []
+    )
@@ -0,0 +1,67 @@
+from typing import Any
+
+import pytest
+
+from metabase_api.utility.db.tables import InstancesTablesEquivalencies
+
+
+class _Instance:
+    """Answers the listings of tables and columns of one instance."""
+
+    def __init__(self, tables: list[dict], columns: dict[int, dict[str, int]]):
+        self.tables = tables
+        self.columns = columns
+
+    def get(self, endpoint: str, *args: Any, **kwargs: Any) -> Any:
+        assert endpoint == "/api/table/"
+        return self.tables
+
+    def get_columns_name_id_many(self, table_ids, tables=None) -> dict:
+        return {t: self.columns[t] for t in table_ids}
+
+
+STAGING = _Instance(
+    tables=[
+        {"id": 1, "db_id": 5, "schema": "public", "name": "patients"},
+        {"id": 2, "db_id": 5, "schema": "public", "name": "only_here"},
+    ],
+    columns={1: {"name": 11, "age": 12}, 2: {"x": 21}},
+)
+PRODUCTION = _Instance(
+    tables=[{"id": 101, "db_id": 7, "schema": "public", "name": "patients"}],
+    columns={101: {"age": 112, "name": 111}},
+)
+
+
+def test_card_json_for_destination() -> None:
+    equivalencies = InstancesTablesEquivalencies(STAGING, PRODUCTION, {5: 7})
+    assert equivalencies.table_mapping == {1: 101}
+    assert equivalencies.column_mapping == {11: 111, 12: 112}
+    card = {
+        "name": "ages",
+        "database_id": 5,
+        "table_id": 1,
+        "dataset_query": {
+            "database": 5,
+            "query": {"source-table": 1, "breakout": [["field", 12, None]]},
+        },
+        "result_metadata": [{"id": 12}],
+    }
+    new_card = equivalencies.card_json_for_destination(card)
+    assert new_card["database_id"] == 7
+    assert new_card["table_id"] == 101
+    assert new_card["dataset_query"] == {
+        "database": 7,
+        "query": {"source-table": 101, "breakout": [["field", 112, None]]},
+    }
+    assert "result_metadata" not in new_card
+    with pytest.raises(ValueError):
+        equivalencies.card_json_for_destination(
+            dict(
+                card,
+                dataset_query={
+                    "database": 5,
+                    "query": {"fields": [["field", 21, None]]},
+                },
+            )
+        )
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import pytest
+
+from metabase_api.utility.journal import Journal, copy_journal_header
+
+
+def test_journal_is_reloaded(tmp_path: Path) -> None:
+    p = tmp_path / "journal.jsonl"
+    journal = Journal(p)
+    journal.record("card", 12, 345)
+    journal.record("dashboard", 1, {"id": 11, "tabs": [[3, 4]]})
+    resumed = Journal(p)
+    assert resumed.done("card") == {12: 345}
+    assert resumed.get("dashboard", 1) == {"id": 11, "tabs": [[3, 4]]}
+    assert not resumed.has("card", 13)
+
+
+def test_journal_ignores_incomplete_last_line(tmp_path: Path) -> None:
+    p = tmp_path / "journal.jsonl"
+    Journal(p).record("card", 12, 345)
+    with open(p, "a") as f:
+        f.write('{"step": "card", "ke')
+    resumed = Journal(p)
+    assert resumed.done("card") == {12: 345}
+    resumed.record("card", 13, 346)
+    assert Journal(p).done("card") == {12: 345, 13: 346}
+
+
+def test_journal_belongs_to_one_run(tmp_path: Path) -> None:
+    p = tmp_path / "journal.jsonl"
+    header = copy_journal_header(
+        5, destination_parent_collection_id=1, destination_collection_name="copy"
+    )
+    Journal(p, header=header).record("card", 12, 345)
+    assert Journal(p, header=header).done("card") == {12: 345}
+    # (a plan only knows the source)
+    assert Journal(p, header=copy_journal_header(5)).header == header
+    with pytest.raises(ValueError, match="another run"):
+        Journal(p, header=copy_journal_header(6))
+    with pytest.raises(ValueError, match="another run"):
+        Journal(p, header=dict(header, destination_collection_name="other"))
+
+
+def test_read_only_journal(tmp_path: Path) -> None:
+    p = tmp_path / "journal.jsonl"
+    Journal(p, header=copy_journal_header(5), read_only=True)
+    assert not p.exists()
+    header = copy_journal_header(
+        5, destination_parent_collection_id=1, destination_collection_name="copy"
+    )
+    Journal(p, header=header).record("card", 12, 345)
+    with open(p, "a") as f:
+        f.write('{"step": "card", "ke')
+    before = p.read_text()
+    planned = Journal(p, header=copy_journal_header(5), read_only=True)
+    assert planned.done("card") == {12: 345}
+    with pytest.raises(RuntimeError):
+        planned.record("card", 13, 346)
+    assert p.read_text() == before
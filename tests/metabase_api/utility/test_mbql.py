@@ -0,0 +1,114 @@
+from copy import deepcopy
+
+from metabase_api.utility.mbql import (
+    field_ids_in,
+    replace_field_ids,
+    is_field_ref,
+    card_references,
+    replace_card_references,
+)
+
+QUERY = {
+    "source-query": {
+        "source-table": 9,
+        "filter": [
+            "and",
+            ["=", ["field", 71, None], "a"],
+            ["not-null", ["field", 72, None]],
+        ],
+        "expressions": {"double": ["*", ["field", 72, None], 2]},
+    },
+    "joins": [
+        {
+            "source-table": 12,
+            "condition": [
+                "=",
+                ["field", 73, None],
+                ["field", 120, {"join-alias": "j"}],
+            ],
+        }
+    ],
+    "aggregation": [["avg", ["field", 72, None]]],
+    "breakout": [["field", 71, {"temporal-unit": "month"}], ["field-id", 73]],
+    "fields": [["field", "a_name", {"base-type": "type/Text"}]],
+    "order-by": [["asc", ["aggregation", 0]]],
+}
+
+
+def test_is_field_ref() -> None:
+    assert is_field_ref(["field", 1, None])
+    assert is_field_ref(["field-id", 1])
+    assert not is_field_ref(["field", "name", None])
+    assert not is_field_ref(["aggregation", 0])
+
+
+def test_field_ids_in() -> None:
+    assert field_ids_in(QUERY) == {71, 72, 73, 120}
+
+
+def test_replace_field_ids() -> None:
+    original = deepcopy(QUERY)
+    new_query = replace_field_ids(
+        QUERY, column_mapping={71: 81, 72: 82, 73: 83}, table_mapping={9: 10}
+    )
+    # input untouched
+    assert QUERY == original
+    assert field_ids_in(new_query) == {81, 82, 83, 120}
+    assert new_query["source-query"]["source-table"] == 10
+    # joined table is not mentioned in the mapping: kept
+    assert new_query["joins"][0]["source-table"] == 12
+    assert new_query["breakout"][0] == ["field", 81, {"temporal-unit": "month"}]
+    assert new_query["breakout"][1] == ["field-id", 83]
+    assert new_query["fields"] == QUERY["fields"]
+    assert new_query["order-by"] == QUERY["order-by"]
+
+
+def test_replace_field_ids_empty_mapping_is_identity() -> None:
+    assert replace_field_ids(QUERY, column_mapping={}) == QUERY
+
+
+def test_card_references_are_replaced() -> None:
+    mbql = {
+        "type": "query",
+        "query": {
+            "source-query": {"source-table": "card__12"},
+            "joins": [{"source-table": "card__13"}, {"source-table": 4}],
+        },
+    }
+    native = {
+        "type": "native",
+        "native": {
+            "query": "select * from {{#12-base}} where x = {{y}}",
+            "template-tags": {
+                "#12-base": {"type": "card", "card-id": 12, "name": "#12-base"},
+                "y": {"type": "text", "name": "y"},
+            },
+        },
+    }
+    assert card_references(mbql) == {12, 13}
+    assert card_references(native) == {12}
+    new_mbql = replace_card_references(mbql, {12: 112})
+    assert card_references(new_mbql) == {112, 13}
+    new_native = replace_card_references(native, {12: 112})
+    assert card_references(new_native) == {112}
+    assert (
+        new_native["native"]["query"] == "select * from {{#112-base}} where x = {{y}}"
+    )
+    assert set(new_native["native"]["template-tags"].keys()) == {"#112-base", "y"}
+
+
+def test_card_tags_with_blanks_are_renamed() -> None:
+    native = {
+        "type": "native",
+        "native": {
+            "query": "select * from {{ #12-base }} join {{#12-base}} join {{ #12-base-2 }}",
+            "template-tags": {
+                "#12-base": {"type": "card", "card-id": 12, "name": "#12-base"},
+            },
+        },
+    }
+    new_native = replace_card_references(native, {12: 112})
+    assert (
+        new_native["native"]["query"]
+        == "select * from {{ #112-base }} join {{#112-base}} join {{ #12-base-2 }}"
+    )
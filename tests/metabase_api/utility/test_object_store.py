@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+
+from metabase_api._helper_methods import get_card_json
+from metabase_api.utility.object_store import ObjectStore
+
+
+class _CountingApi:
+    def __init__(self) -> None:
+        self.object_store = ObjectStore()
+        self.gets: list[str] = []
+
+    def get(self, endpoint: str, *args, **kwargs) -> Any:
+        self.gets.append(endpoint)
+        if endpoint == "/api/card/404":
+            return False
+        return {"id": int(endpoint.split("/")[-1]), "name": "q"}
+
+
+def test_store_is_shared_between_threads() -> None:
+    store = ObjectStore()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: store.put("card", {"id": i}), range(100)))
+    assert len(store) == 100
+    store.put_many("dashboard", [{"id": 1}, {"id": 2}])
+    store.discard("card", 3)
+    assert store.get("card", 3) is None
+    assert store.get("dashboard", 2) == {"id": 2}
+    assert len(store) == 101
+
+
+def test_card_json_is_fetched_once() -> None:
+    api = _CountingApi()
+    api.object_store.put("card", {"id": 1, "name": "prefetched"})
+    assert get_card_json(api, 1)["name"] == "prefetched"
+    assert get_card_json(api, 2)["name"] == "q"
+    assert get_card_json(api, 2)["name"] == "q"
+    assert api.gets == ["/api/card/2"]
+    with pytest.raises(ValueError):
+        get_card_json(api, 404)
@@ -0,0 +1,77 @@
+import io
+import logging
+
+import pytest
+
+from metabase_api.utility.progress import (
+    ProgressEvent,
+    ProgressTracker,
+    TerminalProgressBar,
+    log_sink,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_tracker_reports_throughput_and_eta() -> None:
+    clock = _Clock()
+    events: list[ProgressEvent] = []
+    tracker = ProgressTracker("copy", events.append, clock=clock)
+    tracker.add_total(4)
+    tracker.skipped("collection", 1)
+    clock.now = 2.0
+    with tracker.item("card", 12):
+        assert tracker.in_flight == 1
+    with pytest.raises(ValueError):
+        with tracker.item("card", 13):
+            raise ValueError("boom")
+    assert [(e.kind, e.model, e.item_id) for e in events] == [
+        ("skipped", "collection", 1),
+        ("done", "card", 12),
+        ("failed", "card", 13),
+    ]
+    last = events[-1]
+    assert (last.done, last.failed, last.remaining, last.in_flight) == (2, 1, 1, 0)
+    assert last.items_per_second == 1.0
+    assert last.eta_seconds == 1.0
+
+
+def test_broken_sink_does_not_stop_the_run() -> None:
+    def _broken(event: ProgressEvent) -> None:
+        raise RuntimeError("sink is down")
+
+    events: list[ProgressEvent] = []
+    tracker = ProgressTracker("migrate", [_broken, events.append])
+    tracker.add_total(1)
+    with tracker.item("dashboard", 3):
+        pass
+    tracker.finish()
+    assert [e.kind for e in events] == ["done", "finished"]
+
+
+def test_terminal_bar_and_log_sink(caplog: pytest.LogCaptureFixture) -> None:
+    clock = _Clock()
+    stream = io.StringIO()
+    tracker = ProgressTracker(
+        "copy",
+        [TerminalProgressBar(stream=stream, width=4), log_sink(every_seconds=10)],
+        clock=clock,
+    )
+    tracker.add_total(2)
+    with caplog.at_level(logging.INFO):
+        for card_id in (1, 2):
+            clock.now += 1
+            with tracker.item("card", card_id):
+                pass
+        tracker.finish()
+    assert stream.getvalue().endswith(
+        "[####] copy: 2/2 done, 0 in flight, 1.0 items/s\n"
+    )
+    # the second item came too soon after the first one
+    assert len(caplog.records) == 2